@@ -0,0 +1,42 @@
+"""
+Addresses of board servers.
+
+An address is a port number of a server on localhost, "<host>:<port>" of
+a server on another host (see Topology; the host may be an IPv6 address,
+e.g. "::1:10000" or "[::1]:10000") or "unix://<path>" for a server
+listening on a unix domain socket. Replicas running on the same host talk
+over unix sockets without going through the TCP stack of the loopback
+interface.
+"""
+
+UNIX_PREFIX = "unix://"
+
+
+def unixPath(address):
+    """Returns the path of the unix socket of the address, or None for a port."""
+    if isinstance(address, str) and address.startswith(UNIX_PREFIX):
+        return address[len(UNIX_PREFIX):]
+    return None
+
+
+def connectArguments(address):
+    """Returns the uri and keyword arguments of websockets' connect() for the address."""
+    path = unixPath(address)
+    if path is not None:
+        return "ws://localhost/", {"unix": True, "path": path}
+    return _uri(address), {}
+
+
+def _uri(address):
+    if isinstance(address, str) and ":" in address:
+        # The port follows the last colon; an IPv6 host contains colons itself and is put in brackets
+        host, _, port = address.rpartition(":")
+        if ":" in host and not host.startswith("["):
+            host = f"[{host}]"
+        return f"ws://{host}:{port}"
+    return f"ws://localhost:{address}"
+
+
+def describe(address):
+    """Text of the address for messages"""
+    return address if unixPath(address) is not None else _uri(address)
@@ -2,55 +2,207 @@
 # https://websocket-client.readthedocs.io/en/latest/
 
 import asyncio
-import json
+import functools
+import time
 from websockets.asyncio import client
 from VectorClock import clock
+import Address
+import BoardLogging
+import Compression
+import Deadline
+import WireCodec
+
+log = BoardLogging.getLogger("AsyncBoardProxy")
 
 class storage: 
-    def __init__(self, port, myId, vectorClock=None, websocketconnect=client.connect): 
+    def __init__(self, port, myId, vectorClock=None, websocketconnect=client.connect, multiplexed=False, maxInFlight=256, codecs=None, 
+                 compressionThreshold=Compression.DEFAULT_THRESHOLD, replyTimeout=None): 
+        """
+        Proxy for the board server listening on port: a port number on localhost 
+        or "unix://<path>" for a server on a unix socket (see Address). 
+        Parameter multiplexed: If True, every request is tagged with a request id 
+                  and many requests may be outstanding on the one connection. 
+                  One reader task matches the replies to the waiting callers. 
+                  Otherwise the requests are sent one after another. 
+        Parameter maxInFlight: Maximum number of outstanding requests in multiplexed mode. 
+        Parameter codecs: Names of the codecs to negotiate with the server in order of 
+                  preference, e.g. ["binary", "cjson"] (see WireCodec). Default is plain JSON. 
+        Parameter compressionThreshold: Requests of at least this many bytes are compressed, 
+                  None disables compression. Only used with the default connect function. 
+        Parameter replyTimeout: Seconds to wait for the reply to a request in multiplexed mode, 
+                  None waits until the deadline of the request (see Deadline), if any. 
+        """
         self.port = port
         self.myId = myId
         self.websocket = None
         self.vectorClock = vectorClock  # Vector clock object for timestamps
+        if websocketconnect is client.connect:
+            if compressionThreshold is None:
+                websocketconnect = functools.partial(client.connect, compression=None)
+            else:
+                websocketconnect = functools.partial(client.connect, extensions=Compression.clientExtensions(compressionThreshold))
         self.websocketconnect = websocketconnect  # Configurable connect function
+        self.multiplexed = multiplexed
+        self.lock = asyncio.Lock()  # Protects connecting and, if not multiplexed, each send/recv pair
+        self._window = asyncio.Semaphore(maxInFlight)  # Limits outstanding requests in multiplexed mode
+        self._pending = {}  # Request id -> future for the reply (multiplexed mode)
+        self._nextRequestId = 0
+        self._readerTask = None
+        self._closing = set()  # Tasks closing discarded connections
+        self.codecs = codecs
+        self.codec = WireCodec.JSON  # Codec of the current connection
+        self.replyTimeout = replyTimeout
        
     async def doOperation(self, request):
-       print("doing operations")
+       log.debug("doing operations")
        request["MYID"] = self.myId
        
+       # Forward the deadline of the request being served or of the caller
+       deadline = Deadline.get()
+       if deadline is not None:
+           request["DEADLINE"] = deadline
+       
        # Add timestamp to request if vector clock is available
        if self.vectorClock is not None:
            request["TIME"] = self.vectorClock.getTime()
        
        try:
-           if self.websocket is None:
-               self.websocket = await self.websocketconnect(f"ws://localhost:{self.port}")
-           await self.websocket.send(json.dumps(request,))
-           res = await self.websocket.recv()
-           response = json.loads(res)
-           
-           # Update vector clock from response if available
-           if self.vectorClock is not None and isinstance(response, dict) and "TIME" in response:
-               self.vectorClock.updateTime(response["TIME"])
-           
-           return response
+           response = await self._exchange(request)
+       except TimeoutError:
+           # The server is slow, not the connection: a retry would not be answered in time either
+           log.warning("No reply from port %s in time", self.port)
+           return {"RESULT": "ERROR"}
        except Exception as e:
-           print(f"Conn error: {e}")
+           # _exchange() discarded the connection if it failed, so the retry uses a new one
+           log.warning("Conn error: %s", e)
            try:
-               self.websocket = await self.websocketconnect(f"ws://localhost:{self.port}")
-               await self.websocket.send(json.dumps(request))
-               res = await self.websocket.recv()
-               response = json.loads(res)
-               
-               # Update vector clock from response if available
-               if self.vectorClock is not None and isinstance(response, dict) and "TIME" in response:
-                   self.vectorClock.updateTime(response["TIME"])
-               
-               return response
+               response = await self._exchange(request)
            except Exception as retry_e:
-               print(f"Retry conn error: {retry_e}")
+               log.warning("Retry conn error: %s", retry_e)
                return {"RESULT": "ERROR"}
            
+       # Update vector clock from response if available
+       if self.vectorClock is not None and isinstance(response, dict) and "TIME" in response:
+           self.vectorClock.updateTime(response["TIME"])
+       
+       return response
+
+    async def _connect(self):
+        """Opens a connection to the server and negotiates the codec. Returns the connection and its codec."""
+        uri, options = Address.connectArguments(self.port)
+        websocket = await self.websocketconnect(uri, **options)
+        if not self.codecs:
+            return websocket, WireCodec.JSON
+        try:
+            await websocket.send(WireCodec.JSON.encode({"COMMAND": "HELLO", "CODECS": self.codecs}))
+            reply = WireCodec.JSON.decode(await websocket.recv())
+        except BaseException:
+            await websocket.close()
+            raise
+        # Servers without codecs reply with an error and keep JSON
+        codec = WireCodec.codecs.get(reply.get("CODEC"), WireCodec.JSON) if isinstance(reply, dict) else WireCodec.JSON
+        return websocket, codec
+
+    async def _exchange(self, request):
+        """Sends the request and returns the decoded reply of the server."""
+        if self.multiplexed:
+            return await self._exchangeMultiplexed(request)
+
+        async with self.lock:
+            if self.websocket is None:
+                self.websocket, self.codec = await self._connect()
+            try:
+                await self.websocket.send(self.codec.encode(request))
+                res = await self.websocket.recv()
+            except (asyncio.CancelledError, Exception):
+                # The reply may still arrive later. It must not be taken 
+                # as the reply of the next caller, so drop the connection. 
+                self._discardConnection()
+                raise
+            return self.codec.decode(res)
+
+    async def _exchangeMultiplexed(self, request):
+        """Sends the request tagged with a request id and waits until the reader task delivers the reply."""
+        async with self._window:
+            async with self.lock:
+                if self.websocket is None:
+                    self.websocket, self.codec = await self._connect()
+                    self._pending = {}
+                    self._readerTask = asyncio.create_task(self._readReplies(self.websocket, self.codec, self._pending))
+            websocket = self.websocket
+            codec = self.codec
+            pending = self._pending
+
+            self._nextRequestId += 1
+            requestId = self._nextRequestId
+            request["REQID"] = requestId
+            future = asyncio.get_running_loop().create_future()
+            pending[requestId] = future
+            try:
+                timeout = self._timeout()
+                if timeout is not None and timeout <= 0:
+                    raise TimeoutError()
+                await websocket.send(codec.encode(request))
+                return await asyncio.wait_for(future, timeout)
+            except TimeoutError:
+                raise  # Only this request failed, the connection stays
+            except Exception:
+                # Other callers may have reconnected meanwhile; their connection is not discarded
+                self._discardConnection(websocket)
+                raise
+            finally:
+                pending.pop(requestId, None)
+
+    def _timeout(self):
+        """Seconds to wait for a reply: replyTimeout or the time left until the deadline, whichever is less"""
+        timeout = self.replyTimeout
+        deadline = Deadline.get()
+        if deadline is not None:
+            left = deadline - time.time()
+            timeout = left if timeout is None else min(timeout, left)
+        return timeout
+
+    async def _readReplies(self, websocket, codec, pending):
+        """Reader task of a multiplexed connection. Resolves the future of each tagged reply."""
+        try:
+            while True:
+                response = codec.decode(await websocket.recv())
+                if not (isinstance(response, dict) and "REQID" in response):
+                    # E.g. "ERROR: ..." for a frame the server could not decode. It cannot 
+                    # be matched to a request, so the requests on the connection fail. 
+                    raise ConnectionError(f"Untagged reply {response!r}")
+                future = pending.get(response["REQID"])
+                if future is not None and not future.done():
+                    future.set_result(response.get("REPLY"))
+        except Exception as e:
+            # Connection is broken: all requests waiting on it fail
+            if self.websocket is websocket:
+                self.websocket = None
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Connection to port {self.port} lost: {e}"))
+            await websocket.close()
+
+    def _discardConnection(self, websocket=None):
+        """
+        Forgets the current connection and closes it in the background. 
+        If websocket is given, only if it is still the current connection. 
+        """
+        if websocket is not None and websocket is not self.websocket:
+            return
+        websocket = self.websocket
+        self.websocket = None
+        if self._readerTask is not None:
+            self._readerTask.cancel()
+            self._readerTask = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Connection to port {self.port} discarded"))
+        if websocket is not None:
+            task = asyncio.ensure_future(websocket.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+           
     async def put(self, message, sequenceNumber=None): 
         req = {"COMMAND": "PUT", "MESSAGE": message}
         if sequenceNumber is not None:
@@ -68,6 +220,115 @@ class storage:
     async def getBoard(self): 
         req = {"COMMAND": "GETBOARD"}
         return await self.doOperation(req)
+
+    async def streamBoardChunks(self, chunkSize=1000): 
+        """
+        Async generator yielding the board as lists of at most chunkSize messages. 
+        The server streams the board in one frame per chunk over a separate 
+        connection, so the board is never held as one frame on either side. 
+        Raises ConnectionError if the board changed during the stream, then it must be read again. 
+        """
+        websocket, codec = await self._connect()
+        try:
+            req = {"COMMAND": "GETBOARD", "STREAM": True, "CHUNKSIZE": chunkSize, "MYID": self.myId}
+            await websocket.send(codec.encode(req))
+            while True:
+                frame = codec.decode(await websocket.recv())
+                if not (isinstance(frame, dict) and ("CHUNK" in frame or "END" in frame)):
+                    # E.g. BUSY or EXPIRED
+                    raise ConnectionError(f"Streaming board failed: {frame}")
+                if frame.get("RESYNC"):
+                    raise ConnectionError("Board changed while streaming it, it must be read again")
+                if frame.get("END"):
+                    return
+                yield frame["CHUNK"]
+        finally:
+            await websocket.close()
+
+    async def streamBoard(self, chunkSize=1000): 
+        """Async generator yielding all messages of the board, streamed in chunks of chunkSize messages."""
+        async for chunk in self.streamBoardChunks(chunkSize):
+            for message in chunk:
+                yield message
+
+    async def watch(self): 
+        """
+        Async generator yielding every change applied to the board of the server as 
+        operation, e.g. {"COMMAND": "PUT", "MESSAGE": "Hi"}. Uses a separate connection. 
+        If the server dropped changes because this consumer was too slow, 
+        {"DROPPED": n} is yielded at their place; a copy of the board must then be fetched again. 
+        """
+        websocket, codec = await self._connect()
+        try:
+            await websocket.send(codec.encode({"COMMAND": "WATCH", "MYID": self.myId}))
+            reply = codec.decode(await websocket.recv())
+            if reply != "OK":
+                raise ConnectionError(f"Watching board failed: {reply}")
+            while True:
+                frame = codec.decode(await websocket.recv())
+                if "EVENT" in frame:
+                    yield frame["EVENT"]
+                elif "DROPPED" in frame:
+                    yield {"DROPPED": frame["DROPPED"]}
+        finally:
+            await websocket.close()
+
+    async def getStats(self): 
+        """Retrieves the metrics of the server (see Metrics.metricsRegistry.snapshot)."""
+        req = {"COMMAND": "STATS"}
+        return await self.doOperation(req)
+
+    async def getBoardIfModified(self, version=None): 
+        """
+        Retrieves the board unless it still has the given version. 
+        Returns a dict with the current "VERSION" and either the messages 
+        as "BOARD" or "NOTMODIFIED": True. 
+        """
+        req = {"COMMAND": "GETBOARD", "IFVERSION": version}
+        return await self.doOperation(req)
+
+    async def getChanges(self, version): 
+        """
+        Retrieves the changes applied to the board after the given version. 
+        Returns a dict with the current "VERSION" and the changes as "CHANGES", 
+        or with "RESYNC": True if the server no longer knows them and the 
+        whole board must be read again. 
+        """
+        req = {"COMMAND": "GETCHANGES", "VERSION": version}
+        return await self.doOperation(req)
+
+    async def getRange(self, offset, limit): 
+        """Retrieves at most limit messages from index offset on (negative offset counts from the end)."""
+        req = {"COMMAND": "GETRANGE", "OFFSET": offset, "LIMIT": limit}
+        return await self.doOperation(req)
+
+    async def getBoardPage(self, limit, cursor=None): 
+        """
+        Retrieves one page of at most limit messages of the board. 
+        Returns a dict with the messages as "BOARD" and the token for 
+        the next page as "CURSOR" (None after the last page). 
+        If the board changed since the page of the cursor, the reply is 
+        {"VERSION": n, "RESYNC": True} and the board must be read again from its start. 
+        """
+        req = {"COMMAND": "GETBOARD", "LIMIT": limit}
+        if cursor is not None:
+            req["CURSOR"] = cursor
+        return await self.doOperation(req)
+
+    async def iterBoard(self, pageSize=1000): 
+        """Async generator yielding all messages of the board, retrieved page by page. Raises ConnectionError if the board changes meanwhile."""
+        cursor = None
+        while True:
+            page = await self.getBoardPage(pageSize, cursor)
+            if isinstance(page, dict) and page.get("RESYNC"):
+                raise ConnectionError("Board changed while retrieving it page by page, it must be read again")
+            if not (isinstance(page, dict) and "BOARD" in page):
+                raise ConnectionError(f"Retrieving board page failed: {page}")
+            for message in page["BOARD"]:
+                yield message
+            cursor = page.get("CURSOR")
+            if cursor is None:
+                return
         
     async def modify(self, index, message, sequenceNumber=None): 
         req = {"COMMAND": "MODIFY", "INDEX": index, "MESSAGE": message}
@@ -87,10 +348,20 @@ class storage:
             req["SEQNUM"] = sequenceNumber
         return await self.doOperation(req)
         
+    async def putMany(self, messages, sequenceNumber=None): 
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], sequenceNumber)
+
+    async def applyBatch(self, operations, sequenceNumber=None): 
+        """Sends a list of operations, e.g. {"COMMAND": "PUT", "MESSAGE": "Hi"}, as one BATCH request."""
+        req = {"COMMAND": "BATCH", "OPERATIONS": operations}
+        if sequenceNumber is not None:
+            req["SEQNUM"] = sequenceNumber
+        return await self.doOperation(req)
+        
     async def close(self): 
-        if self.websocket is not None:
-            await self.websocket.close()
-            self.websocket = None
+        self._discardConnection()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
 
     async def acquire(self):
         """Request acquiring the remote mutex. Returns True/False or "ERROR"."""
@@ -107,9 +378,11 @@ class storage:
         req = {"COMMAND": "AREYOUALIVE"}
         return await self.doOperation(req)
 
-    async def getSequenceNumber(self):
-        """Request a sequence number from the server. Returns sequence number or "ERROR"."""
+    async def getSequenceNumber(self, count=1):
+        """Request a sequence number (the first of a range of count numbers) from the server. Returns sequence number or "ERROR"."""
         req = {"COMMAND": "GETSEQUENCENUMBER"}
+        if count != 1:
+            req["COUNT"] = count
         return await self.doOperation(req)
 
     async def election(self):
@@ -1,50 +1,198 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
 from functools import cmp_to_key
 import json
-import os
+import random
+import BoardLogging
+import Metrics
+import Snapshot
+import WriteAheadLog
+
+log = BoardLogging.getLogger("AsyncBoardStorage")
 
 class storage:
-    def __init__(self, comperatorForElements=None, checkpointing=False, serverID=None):
+    def __init__(self, comperatorForElements=None, checkpointing=False, serverID=None, changeLogSize=1000, 
+                 syncEvery=100, syncInterval=0.05, snapshotInterval=None, compressSnapshots=False, 
+                 keyForElements=None):
+        """
+        Parameter comperatorForElements: Function comparing two messages (-1, 0, 1). 
+                  If given, the board is kept sorted by it. 
+        Parameter keyForElements: Function returning a sort key of a message, used instead of 
+                  comperatorForElements. The board is kept sorted by the keys. 
+        Parameter checkpointing: If True (and serverID is given), the board is stored in 
+                  checkpoint_<serverID>.snap with a log of the later changes (see WriteAheadLog) 
+                  and recovered from them on start. 
+        Parameter syncEvery, syncInterval: The log is fsynced after this many changes or 
+                  at the latest this many seconds after a change (group commit). 
+        Parameter snapshotInterval: Seconds after which a snapshot is taken in the background 
+                  if the board changed. Otherwise when the log is as long as the board. 
+        Parameter compressSnapshots: If True, the messages in snapshots are compressed with zlib. 
+        
+        A sorted board keeps the key of each message. A new or modified message is put to 
+        its position by binary search on the keys, as a stable sort of the board would. 
+        With a comparator, its keys are made with cmp_to_key, so each comparison still 
+        calls the comparator, but only O(log n) times per change. 
+        
+        A recovered board is mapped from the snapshot and its messages are decoded when 
+        they are first accessed (see Snapshot), so the server can answer right after a restart. 
+        """
         self.messages = []
         self.compareFunc = comperatorForElements
+        self.sortKey = keyForElements
+        if self.sortKey is None and self.compareFunc is not None:
+            self.sortKey = cmp_to_key(self.compareFunc)
+        self.keys = None  # Sort keys of the messages in their order, made on first use
         self.checkpointing = checkpointing
         self.serverID = serverID
+        self.listeners = []  # Functions called with each applied change (see subscribe)
+        self.version = 0  # Number of changes applied, with checkpointing also those before a restart
+        self.changeLog = deque(maxlen=changeLogSize)  # The latest changes as (version, change)
         
-        # Load checkpoint if checkpointing is enabled
-        if self.checkpointing and self.serverID is not None:
-            self._load_checkpoint()
-
-    def _get_checkpoint_filename(self):
-        """Generate the checkpoint filename based on server ID"""
-        return f"checkpoint_{self.serverID}.json"
-    
-    def _load_checkpoint(self):
-        """Load the message board from the checkpoint file if it exists"""
-        filename = self._get_checkpoint_filename()
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r') as f:
-                    self.messages = json.load(f)
-            except Exception as e:
-                print(f"Error loading checkpoint: {e}")
-                self.messages = []
-    
-    def _write_checkpoint(self):
-        """Write the current message board to the checkpoint file"""
+        self.wal = None
+        
+        # Recover the board from snapshot and log if checkpointing is enabled
         if self.checkpointing and self.serverID is not None:
-            filename = self._get_checkpoint_filename()
+            self.wal = WriteAheadLog.writeAheadLog(f"checkpoint_{self.serverID}", syncEvery, syncInterval, 
+                                                   snapshotInterval=snapshotInterval, compress=compressSnapshots, 
+                                                   labels={"server": str(serverID)})
+            self.messages, changes = self.wal.recover()
+            for change in changes:
+                self._replay(change)
+            # Versions go on after a restart, so a version of before the restart is not mistaken 
+            # for a later state of the board (getChanges returns None for it) 
+            self.version = self.wal.lsn
+
+        labels = {"server": str(serverID)}
+        Metrics.registry.gauge("board_messages", lambda: len(self.messages), labels)
+        Metrics.registry.gauge("board_approx_bytes", self.approximateSize, labels)
+
+    def _write_checkpoint(self, change):
+        """Appends an applied change to the log and starts a snapshot in the background when it is due"""
+        if self.wal is None:
+            return
+        try:
+            self.wal.append(change)
+            if self.wal.needsCompaction(len(self.messages)):
+                self.wal.snapshot(self.messages)
+        except Exception as e:
+            log.error("Error writing checkpoint: %s", e)
+
+    def _replay(self, change):
+        """Applies a logged change again when recovering"""
+        if change.get("COMMAND") == "BATCH":
+            self._applyOperations(change["OPERATIONS"])
+        else:
+            self._applyOperations([change])
+
+    def approximateSize(self, samples=100):
+        """Estimates the size of the board encoded as JSON in bytes from a sample of the messages"""
+        if not self.messages:
+            return 0
+        sample = random.sample(self.messages, min(samples, len(self.messages)))
+        return len(json.dumps(sample)) * len(self.messages) // len(sample)
+
+    def subscribe(self, listener):
+        """
+        Registers a function that is called with every change applied to the board. 
+        The change is passed as operation like in a request, e.g. 
+        {"COMMAND": "PUT", "MESSAGE": "Hi"} or {"COMMAND": "BATCH", "OPERATIONS": [...]}. 
+        Applying the changes in their order to a copy of the board reproduces the board. 
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """Removes a function registered with subscribe()"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, change):
+        """Counts an applied change, logs it and informs all listeners about it"""
+        self._write_checkpoint(change)
+        self.version += 1
+        self.changeLog.append((self.version, change))
+        for listener in tuple(self.listeners):
             try:
-                with open(filename, 'w') as f:
-                    json.dump(self.messages, f, indent=2)
+                listener(change)
             except Exception as e:
-                print(f"Error writing checkpoint: {e}")
+                log.error("Error in board listener: %s", e)
+
+    def _decodeAll(self):
+        """Replaces a board mapped from a snapshot by a list of all its messages"""
+        if isinstance(self.messages, Snapshot.mappedBoard):
+            self.messages = list(self.messages)
+
+    def _newList(self, elements=()):
+        """List type holding the messages and their sort keys"""
+        return list(elements)
+
+    def _sortKeys(self):
+        """Returns the sort keys of the messages, computed once per message"""
+        if self.keys is None:
+            self._decodeAll()
+            self.keys = self._newList(self.sortKey(message) for message in self.messages)
+        return self.keys
+
+    def _bisect(self, keys, key):
+        """Returns the first and the last position at which key can be inserted into the sorted keys"""
+        return bisect_left(keys, key), bisect_right(keys, key)
+
+    def _insert(self, message, key=None, index=None):
+        """
+        Adds a message to the board: at the end, or on a sorted board at the position 
+        of its key. index is its former position if the message is moved, so among 
+        messages with equal keys it stays where a stable sort would leave it. 
+        """
+        if self.sortKey is None:
+            self.messages.append(message)
+            return
+        keys = self._sortKeys()
+        if key is None:
+            key = self.sortKey(message)
+        low, high = self._bisect(keys, key)
+        position = high if index is None else min(max(index, low), high)
+        keys.insert(position, key)
+        self.messages.insert(position, message)
+
+    def _insertMany(self, messages):
+        """
+        Adds messages like _insert() one after another. Many messages are appended and 
+        merged into the sorted board by one stable sort on the keys, which is cheaper 
+        than moving the later messages once per message. 
+        """
+        if len(messages) ** 2 <= len(self.messages):
+            for message in messages:
+                self._insert(message)
+            return
+        keys = list(self._sortKeys())
+        keys.extend(self.sortKey(message) for message in messages)
+        board = list(self.messages)
+        board.extend(messages)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = self._newList(keys[i] for i in order)
+        self.messages = self._newList(board[i] for i in order)
+
+    def _replace(self, index, message):
+        """Replaces the message at index; on a sorted board it is moved if its key changed"""
+        if self.sortKey is not None:
+            key = self.sortKey(message)
+            if key != self._sortKeys()[index]:
+                self._remove(index)
+                self._insert(message, key, index)
+                return
+        self.messages[index] = message
+
+    def _remove(self, index):
+        if self.keys is not None:
+            del self.keys[index]
+        del self.messages[index]
+
+    def _clear(self):
+        self.messages.clear()
+        self.keys = None
 
     async def put(self, message, server_id=0, sequenceNumber=None):
-        self.messages.append(message)
-        # Sort messages if comparison function is provided
-        if self.compareFunc is not None:
-            self.messages.sort(key=cmp_to_key(self.compareFunc))
-        # Write checkpoint after update
-        self._write_checkpoint()
+        self._insert(message)
+        self._notify({"COMMAND": "PUT", "MESSAGE": message})
 
     async def get(self, index, server_id=0):
         index = int(index)
@@ -57,34 +205,144 @@ class storage:
         return len(self.messages)
 
     async def getBoard(self, server_id=0):
+        self._decodeAll()
         return self.messages
 
+    async def getRange(self, offset, limit, server_id=0):
+        """
+        Returns at most limit messages starting at index offset. 
+        A negative offset counts from the end of the board, 
+        e.g. offset -10 with limit 10 returns the latest 10 messages. 
+        """
+        offset = int(offset)
+        limit = int(limit)
+        if limit < 0:
+            raise ValueError("Limit must not be negative.")
+        if offset < 0:
+            offset = max(0, len(self.messages) + offset)
+        return self.messages[offset:offset + limit]
+
+    async def getVersion(self, server_id=0):
+        return self.version
+
+    async def getChanges(self, version, server_id=0):
+        """
+        Returns the changes applied after the given version in their order, 
+        as operations like the ones passed to subscribed listeners. 
+        Returns None if they are no longer in the change log (or the version is unknown), 
+        then the whole board must be read again. 
+        """
+        version = int(version)
+        if version == self.version:
+            return []
+        if version > self.version or not self.changeLog or self.changeLog[0][0] > version + 1:
+            return None
+        # Versions in the log are consecutive, so the position follows from the version
+        start = version + 1 - self.changeLog[0][0]
+        return [change for _, change in list(self.changeLog)[start:]]
+
     async def modify(self, index, message, server_id=0, sequenceNumber=None):
         index = int(index)
         if 0 <= index < len(self.messages):
-            self.messages[index] = message
-            # Re-sort messages if comparison function is provided
-            # (timestamp might have changed the order)
-            if self.compareFunc is not None:
-                self.messages.sort(key=cmp_to_key(self.compareFunc))
-            # Write checkpoint after update
-            self._write_checkpoint()
+            self._replace(index, message)
+            self._notify({"COMMAND": "MODIFY", "INDEX": index, "MESSAGE": message})
         else:
             raise ValueError("Index is unknown.")
 
     async def delete(self, index, server_id=0, sequenceNumber=None):
         index = int(index)
         if 0 <= index < len(self.messages):
-            self.messages.pop(index)
-            # Write checkpoint after update
-            self._write_checkpoint()
+            self._remove(index)
+            self._notify({"COMMAND": "DELETE", "INDEX": index})
         else:
             raise ValueError("Index is unknown.")
 
     async def deleteAll(self, server_id=0, sequenceNumber=None):
-        self.messages.clear()
-        # Write checkpoint after update
-        self._write_checkpoint()
+        self._clear()
+        self._notify({"COMMAND": "DELETEALL"})
+
+    async def putMany(self, messages, server_id=0, sequenceNumber=None):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id, sequenceNumber)
+
+    async def applyBatch(self, operations, server_id=0, sequenceNumber=None, prepare=None):
+        """
+        Applies a list of operations in their order and writes the checkpoint once. 
+        Each operation is a dict like a request, e.g. {"COMMAND": "PUT", "MESSAGE": "Hi"}
+        with the commands PUT, MODIFY, DELETE and DELETEALL. 
+        Indices refer to the board after the preceding operations of the batch. 
+        Parameter prepare: Optional function called with each operation and the list of 
+                  messages right before the operation is applied. It returns the operation 
+                  to be applied instead, e.g. with a timestamp added. 
+        Returns the list of results of the operations. 
+        The batch is atomic: if an operation is invalid, ValueError is raised and 
+        none of the operations is applied, logged or passed to the listeners. 
+        """
+        self._checkOperations(operations)
+        applied = []  # Operations as applied, for the listeners
+        results = self._applyOperations(operations, prepare, applied)
+        if applied:
+            self._notify({"COMMAND": "BATCH", "OPERATIONS": applied})
+        return results
+
+    def _checkOperations(self, operations):
+        """Raises ValueError at the first invalid operation of a batch, before any of them is applied"""
+        length = len(self.messages)  # Length of the board after the preceding operations
+        for operation in operations:
+            command = str(operation.get("COMMAND", "")).upper()
+            if command == "PUT":
+                length += 1
+            elif command in ("MODIFY", "DELETE"):
+                try:
+                    index = int(operation.get("INDEX"))
+                except (TypeError, ValueError):
+                    raise ValueError("Index is unknown.")
+                if not 0 <= index < length:
+                    raise ValueError("Index is unknown.")
+                if command == "DELETE":
+                    length -= 1
+            elif command == "DELETEALL":
+                length = 0
+            else:
+                raise ValueError(f"Unknown command in batch: {command}")
+
+    def _applyOperations(self, operations, prepare=None, applied=None):
+        """Applies the operations of a batch (see applyBatch) and adds them as applied to the list applied"""
+        results = []
+        puts = []  # Messages of consecutive PUTs, added to a sorted board together
+        try:
+            for operation in operations:
+                command = operation.get("COMMAND", "").upper()
+                if command != "PUT" and puts:
+                    self._insertMany(puts)
+                    puts = []
+                if prepare is not None:
+                    operation = prepare(operation, self.messages)
+
+                if command == "PUT" and self.sortKey is not None:
+                    puts.append(operation.get("MESSAGE"))
+                elif command == "PUT":
+                    self.messages.append(operation.get("MESSAGE"))
+                elif command in ("MODIFY", "DELETE"):
+                    index = int(operation.get("INDEX"))
+                    if not 0 <= index < len(self.messages):
+                        raise ValueError("Index is unknown.")
+                    if command == "MODIFY":
+                        self._replace(index, operation.get("MESSAGE"))
+                    else:
+                        self._remove(index)
+                elif command == "DELETEALL":
+                    self._clear()
+                else:
+                    raise ValueError(f"Unknown command in batch: {command}")
+                if applied is not None:
+                    applied.append(operation)
+                results.append(None)
+        finally:
+            if puts:
+                self._insertMany(puts)
+        return results
 
     async def close(self):
-        pass
+        if self.wal is not None:
+            await self.wal.finishSnapshot()
+            self.wal.close()
@@ -1,4 +1,8 @@
 import asyncio
+import BoardLogging
+import Deadline
+
+log = BoardLogging.getLogger("AtLeastOnceProxy")
 
 class storage: 
     def __init__(self, proxy, timeout=3, max_retries=5): 
@@ -14,15 +18,17 @@ class storage:
         """
         for attempt in range(1, self.max_retries + 1):
             try:
-                async with asyncio.timeout(self.timeout):
-                    result = await operation(*args, **kwargs)
-                    return result
+                # The server skips the attempt once this caller stopped waiting for it
+                with Deadline.within(self.timeout):
+                    async with asyncio.timeout(self.timeout):
+                        result = await operation(*args, **kwargs)
+                        return result
             except asyncio.TimeoutError:
-                print(f"Timeout on attempt {attempt}/{self.max_retries}")
+                log.warning("Timeout on attempt %s/%s", attempt, self.max_retries)
                 if attempt >= self.max_retries:
                     raise  # Re-raise on final attempt
             except Exception as e:
-                print(f"Error on attempt {attempt}/{self.max_retries}: {e}")
+                log.warning("Error on attempt %s/%s: %s", attempt, self.max_retries, e)
                 if attempt >= self.max_retries:
                     raise  # Re-raise on final attempt
         
@@ -49,6 +55,16 @@ class storage:
     async def deleteAll(self, sequenceNumber=None): 
         return await self._retry_with_timeout(self.proxy.deleteAll, sequenceNumber)
 
+    async def putMany(self, messages, sequenceNumber=None): 
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], sequenceNumber)
+
+    async def applyBatch(self, operations, sequenceNumber=None): 
+        # applyBatch() is not idempotent - add sequence number if not provided
+        if sequenceNumber is None:
+            self.sequence_number += 1
+            sequenceNumber = self.sequence_number
+        return await self._retry_with_timeout(self.proxy.applyBatch, operations, sequenceNumber)
+
     async def get(self, index): 
         return await self._retry_with_timeout(self.proxy.get, index)
             
@@ -58,6 +74,12 @@ class storage:
     async def getBoard(self): 
         return await self._retry_with_timeout(self.proxy.getBoard)
         
+    async def getRange(self, offset, limit): 
+        return await self._retry_with_timeout(self.proxy.getRange, offset, limit)
+        
+    async def getChanges(self, version): 
+        return await self._retry_with_timeout(self.proxy.getChanges, version)
+        
     async def acquire(self):
         return await self.proxy.acquire()
         
@@ -73,8 +95,8 @@ class storage:
     async def setCoordinator(self, coordinatorID):
         return await self.proxy.setCoordinator(coordinatorID)
         
-    async def getSequenceNumber(self):
-        return await self.proxy.getSequenceNumber()
+    async def getSequenceNumber(self, count=1):
+        return await self.proxy.getSequenceNumber(count)
 
     async def close(self): 
         self.proxy.close()
\ No newline at end of file
@@ -1,4 +1,8 @@
 import asyncio
+import BoardLogging
+import Metrics
+
+log = BoardLogging.getLogger("AtMostOnceFilter")
 
 class storage: 
     def __init__(self, proxy): 
@@ -7,6 +11,7 @@ class storage:
         self.response_cache = {}
         # Track highest sequence number per server for cache cleanup
         self.highest_seq_per_server = {}
+        Metrics.registry.gauge("board_response_cache_entries", lambda: len(self.response_cache))
 
     def _get_cache_key(self, server_id, sequence_number):
         """Generate cache key from server ID and sequence number."""
@@ -37,7 +42,7 @@ class storage:
             
             # Check if we've seen this request before
             if cache_key in self.response_cache:
-                print(f"Duplicate put detected (server={server_id}, seq={sequenceNumber}), returning cached response")
+                log.debug("Duplicate put detected (server=%s, seq=%s), returning cached response", server_id, sequenceNumber)
                 return self.response_cache[cache_key]
             
             # First time seeing this request - execute it
@@ -62,7 +67,7 @@ class storage:
             
             # Check if we've seen this request before
             if cache_key in self.response_cache:
-                print(f"Duplicate delete detected (server={server_id}, seq={sequenceNumber}), returning cached response")
+                log.debug("Duplicate delete detected (server=%s, seq=%s), returning cached response", server_id, sequenceNumber)
                 return self.response_cache[cache_key]
             
             # First time seeing this request - execute it
@@ -81,6 +86,30 @@ class storage:
         # deleteAll() is idempotent - just forward
         return await self.proxy.deleteAll(server_id)
 
+    async def putMany(self, messages, server_id=-1, sequenceNumber=None):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id, sequenceNumber)
+
+    async def applyBatch(self, operations, server_id=-1, sequenceNumber=None):
+        # applyBatch() is not idempotent - check cache for duplicates
+        if sequenceNumber is not None:
+            cache_key = self._get_cache_key(server_id, sequenceNumber)
+            
+            # Check if we've seen this request before
+            if cache_key in self.response_cache:
+                log.debug("Duplicate batch detected (server=%s, seq=%s), returning cached response", server_id, sequenceNumber)
+                return self.response_cache[cache_key]
+            
+            # First time seeing this request - execute it
+            response = await self.proxy.applyBatch(operations, server_id)
+            
+            # Cache the response
+            self.response_cache[cache_key] = response
+            self._cleanup_old_cache_entries(server_id, sequenceNumber)
+            
+            return response
+        else:
+            return await self.proxy.applyBatch(operations, server_id)
+
     async def get(self, index, server_id=-1): 
         # get() is idempotent - just forward
         return await self.proxy.get(index, server_id)
@@ -92,6 +121,23 @@ class storage:
     async def getBoard(self, server_id=-1):
         # getBoard() is idempotent - just forward
         return await self.proxy.getBoard(server_id)
+
+    async def getRange(self, offset, limit, server_id=-1):
+        # getRange() is idempotent - just forward
+        return await self.proxy.getRange(offset, limit, server_id)
+
+    async def getVersion(self, server_id=-1):
+        return await self.proxy.getVersion(server_id)
+
+    async def getChanges(self, version, server_id=-1):
+        return await self.proxy.getChanges(version, server_id)
+
+    def subscribe(self, listener):
+        self.proxy.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.proxy.unsubscribe(listener)
+
     async def acquire(self):
         return await self.proxy.acquire()
         
@@ -107,8 +153,8 @@ class storage:
     async def setCoordinator(self, coordinatorID):
         return await self.proxy.setCoordinator(coordinatorID)
         
-    async def getSequenceNumber(self):
-        return await self.proxy.getSequenceNumber()
+    async def getSequenceNumber(self, count=1):
+        return await self.proxy.getSequenceNumber(count)
 
     async def close(self): 
         self.proxy.close()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import asyncio
+import AsyncBoardStorage
+import InformAllOtherServers
+
+# Checks that a BATCH is applied completely or not at all.
+
+
+class recordingProxy:
+    """Stands in for the proxy of another server and records the calls"""
+    def __init__(self):
+        self.calls = []
+
+    async def applyBatch(self, operations, *args):
+        self.calls.append(operations)
+
+
+async def expectFailure(storage, operations):
+    try:
+        await storage.applyBatch(operations)
+    except ValueError as e:
+        return str(e)
+    raise AssertionError(f"Batch {operations} did not fail")
+
+
+async def main():
+    storage = AsyncBoardStorage.storage()
+    changes = []
+    storage.subscribe(changes.append)
+    await storage.put("a")
+    version = await storage.getVersion()
+
+    # An invalid operation after a valid one leaves the board unchanged
+    for operations in ([{"COMMAND": "PUT", "MESSAGE": "x"}, {"COMMAND": "DELETE", "INDEX": 99}],
+                       [{"COMMAND": "PUT", "MESSAGE": "x"}, {"COMMAND": "MODIFY", "INDEX": 2, "MESSAGE": "y"}],
+                       [{"COMMAND": "DELETEALL"}, {"COMMAND": "DELETE", "INDEX": 0}],
+                       [{"COMMAND": "DELETE", "INDEX": 0}, {"COMMAND": "MODIFY", "INDEX": 0, "MESSAGE": "y"}],
+                       [{"COMMAND": "PUT", "MESSAGE": "x"}, {"COMMAND": "DELETE", "INDEX": "one"}],
+                       [{"COMMAND": "PUT", "MESSAGE": "x"}, {"COMMAND": "UNKNOWN"}]):
+        print("Rejected:", await expectFailure(storage, operations))
+        assert await storage.getBoard() == ["a"]
+        assert await storage.getVersion() == version
+        assert len(changes) == 1
+
+    # Indices refer to the board after the preceding operations of the batch
+    results = await storage.applyBatch([{"COMMAND": "PUT", "MESSAGE": "b"},
+                                        {"COMMAND": "MODIFY", "INDEX": 1, "MESSAGE": "c"},
+                                        {"COMMAND": "DELETE", "INDEX": 0}])
+    assert results == [None, None, None]
+    assert await storage.getBoard() == ["c"]
+    assert changes[-1]["COMMAND"] == "BATCH" and len(changes[-1]["OPERATIONS"]) == 3
+
+    # A replicating storage informs the other servers only about batches that were applied
+    peer = recordingProxy()
+    replicated = InformAllOtherServers.storage(AsyncBoardStorage.storage(), [None, peer], 0)
+    await expectFailure(replicated, [{"COMMAND": "PUT", "MESSAGE": "x"}, {"COMMAND": "DELETE", "INDEX": 99}])
+    assert await replicated.getBoard() == [] and peer.calls == []
+    await replicated.applyBatch([{"COMMAND": "PUT", "MESSAGE": "x"}])
+    assert await replicated.getBoard() == ["x"] and len(peer.calls) == 1
+    print("Batches are atomic")
+
+
+asyncio.run(main())
@@ -0,0 +1,26 @@
+import AsyncBoardStorage
+import BlockedList
+
+
+class storage(AsyncBoardStorage.storage):
+    """
+    AsyncBoardStorage keeping the messages in a BlockedList instead of a list,
+    for very large boards: get, modify and delete at any index take O(log n)
+    instead of moving all later messages, and so does inserting a message into
+    a sorted board. Takes the same parameters.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = self._newList(self.messages)
+
+    def _newList(self, elements=()):
+        return BlockedList.blockedList(elements)
+
+    def _bisect(self, keys, key):
+        return keys.bisectLeft(key), keys.bisectRight(key)
+
+    async def getBoard(self, server_id=0):
+        # Results are sent as JSON, which needs a list
+        return list(self.messages)
+
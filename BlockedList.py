@@ -0,0 +1,230 @@
+"""
+List with O(log n) access, insertion and deletion at any position.
+
+The elements are kept in blocks (Python lists) of about LOAD elements. A
+Fenwick tree over the lengths of the blocks finds the block of a position in
+O(log n) steps; inserting or deleting moves at most 2 * LOAD elements inside
+its block instead of all elements after the position, as list.insert() and
+list.pop() do. Blocks are split when they grow beyond 2 * LOAD elements and
+merged with a neighbour when they shrink below LOAD / 2, after which the
+tree is rebuilt in O(n / LOAD) steps; this happens at most once per about
+LOAD / 2 changes.
+Iterating goes through the blocks without any lookup.
+
+    messages = blockedList(["a", "b"])
+    messages.insert(1, "c")   # ["a", "c", "b"]
+    del messages[0]           # ["c", "b"]
+"""
+
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSequence
+from itertools import chain
+
+LOAD = 1000
+
+
+class blockedList(MutableSequence):
+    def __init__(self, iterable=()):
+        self._build(list(iterable))
+
+    def _build(self, elements):
+        """Distributes the elements to blocks of LOAD elements"""
+        self.blocks = [elements[i:i + LOAD] for i in range(0, len(elements), LOAD)]
+        self.length = len(elements)
+        self._buildIndex()
+
+    #########################################################
+    # Fenwick tree over the lengths of the blocks
+    #########################################################
+    def _buildIndex(self):
+        tree = [0] + [len(block) for block in self.blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.highestBit = 1 << (len(self.blocks).bit_length() - 1) if self.blocks else 0
+
+    def _grow(self, block, delta):
+        """Adds delta to the length of the block in the tree"""
+        tree = self.tree
+        i = block + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+        self.length += delta
+
+    def _locate(self, index):
+        """Returns the block containing the position index and the position in the block"""
+        tree = self.tree
+        block = 0
+        bit = self.highestBit
+        while bit:
+            candidate = block + bit
+            if candidate < len(tree) and tree[candidate] <= index:
+                index -= tree[candidate]
+                block = candidate
+            bit >>= 1
+        return block, index
+
+    def _position(self, index):
+        """Converts a negative index and checks its range like a list"""
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("list index out of range")
+        return index
+
+    def _start(self, block):
+        """Returns the position of the first element of the block"""
+        tree = self.tree
+        position = 0
+        while block:
+            position += tree[block]
+            block -= block & -block
+        return position
+
+    #########################################################
+    # Binary search in a sorted list
+    #########################################################
+    def bisectLeft(self, value):
+        """Like bisect.bisect_left(): the first position at which value can be inserted to keep the list sorted"""
+        return self._bisect(value, bisect_left, lambda last: last < value)
+
+    def bisectRight(self, value):
+        """Like bisect.bisect_right(): the last position at which value can be inserted to keep the list sorted"""
+        return self._bisect(value, bisect_right, lambda last: not value < last)
+
+    def _bisect(self, value, bisectBlock, isBefore):
+        # Binary search for the first block whose last element is not before the value
+        blocks = self.blocks
+        low, high = 0, len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if isBefore(blocks[middle][-1]):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(blocks):
+            return self.length
+        return self._start(low) + bisectBlock(blocks[low], value)
+
+    #########################################################
+    # Sequence
+    #########################################################
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return list(self)[index]
+            result = []
+            if start >= stop:
+                return result
+            block, offset = self._locate(start)
+            while len(result) < stop - start:
+                result.extend(self.blocks[block][offset:offset + stop - start - len(result)])
+                block, offset = block + 1, 0
+            return result
+        block, offset = self._locate(self._position(index))
+        return self.blocks[block][offset]
+
+    def __setitem__(self, index, element):
+        if isinstance(index, slice):
+            elements = list(self)
+            elements[index] = element
+            self._build(elements)
+            return
+        block, offset = self._locate(self._position(index))
+        self.blocks[block][offset] = element
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            elements = list(self)
+            del elements[index]
+            self._build(elements)
+            return
+        block, offset = self._locate(self._position(index))
+        del self.blocks[block][offset]
+        self._grow(block, -1)
+        if len(self.blocks[block]) < LOAD // 2:
+            self._merge(block)
+
+    def insert(self, index, element):
+        if index < 0:
+            index = max(0, index + self.length)
+        index = min(index, self.length)
+        if not self.blocks:
+            self.blocks.append([element])
+            self.length = 1
+            self._buildIndex()
+            return
+        if index == self.length:
+            block, offset = len(self.blocks) - 1, len(self.blocks[-1])
+        else:
+            block, offset = self._locate(index)
+        self.blocks[block].insert(offset, element)
+        self._grow(block, 1)
+        if len(self.blocks[block]) > 2 * LOAD:
+            self._split(block)
+
+    def append(self, element):
+        if self.blocks and len(self.blocks[-1]) < 2 * LOAD:
+            self.blocks[-1].append(element)
+            self._grow(len(self.blocks) - 1, 1)
+        else:
+            self.blocks.append([element])
+            self.length += 1
+            self._buildIndex()
+
+    def _split(self, block):
+        elements = self.blocks[block]
+        self.blocks[block:block + 1] = [elements[:LOAD], elements[LOAD:]]
+        self._buildIndex()
+
+    def _merge(self, block):
+        """Merges a small block with a neighbour, or removes it if it is empty"""
+        blocks = self.blocks
+        if not blocks[block]:
+            del blocks[block]
+        elif len(blocks) > 1:
+            if block == len(blocks) - 1:
+                block -= 1
+            blocks[block:block + 2] = [blocks[block] + blocks[block + 1]]
+            if len(blocks[block]) > 2 * LOAD:
+                self._split(block)
+                return
+        else:
+            return
+        self._buildIndex()
+
+    def clear(self):
+        self._build([])
+
+    def __iter__(self):
+        return chain.from_iterable(self.blocks)
+
+    def __reversed__(self):
+        for block in reversed(self.blocks):
+            yield from reversed(block)
+
+    def copy(self):
+        board = blockedList()
+        board.blocks = [list(block) for block in self.blocks]
+        board.length = self.length
+        board.tree = list(self.tree)
+        board.highestBit = self.highestBit
+        return board
+
+    def sort(self, key=None, reverse=False):
+        elements = list(self)
+        elements.sort(key=key, reverse=reverse)
+        self._build(elements)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"blockedList({list(self)!r})"
@@ -0,0 +1,73 @@
+from bisect import bisect_left, bisect_right
+import random
+import BlockedList
+
+# Checks that a blockedList gives the same results as a list. Small blocks
+# make blocks split and merge often.
+
+BlockedList.LOAD = 8
+random.seed(1)
+
+elements = list(range(100))
+blocked = BlockedList.blockedList(elements)
+for step in range(20000):
+    operation = random.choice(("get", "set", "insert", "append", "delete", "slice", "bisect"))
+    index = random.randrange(-len(elements), len(elements)) if elements else 0
+    if operation == "get" and elements:
+        assert blocked[index] == elements[index]
+    elif operation == "set" and elements:
+        blocked[index] = elements[index] = step
+    elif operation == "insert":
+        index = random.randrange(-len(elements) - 3, len(elements) + 3)
+        blocked.insert(index, step)
+        elements.insert(index, step)
+    elif operation == "append":
+        blocked.append(step)
+        elements.append(step)
+    elif operation == "delete" and elements:
+        # Delete more than insert in the second half, so the list shrinks again
+        for _ in range(1 if step < 10000 else 3):
+            if elements:
+                index = random.randrange(len(elements))
+                del blocked[index]
+                del elements[index]
+    elif operation == "slice":
+        start, stop = sorted(random.randrange(-len(elements) - 2, len(elements) + 2) for _ in range(2))
+        assert blocked[start:stop] == elements[start:stop]
+        assert blocked[stop:start] == elements[stop:start]
+    elif operation == "bisect":
+        ordered = sorted(elements)
+        value = random.randrange(-1, 20001)
+        assert BlockedList.blockedList(ordered).bisectLeft(value) == bisect_left(ordered, value)
+        assert BlockedList.blockedList(ordered).bisectRight(value) == bisect_right(ordered, value)
+    assert len(blocked) == len(elements)
+    if step % 1000 == 0:
+        assert list(blocked) == elements and list(reversed(blocked)) == elements[::-1]
+        print(f"Step {step}: {len(elements)} elements in {len(blocked.blocks)} blocks")
+assert list(blocked) == elements
+
+# Out of range like a list
+for index in (len(elements), -len(elements) - 1):
+    try:
+        blocked[index]
+        raise AssertionError(f"Index {index} was accepted")
+    except IndexError:
+        pass
+
+# Slices, copies and sorting
+blocked[2:5] = ["x", "y"]
+elements[2:5] = ["x", "y"]
+del blocked[::3]
+del elements[::3]
+copy = blocked.copy()
+blocked.append("after copy")
+assert list(copy) == elements and copy == elements
+blocked.sort(key=str)
+elements.append("after copy")
+elements.sort(key=str)
+assert list(blocked) == elements
+blocked.clear()
+assert list(blocked) == [] and len(blocked) == 0
+blocked.insert(5, "only")
+assert list(blocked) == ["only"]
+print("blockedList behaves like list")
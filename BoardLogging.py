@@ -0,0 +1,83 @@
+"""
+Logging of the board servers, storages and proxies.
+
+Every module logs through its own logger from getLogger() with lazy
+%-formatting, e.g. log.debug("PUT called: %s", message). A message is
+only formatted if the level of its module is enabled, so disabled debug
+calls on the request path cost nearly nothing. Records are passed through
+a queue to a background thread which writes them, so no request waits for
+the terminal.
+
+The levels are set with the environment variables
+  BOARD_LOG_LEVEL   level of all modules, default INFO
+  BOARD_LOG_LEVELS  levels of single modules, e.g. "BoardServer=DEBUG,Synchronize=WARNING"
+or by calling configure().
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+ROOT = "board"
+
+# Thread writing the queued records
+_listener = None
+
+
+def getLogger(name):
+    """Returns the logger of a module, name is the module name like "BoardServer"."""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def _parseLevels(spec):
+    """Parses "Module=LEVEL,Module=LEVEL" into a dict."""
+    levels = {}
+    for entry in spec.split(","):
+        if "=" in entry:
+            name, level = entry.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(level=None, levels=None, stream=None):
+    """
+    (Re-)configures logging of all modules.
+    Parameter level: Level of all modules, e.g. "DEBUG" or logging.DEBUG (default: BOARD_LOG_LEVEL or INFO)
+    Parameter levels: Dict of module name to level (default: parsed from BOARD_LOG_LEVELS)
+    Parameter stream: Stream the records are written to (default: sys.stderr)
+    """
+    global _listener
+    if level is None:
+        level = os.environ.get("BOARD_LOG_LEVEL", "INFO")
+    if levels is None:
+        levels = _parseLevels(os.environ.get("BOARD_LOG_LEVELS", ""))
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    for name, moduleLevel in levels.items():
+        getLogger(name).setLevel(moduleLevel.upper() if isinstance(moduleLevel, str) else moduleLevel)
+
+    shutdown()
+    root.handlers.clear()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    records = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.propagate = False
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def shutdown():
+    """Writes all queued records and stops the writing thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+configure()
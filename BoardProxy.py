@@ -2,56 +2,232 @@
 # https://websocket-client.readthedocs.io/en/latest/
 
 import asyncio
-import json
-from websockets.asyncio.client import connect
+import itertools
+import threading
+import AsyncBoardProxy
 
 class storage: 
-    def __init__(self, port): 
+    def __init__(self, port, poolSize=1, codecs=None): 
+        """
+        Synchronous proxy for the board server listening on port 
+        (a port number or "unix://<path>", see Address). 
+        The connections to the server are kept open and are served by an 
+        event loop running in a background thread, so one request costs 
+        one frame instead of a new connection. 
+        The methods may be called from several threads at the same time. 
+        Parameter poolSize: Number of connections to the server. 
+        Parameter codecs: Codecs to negotiate with the server (see AsyncBoardProxy). 
+        """
         self.port = port
+        self.poolSize = poolSize
+        self.codecs = codecs
+        self._loop = None        # Event loop of the background thread
+        self._thread = None
+        self._connections = []   # Multiplexed async proxies, one per connection
+        self._nextConnection = itertools.count()
+        self._startLock = threading.Lock()
+
+    def _start(self):
+        """Starts the background thread with the event loop if not already running."""
+        with self._startLock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, daemon=True)
+            self._thread.start()
+            async def createConnections():
+                return [AsyncBoardProxy.storage(self.port, -1, multiplexed=True, codecs=self.codecs) for _ in range(self.poolSize)]
+            self._connections = asyncio.run_coroutine_threadsafe(createConnections(), loop).result()
+            self._loop = loop
+
+    def _run(self, coroutine):
+        """Executes the coroutine in the background thread and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _connection(self):
+        """Returns the next connection of the pool (round robin)."""
+        return self._connections[next(self._nextConnection) % self.poolSize]
+
+    @staticmethod
+    def _result(response):
+        """Maps the error reply of the async proxy to the "ERROR" returned by this proxy."""
+        if isinstance(response, dict) and response.get("RESULT") == "ERROR":
+            return "ERROR"
+        return response
+
+    @staticmethod
+    async def _gather(requests):
+        return await asyncio.gather(*requests)
+
+    @staticmethod
+    async def _sequence(operation, arguments):
+        """Awaits the operation for each argument in turn; returns the list of the results."""
+        return [await operation(argument) for argument in arguments]
        
-    async def doOperation(self, request):
-       print("doing operations")
-       try:
-           async with connect(f"ws://localhost:{self.port}") as websocket:
-               await websocket.send(json.dumps(request))
-               res = await websocket.recv()
-               return json.loads(res)
-       except Exception as e:
-           print(f"Conn error: {e}")
-           return "ERROR"
+    def doOperation(self, request):
+       self._start()
+       return self._result(self._run(self._connection().doOperation(request)))
            
     def put(self, message): 
         req = {"COMMAND": "PUT", "MESSAGE": message}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
        
     def get(self, index):
         req = {"COMMAND": "GET", "INDEX": index}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
 
     def getNum(self): 
         req = {"COMMAND": "GETNUM"}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
         
     def getBoard(self): 
         req = {"COMMAND": "GETBOARD"}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
+
+    def streamBoard(self, chunkSize=1000): 
+        """
+        Generator yielding all messages of the board. The server streams the 
+        board in frames of chunkSize messages, so memory stays bounded by the chunk size. 
+        """
+        self._start()
+        chunks = self._connection().streamBoardChunks(chunkSize)
+        try:
+            while True:
+                try:
+                    chunk = self._run(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield from chunk
+        finally:
+            self._run(chunks.aclose())
+
+    def watch(self): 
+        """
+        Generator yielding every change applied to the board of the server as 
+        operation, e.g. {"COMMAND": "PUT", "MESSAGE": "Hi"}, or {"DROPPED": n} 
+        if the server dropped changes because this consumer was too slow. 
+        """
+        self._start()
+        changes = self._connection().watch()
+        try:
+            while True:
+                try:
+                    change = self._run(changes.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield change
+        finally:
+            self._run(changes.aclose())
+
+    def getStats(self): 
+        """Retrieves the metrics of the server (see Metrics.metricsRegistry.snapshot)."""
+        req = {"COMMAND": "STATS"}
+        return self.doOperation(req)
+
+    def getBoardIfModified(self, version=None): 
+        """
+        Retrieves the board unless it still has the given version. 
+        Returns a dict with the current "VERSION" and either the messages 
+        as "BOARD" or "NOTMODIFIED": True. 
+        """
+        req = {"COMMAND": "GETBOARD", "IFVERSION": version}
+        return self.doOperation(req)
+
+    def getChanges(self, version): 
+        """
+        Retrieves the changes applied to the board after the given version. 
+        Returns a dict with the current "VERSION" and the changes as "CHANGES", 
+        or with "RESYNC": True if the server no longer knows them and the 
+        whole board must be read again. 
+        """
+        req = {"COMMAND": "GETCHANGES", "VERSION": version}
+        return self.doOperation(req)
+
+    def getRange(self, offset, limit): 
+        """Retrieves at most limit messages from index offset on (negative offset counts from the end)."""
+        req = {"COMMAND": "GETRANGE", "OFFSET": offset, "LIMIT": limit}
+        return self.doOperation(req)
+
+    def getBoardPage(self, limit, cursor=None): 
+        """
+        Retrieves one page of at most limit messages of the board. 
+        Returns a dict with the messages as "BOARD" and the token for 
+        the next page as "CURSOR" (None after the last page). 
+        If the board changed since the page of the cursor, the reply is 
+        {"VERSION": n, "RESYNC": True} and the board must be read again from its start. 
+        """
+        req = {"COMMAND": "GETBOARD", "LIMIT": limit}
+        if cursor is not None:
+            req["CURSOR"] = cursor
+        return self.doOperation(req)
+
+    def iterBoard(self, pageSize=1000): 
+        """Generator yielding all messages of the board, retrieved page by page. Raises ConnectionError if the board changes meanwhile."""
+        cursor = None
+        while True:
+            page = self.getBoardPage(pageSize, cursor)
+            if isinstance(page, dict) and page.get("RESYNC"):
+                raise ConnectionError("Board changed while retrieving it page by page, it must be read again")
+            if not (isinstance(page, dict) and "BOARD" in page):
+                raise ConnectionError(f"Retrieving board page failed: {page}")
+            yield from page["BOARD"]
+            cursor = page.get("CURSOR")
+            if cursor is None:
+                return
         
     def modify(self, index, message): 
         req = {"COMMAND": "MODIFY", "INDEX": index, "MESSAGE": message}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
         
     def delete(self, index): 
         req = {"COMMAND": "DELETE", "INDEX": index}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
 
     def deleteAll(self): 
         req = {"COMMAND": "DELETEALL"}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
     
     def synchronize(self, otherServerId):
         req = {"COMMAND": "SYNCHRONIZE", "OTHERSERVERID": otherServerId}
-        return asyncio.run(self.doOperation(req))
+        return self.doOperation(req)
+
+    def applyBatch(self, operations): 
+        """Sends a list of operations, e.g. {"COMMAND": "PUT", "MESSAGE": "Hi"}, as one BATCH request."""
+        req = {"COMMAND": "BATCH", "OPERATIONS": operations}
+        return self.doOperation(req)
+
+    def putMany(self, messages, batchSize=1000): 
+        """
+        Stores all messages using BATCH requests of up to batchSize messages. 
+        A server may execute the requests of a connection concurrently, so 
+        each batch is sent after the reply to the previous one to keep the 
+        messages in their order. 
+        Returns the list of replies, one per batch. 
+        """
+        self._start()
+        messages = list(messages)
+        connection = self._connection()
+        batches = [messages[i:i + batchSize] for i in range(0, len(messages), batchSize)]
+        return [self._result(response) for response in self._run(self._sequence(connection.putMany, batches))]
+
+    def getMany(self, indices): 
+        """
+        Retrieves the messages with the given indices. The requests are 
+        sent without waiting for the replies in between. 
+        Returns the list of messages in the order of indices. 
+        """
+        self._start()
+        requests = [self._connection().get(index) for index in indices]
+        return [self._result(response) for response in self._run(self._gather(requests))]
         
     def close(self): 
-        pass
-        
\ No newline at end of file
+        with self._startLock:
+            if self._loop is None:
+                return
+            for connection in self._connections:
+                self._run(connection.close())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._connections = []
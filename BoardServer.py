@@ -1,11 +1,26 @@
 #!/usr/bin/env python
 
 import asyncio
+import contextlib
+import functools
 import json
 import sys
+import time
 import websockets
-from websockets.asyncio.server import serve
+from websockets.asyncio.server import serve, unix_serve
 from VectorClock import clock
+import Address
+import BoardLogging
+import Commands
+import Compression
+import Deadline
+from Commands import reply
+import Lanes
+import Metrics
+import RateLimit
+import WireCodec
+
+log = BoardLogging.getLogger("BoardServer")
 
 # Storage in which the messages of the message board are stored.
 storage = None
@@ -17,290 +32,728 @@ vector_clock = None
 # Optional sequencer object for generating sequence numbers
 sequencer_obj = None
 
-# Port number on which the server has to be started. 
+# Port number on which the server has to be started, or "unix://<path>" of a unix socket (see Address)
 port = -1 # Changed in function startServer
+# Address of the network interface the server listens on, e.g. "0.0.0.0" for all interfaces
+bindHost = "localhost"
+# Optional port of the HTTP server for the metrics
+metricsPort = None
+# Optional port or unix socket on which the other servers of the cluster send their requests (see peerHandler)
+peerPort = None
+# Connections to the peer port
+peerConnections = set()
+# Maximum number of requests executed at the same time for clients and for other servers; 
+# None means unlimited. Requests of other servers have priority (see Lanes). 
+clientBudget = None
+peerBudget = None
+requestLanes = None  # Created by serverMain
+# Number of open client connections
+openConnections = 0
+# Messages of at least this many bytes are compressed, None disables compression
+compressionThreshold = Compression.DEFAULT_THRESHOLD
+
+# Admission control (None disables each limit): 
+# Maximum number of open connections; further connections are closed with code 1013
+maxConnections = None
+# Seconds after which a connection without requests is closed
+idleTimeout = None
+# Client requests are answered with BUSY while the event loop lags more than maxLag 
+# seconds or, for updates, while an update queue holds maxQueueDepth updates
+maxLag = None
+maxQueueDepth = None
+# Interval of measuring the lag of the event loop in seconds, and the lag measured 
+# (a spike is halved with each later measurement, so it is not forgotten at once)
+LAG_INTERVAL = 0.1
+eventLoopLag = 0.0
+# Token buckets limiting the requests of each client connection (see RateLimit), None means no limits
+rateLimiter = None
+
+# Pipelined mode: requests with request id are executed concurrently (see pipelinedHandler)
+pipelining = False
+# Maximum number of concurrently executed requests per connection in pipelined mode
+maxInFlight = 64
+
+# Number of changes queued per WATCH subscriber before it counts as too slow
+watchQueueSize = 1000
+# What happens to a too slow subscriber: "disconnect" or "drop" (changes are dropped)
+watchOverflow = "disconnect"
+# Functions stopping the subscriptions of each connection
+watchers = {}
+# References to background tasks, so they are not garbage collected
+backgroundTasks = set()
+
+# Codec of each connection that negotiated one with HELLO, the others use JSON
+connectionCodecs = {}
+
+# Encoded board of the last GETBOARD as (version, encoded board), reused until the version changes
+boardCache = None
+
+
+async def encodedBoard(id):
+    """
+    Returns the version of the board and the board encoded as JSON. 
+    The encoded board is kept until the version of the storage changes. 
+    """
+    global boardCache
+    version = await storage.getVersion(id)
+    if boardCache is not None and boardCache[0] == version:
+        return version, boardCache[1]
+    board = WireCodec.encoded(json.dumps(await storage.getBoard(id), separators=(",", ":")))
+    # Only cache if no change was applied while reading the board
+    if await storage.getVersion(id) == version:
+        boardCache = (version, board)
+    return version, board
 
 
 #########################################################
-# Stub calling the methods on one storage object 
-# depending on the type of message received.  
+# Handlers of the commands on the storage object. 
+# Each one is called with the request and returns a 
+# Commands.reply; stub() builds the message sent back. 
 #########################################################
-async def stub(request):
-   command = request.get("COMMAND", "").upper()
-   print(f"STUB received command: {command}")
-   message = request.get("MESSAGE", "")
-   index =  request.get("INDEX")
+async def putCommand(request):
+   seq_num = request.get("SEQNUM")
+   if seq_num is not None:
+       result = await storage.put(request.get("MESSAGE", ""), request.get("MYID", -1), seq_num)
+   else:
+       result = await storage.put(request.get("MESSAGE", ""), request.get("MYID", -1))
+   return reply(result)
+
+async def getBoardCommand(request):
    id = request.get("MYID", -1)
+   if request.get("STREAM"):
+       # Only the version, streamBoard() reads the board chunk by chunk
+       version = await storage.getVersion(id) if hasattr(storage, 'getVersion') else None
+       return reply({"VERSION": version}, VERSION=version)
+   if "LIMIT" in request:
+       # Paged read: the cursor is "<version>:<index of the first message of the page>". 
+       # If the board changed after the first page, the next pages would skip or repeat 
+       # messages, so the client is told to read the board again (RESYNC). 
+       # Without versions of the storage, the pages may be inconsistent. 
+       limit = int(request["LIMIT"])
+       cursorVersion, _, offset = str(request.get("CURSOR") or 0).rpartition(":")
+       offset = int(offset)
+       if limit < 1 or offset < 0:
+           raise ValueError("Invalid LIMIT or CURSOR.")
+       version = await storage.getVersion(id) if hasattr(storage, 'getVersion') else None
+       if cursorVersion and version is not None and int(cursorVersion) != version:
+           result = {"VERSION": version, "RESYNC": True}
+           return reply(result, **result)
+       page = await storage.getRange(offset, limit + 1, id)
+       cursor = None
+       if len(page) > limit:
+           cursor = f"{version}:{offset + limit}" if version is not None else str(offset + limit)
+       page = page[:limit]
+       return reply({"BOARD": page, "CURSOR": cursor}, BOARD=page, CURSOR=cursor)
+   if not hasattr(storage, 'getVersion'):
+       board = await storage.getBoard(id)
+       return reply(board, BOARD=board)
+   version, board = await encodedBoard(id)
+   # With IFVERSION, the reply carries the version and omits a board the client already has
+   if "IFVERSION" in request and request["IFVERSION"] is not None and int(request["IFVERSION"]) == version:
+       return reply({"NOTMODIFIED": True, "VERSION": version}, "NOTMODIFIED", VERSION=version)
+   if "IFVERSION" in request:
+       return reply({"BOARD": board, "VERSION": version}, BOARD=board, VERSION=version)
+   return reply(board, BOARD=board, VERSION=version)
+
+async def getRangeCommand(request):
+   result = await storage.getRange(request.get("OFFSET", 0), request.get("LIMIT"), request.get("MYID", -1))
+   return reply(result, BOARD=result)
+
+async def getChangesCommand(request):
+   id = request.get("MYID", -1)
+   version = await storage.getVersion(id)
+   changes = await storage.getChanges(request.get("VERSION", 0), id)
+   # Without changes, the version is too old and the whole board must be read again
+   result = {"VERSION": version, "CHANGES": changes} if changes is not None else {"VERSION": version, "RESYNC": True}
+   return reply(result, **result)
+
+async def getCommand(request):
+   result = await storage.get(request.get("INDEX"), request.get("MYID", -1))
+   return reply(result, MESSAGE=result)
+
+async def getNumCommand(request):
+   result = await storage.getNum(request.get("MYID", -1))
+   return reply(result, NUM=result)
+
+async def modifyCommand(request):
+   seq_num = request.get("SEQNUM")
+   if seq_num is not None:
+       await storage.modify(request.get("INDEX"), request.get("MESSAGE", ""), request.get("MYID", -1), seq_num)
+   else:
+       await storage.modify(request.get("INDEX"), request.get("MESSAGE", ""), request.get("MYID", -1))
+   return reply('DONE')
+
+async def deleteCommand(request):
+   seq_num = request.get("SEQNUM")
+   if seq_num is not None:
+       await storage.delete(request.get("INDEX"), request.get("MYID", -1), seq_num)
+   else:
+       await storage.delete(request.get("INDEX"), request.get("MYID", -1))
+   return reply('DONE')
+
+async def deleteAllCommand(request):
+   seq_num = request.get("SEQNUM")
+   if seq_num is not None:
+       await storage.deleteAll(request.get("MYID", -1), seq_num)
+   else:
+       await storage.deleteAll(request.get("MYID", -1))
+   return reply('DONE')
+
+async def batchCommand(request):
+   # Apply an ordered list of operations as one unit
+   operations = request.get("OPERATIONS", [])
+   if not hasattr(storage, 'applyBatch') or not all(isinstance(op, dict) for op in operations):
+       return Commands.ERROR
    seq_num = request.get("SEQNUM")
+   if seq_num is not None:
+       result = await storage.applyBatch(operations, request.get("MYID", -1), seq_num)
+   else:
+       result = await storage.applyBatch(operations, request.get("MYID", -1))
+   return reply(result, RESULTS=result)
+
+async def statsCommand(request):
+   # Metrics of this process
+   stats = Metrics.registry.snapshot()
+   return reply(stats, STATS=stats)
+
+async def areYouAliveCommand(request):
+   # Simple health check - always returns YES
+   return reply("YES", ALIVE="YES")
+
+async def notConfiguredCommand(request):
+   # Command of an object (e.g. mutex) that was not given to startServer
+   return Commands.ERROR
+
+
+# Commands that change the board. Requests of other servers (on the peer port) with 
+# these commands are executed even after their deadline: they were already ordered 
+# or applied on another server, and skipping them here would let the replicas diverge. 
+UPDATE_COMMANDS = {"PUT", "MODIFY", "DELETE", "DELETEALL", "BATCH", "SYNCHRONIZE"}
+# Commands that are always executed, since they end a state held by the sender 
+NEVER_EXPIRING_COMMANDS = {"RELEASE", "SETCOORDINATOR"}
+
+
+def mayExpire(command, peer):
+    """Returns True if the request may be skipped after its deadline (see UPDATE_COMMANDS)"""
+    if command in NEVER_EXPIRING_COMMANDS:
+        return False
+    return not peer or command not in UPDATE_COMMANDS
+
+
+# Commands of clients that are answered even when the server is overloaded 
+NEVER_SHED_COMMANDS = {"AREYOUALIVE", "STATS", "RELEASE", "SETCOORDINATOR"}
+
+
+def overload(command, peer):
+    """Returns the reason ("lag" or "queue") for answering the request with BUSY, or None"""
+    # Requests of other servers belong to work that was already accepted
+    if peer or command in NEVER_SHED_COMMANDS:
+        return None
+    if maxLag is not None and eventLoopLag > maxLag:
+        return "lag"
+    if maxQueueDepth is not None and command in UPDATE_COMMANDS:
+        if max(Metrics.registry.gaugeValues("board_update_queue_depth"), default=0) >= maxQueueDepth:
+            return "queue"
+    return None
+
+
+# Registry of the commands this server answers. 
+# ACQUIRE/RELEASE, ELECTION/SETCOORDINATOR, GETSEQUENCENUMBER and SYNCHRONIZE 
+# are registered by the mutex, leader election, sequencer and storage objects. 
+commands = Commands.commandRegistry()
+for name, handler in [("PUT", putCommand), ("GETBOARD", getBoardCommand), ("GETRANGE", getRangeCommand), 
+                      ("GETCHANGES", getChangesCommand), ("GET", getCommand), ("GETNUM", getNumCommand), 
+                      ("MODIFY", modifyCommand), ("DELETE", deleteCommand), ("DELETEALL", deleteAllCommand), 
+                      ("BATCH", batchCommand), ("STATS", statsCommand), ("AREYOUALIVE", areYouAliveCommand), 
+                      ("ACQUIRE", notConfiguredCommand), ("RELEASE", notConfiguredCommand), 
+                      ("ELECTION", notConfiguredCommand), ("SETCOORDINATOR", notConfiguredCommand), 
+                      ("GETSEQUENCENUMBER", notConfiguredCommand), ("SYNCHRONIZE", notConfiguredCommand)]:
+    commands.register(name, handler)
+
+
+def recordCommand(command, request, response, seconds):
+    """After-hook counting each command with its latency"""
+    Metrics.registry.observe("board_command_seconds", seconds, {"command": command})
+    if response.result == "ERROR":
+        Metrics.registry.inc("board_command_errors_total", 1, {"command": command})
+
+commands.addAfterHook(recordCommand)
+
+
+#########################################################
+# Stub calling the handler of the command of a request 
+# and building the message sent back: the value of the 
+# reply for clients or the envelope with "RESULT" and 
+# the time of the vector clock for other servers. 
+# peer is True for requests received on the peer port. 
+#########################################################
+async def stub(request, peer=False):
+   return envelope(await execute(request, peer), request)
+
+
+async def execute(request, peer=False):
+   """Checks a request and calls the handler of its command. Returns the Commands.reply."""
+   command = request.get("COMMAND", "").upper()
+   log.debug("STUB received command: %s", command)
    
    # Update vector clock if timestamp is present in request
    if vector_clock is not None and "TIME" in request:
        vector_clock.updateTime(request["TIME"])
    
-   # Determine if this is a server-to-server or client-to-server request
-   is_server_request = "TIME" in request
+   handler = commands.handlers.get(command)
+   if handler is None:
+       # Unknown commands are reported together, so clients cannot create arbitrary metrics
+       command = "UNKNOWN"
+   for hook in commands.beforeHooks:
+       hook(command, request)
+   start = time.perf_counter()
+   deadline = request.get("DEADLINE")
+   reason = overload(command, peer) if handler is not None else None
+   if handler is None:
+       response = Commands.UNKNOWN
+   elif Deadline.isExpired(deadline) and mayExpire(command, peer):
+       # Nobody waits for the result any more
+       Metrics.registry.inc("board_expired_requests_total", 1, {"command": command})
+       response = Commands.EXPIRED
+   elif reason is not None:
+       Metrics.registry.inc("board_busy_replies_total", 1, {"command": command, "reason": reason})
+       response = Commands.busy(round(max(eventLoopLag, LAG_INTERVAL), 3) if reason == "lag" else Commands.DEFAULT_RETRY_AFTER)
+   else:
+       try:
+           # Nested calls of the handler (e.g. forwarding to other servers) carry the deadline
+           with Deadline.scope(deadline):
+               response = await handler(request)
+       except Commands.busyError as e:
+           Metrics.registry.inc("board_busy_replies_total", 1, {"command": command, "reason": "handler"})
+           response = Commands.busy(e.retryAfter)
+       except Exception as e:
+           log.exception("Exception in stub: %s", e)
+           response = Commands.FAILED
+   if commands.afterHooks:
+       seconds = time.perf_counter() - start
+       for hook in commands.afterHooks:
+           hook(command, request, response, seconds)
    
-   try:
-       if command == 'PUT':
-           if seq_num is not None:
-               result = await storage.put(message, id, seq_num)
-           else:
-               result = await storage.put(message, id)
-           if is_server_request:
-               return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return result
-
-       elif command == 'GETBOARD':
-           board = await storage.getBoard(id)
-           if is_server_request:
-               return {"RESULT": "OK", "BOARD": board, "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return board
-       
-       elif command == 'GET':
-           result = await storage.get(index, id)
-           if is_server_request:
-               return {"RESULT": "OK", "MESSAGE": result, "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return result
-       
-       elif command == 'GETNUM':
-           result = await storage.getNum(id)
-           if is_server_request:
-               return {"RESULT": "OK", "NUM": result, "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return result
-       
-       elif command == 'MODIFY':
-           if seq_num is not None:
-               await storage.modify(index, message, id, seq_num)
-           else:
-               await storage.modify(index, message, id)
-           if is_server_request:
-               return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return 'DONE'
-       
-       elif command == 'DELETE':
-           if seq_num is not None:
-               await storage.delete(index, id, seq_num)
-           else:
-               await storage.delete(index, id)
-           if is_server_request:
-               return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return 'DONE'
-       
-       elif command == 'DELETEALL':
-           if seq_num is not None:
-               await storage.deleteAll(id, seq_num)
-           else:
-               await storage.deleteAll(id)
-           if is_server_request:
-               return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return 'DONE'
-       
-       elif command == 'ACQUIRE':
-           # Acquire the mutex if available
-           if mutex_obj is None:
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           try:
-               result = await mutex_obj.acquire()
-               if is_server_request:
-                   return {"RESULT": "OK" if result else "BUSY", "ACQUIRED": result, "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return result
-           except Exception as e:
-               print(f"Mutex acquire error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-
-       elif command == 'RELEASE':
-           # Release the mutex if available
-           if mutex_obj is None:
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           try:
-               await mutex_obj.release()
-               if is_server_request:
-                   return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return 'DONE'
-           except Exception as e:
-               print(f"Mutex release error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-
-       elif command == 'AREYOUALIVE':
-           # Simple health check - always returns YES
-           if is_server_request:
-               return {"RESULT": "OK", "ALIVE": "YES", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return "YES"
-
-       elif command == 'ELECTION':
-           # Call election method on leader election object
-           if leader_obj is None:
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           try:
-               result = await leader_obj.election()
-               if is_server_request:
-                   return {"RESULT": "OK", "RESPONSE": result, "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return result
-           except Exception as e:
-               print(f"Election error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-
-       elif command == 'SETCOORDINATOR':
-           # Call setCoordinator method on leader election object
-           if leader_obj is None:
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           try:
-               coordinatorID = request.get("COORDINATORID")
-               if coordinatorID is None:
-                   if is_server_request:
-                       return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-                   else:
-                       return "ERROR"
-               await leader_obj.setCoordinator(coordinatorID)
-               if is_server_request:
-                   return {"RESULT": "OK", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return 'DONE'
-           except Exception as e:
-               print(f"SetCoordinator error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-
-       elif command == 'GETSEQUENCENUMBER':
-           # Get sequence number from sequencer object
-           if sequencer_obj is None:
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           try:
-               seq_num = await sequencer_obj.getSequenceNumber()
-               if is_server_request:
-                   return {"RESULT": "OK", "SEQNUM": seq_num, "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return seq_num
-           except Exception as e:
-               print(f"GetSequenceNumber error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-
-       elif command == 'SYNCHRONIZE':
-           # Synchronize with another server
-           print(f"SYNCHRONIZE command received")
-           other_server_id = request.get("OTHERSERVERID")
-           print(f"  other_server_id: {other_server_id}, type: {type(other_server_id)}")
-           print(f"  senderID: {id}")
-           
-           if other_server_id is None:
-               print(f"  ERROR: other_server_id is None")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           
-           # Check if storage has synchronize method
-           if not hasattr(storage, 'synchronize'):
-               print(f"  ERROR: storage object does not have synchronize method")
-               print(f"  storage type: {type(storage)}")
-               print(f"  storage methods: {dir(storage)}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
-           
-           try:
-               print(f"  Calling storage.synchronize({other_server_id}, {id})")
-               result = await storage.synchronize(other_server_id, id)
-               print(f"  Result: {result}")
-               if is_server_request:
-                   return {"RESULT": result, "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return result
-           except Exception as e:
-               print(f"Synchronize error: {e}")
-               if is_server_request:
-                   return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-               else:
-                   return "ERROR"
- 
-       else:
-           if is_server_request:
-               return {"RESULT": "UNKNOWN", "TIME": vector_clock.getTime() if vector_clock else []}
-           else:
-               return "A-ERR"
-   except Exception as e:
-       print(f"Exception in stub: {e}")
-       import traceback
-       traceback.print_exc()
-       if is_server_request:
-           return {"RESULT": "ERROR", "TIME": vector_clock.getTime() if vector_clock else []}
-       else:
-           return "B-ERR"
+   return response
+
+
+def envelope(response, request):
+    """Message for a reply: its value for clients or the envelope for other servers (requests with "TIME")"""
+    if "TIME" in request:
+        return {"RESULT": response.result, **response.fields, "TIME": vector_clock.getTime() if vector_clock else []}
+    return response.value
+
+#########################################################
+# Sends the reply for one request. A request carrying a 
+# request id ("REQID") gets a reply tagged with the same id, 
+# so that the client can match replies arriving out of order. 
+#########################################################
+async def sendReply(websocket, request, response):
+    if isinstance(request, dict) and "REQID" in request:
+        response = {"REQID": request["REQID"], "REPLY": response}
+    await websocket.send(codecOf(websocket).encode(response))
+
+
+async def sendError(websocket, request, e):
+    """Answers a request that raised an exception with "ERROR: ...", tagged like any reply"""
+    await sendReply(websocket, request, f"ERROR: {str(e)}")
+
+
+def codecOf(websocket):
+    return connectionCodecs.get(websocket, WireCodec.JSON)
+
+
+#########################################################
+# Chooses the codec of the connection for a HELLO request 
+# (see WireCodec). The reply itself is still sent as JSON. 
+#########################################################
+async def negotiateCodec(websocket, request):
+    codec = WireCodec.choose(request.get("CODECS"))
+    await sendReply(websocket, request, {"CODEC": codec.name})
+    connectionCodecs[websocket] = codec
+
+
+#########################################################
+# Takes the tokens of a request of a client from its 
+# buckets. Returns 0 if the request is allowed, otherwise 
+# the seconds the client has to wait. Requests on the 
+# peer port are not limited. 
+#########################################################
+def throttle(websocket, command, request):
+    if rateLimiter is None or websocket in peerConnections or command == "HELLO":
+        return 0
+    commandClass = RateLimit.commandClass(command)
+    cost = len(request.get("OPERATIONS") or ()) if command == "BATCH" else 1
+    wait = rateLimiter.take(websocket, commandClass, max(cost, 1))
+    if wait:
+        Metrics.registry.inc("board_throttled_requests_total", 1, {"class": commandClass})
+    return wait
+
+
+async def answerRequest(websocket, request):
+    if isinstance(request, dict):
+        command = request.get("COMMAND", "").upper()
+        wait = throttle(websocket, command, request)
+        if wait:
+            await sendReply(websocket, request, envelope(Commands.throttled(round(wait, 3)), request))
+            return
+        # Commands working on the connection itself instead of one reply
+        if command == "GETBOARD" and request.get("STREAM"):
+            await streamBoard(websocket, request, websocket in peerConnections)
+            return
+        if command == "WATCH":
+            await startWatching(websocket, request)
+            return
+        if command == "HELLO":
+            await negotiateCodec(websocket, request)
+            return
+    async with laneSlots(websocket):
+        response = await stub(request, websocket in peerConnections)
+    await sendReply(websocket, request, response)
+
+
+def laneSlots(websocket):
+    """Slot of a request in the lane (clients or peers) of the connection, see Lanes"""
+    if requestLanes is None:
+        return contextlib.nullcontext()
+    return requestLanes.slot(websocket in peerConnections)
+
+
+#########################################################
+# Sends the board for a GETBOARD request with "STREAM" as 
+# frames {"CHUNK": [...]} of at most CHUNKSIZE messages, 
+# followed by the end marker {"END": True, "COUNT": n}. 
+# The request is checked and counted like any other one 
+# (see execute). Only one chunk is read from the storage 
+# and encoded at a time, and send() waits while the write 
+# buffer of the websocket is full. So memory stays bounded 
+# by the chunk size. Each chunk is read at the version of 
+# the board when the stream started; if the board changed, 
+# the stream ends with {"END": True, "RESYNC": True, ...} 
+# and the board must be read again. Without versions of 
+# the storage, changes during the stream are not detected. 
+#########################################################
+async def streamBoard(websocket, request, peer=False):
+    chunkSize = int(request.get("CHUNKSIZE", 1000))
+    if chunkSize < 1:
+        raise ValueError("Invalid CHUNKSIZE.")
+    async with laneSlots(websocket):
+        response = await execute(request, peer)
+    if response.result != "OK":
+        # E.g. BUSY or EXPIRED
+        await sendReply(websocket, request, envelope(response, request))
+        return
+    version = response.fields["VERSION"]
+    id = request.get("MYID", -1)
+    tag = {"REQID": request["REQID"]} if "REQID" in request else {}
+    codec = codecOf(websocket)
+
+    offset = 0
+    end = {**tag, "END": True}
+    while True:
+        # getVersion() and getRange() of the storages do not wait in between, so no change can come between them
+        if version is not None and await storage.getVersion(id) != version:
+            end.update(RESYNC=True, VERSION=await storage.getVersion(id))
+            break
+        chunk = await storage.getRange(offset, chunkSize, id)
+        if chunk:
+            await websocket.send(codec.encode({**tag, "CHUNK": chunk}))
+        offset += len(chunk)
+        if len(chunk) < chunkSize:
+            break
+
+    end["COUNT"] = offset
+    if "TIME" in request:
+        end["TIME"] = vector_clock.getTime() if vector_clock else []
+    await websocket.send(codec.encode(end))
+
+
+#########################################################
+# Registers the connection of a WATCH request as subscriber 
+# of the storage. Every change applied to the board is then 
+# pushed as frame {"EVENT": change}. Each subscriber has a 
+# queue of watchQueueSize changes. If it is full, the 
+# subscriber is too slow. It is disconnected or, if 
+# watchOverflow is "drop", the change is dropped and the 
+# number of dropped changes is sent as {"DROPPED": n} 
+# before the next change. 
+#########################################################
+async def startWatching(websocket, request):
+    if vector_clock is not None and "TIME" in request:
+        vector_clock.updateTime(request["TIME"])
+    if not hasattr(storage, 'subscribe'):
+        await sendReply(websocket, request, envelope(Commands.ERROR, request))
+        return
+
+    tag = {"REQID": request["REQID"]} if "REQID" in request else {}
+    queue = asyncio.Queue(maxsize=watchQueueSize)  # Items: (number of changes dropped before, change)
+    dropped = 0
+
+    def listener(change):
+        nonlocal dropped
+        try:
+            queue.put_nowait((dropped, change))
+            dropped = 0
+        except asyncio.QueueFull:
+            if watchOverflow == "drop":
+                dropped += 1
+            else:
+                log.warning("WATCH subscriber too slow, disconnecting")
+                stop()
+                closing = asyncio.create_task(websocket.close(1013, "Subscriber too slow"))
+                backgroundTasks.add(closing)
+                closing.add_done_callback(backgroundTasks.discard)
+
+    async def sendChanges():
+        codec = codecOf(websocket)
+        try:
+            while True:
+                droppedBefore, change = await queue.get()
+                if droppedBefore:
+                    await websocket.send(codec.encode({**tag, "DROPPED": droppedBefore}))
+                await websocket.send(codec.encode({**tag, "EVENT": change}))
+        except websockets.ConnectionClosed:
+            stop()
+
+    def stop():
+        storage.unsubscribe(listener)
+        sender.cancel()
+
+    storage.subscribe(listener)
+    sender = asyncio.create_task(sendChanges())
+    watchers.setdefault(websocket, []).append(stop)
+    await sendReply(websocket, request, envelope(reply("OK"), request))
+
+
+def stopWatching(websocket):
+    """Ends all subscriptions of a closed connection"""
+    for stop in watchers.pop(websocket, []):
+        stop()
+
+
+#########################################################
+# Yields the messages of a connection like iterating over 
+# the websocket. A connection that sent no message for 
+# idleTimeout seconds is closed, unless it is watching or 
+# inProgress (the running requests of the connection) is 
+# not empty. 
+#########################################################
+async def messages(websocket, inProgress=None):
+    while True:
+        try:
+            # Connections of other servers are kept open while idle
+            async with asyncio.timeout(idleTimeout if websocket not in peerConnections else None):
+                msg = await websocket.recv()
+        except websockets.ConnectionClosedOK:
+            return
+        except TimeoutError:
+            if inProgress or websocket in watchers:
+                continue
+            log.info("Closing connection idle for %s s", idleTimeout)
+            Metrics.registry.inc("board_idle_connections_closed_total")
+            await websocket.close(1001, "Idle timeout")
+            return
+        yield msg
+
 
 #########################################################
 # Handler for performing server tasks of one client connection
 #########################################################
 async def handler(websocket):
-    async for msg in websocket:
+    global openConnections
+    if maxConnections is not None and openConnections >= maxConnections:
+        log.warning("Refusing connection, %s connections are open", openConnections)
+        Metrics.registry.inc("board_refused_connections_total")
+        await websocket.close(1013, "Too many connections")
+        return
+    openConnections += 1
+    try:
+        await serveConnection(websocket)
+    finally:
+        openConnections -= 1
+
+
+#########################################################
+# Handler of the connections to the peer port. The other 
+# servers of the cluster send their requests there (e.g. 
+# replicated updates, ELECTION, ACQUIRE, GETSEQUENCENUMBER), 
+# so they do not wait behind the requests of clients. 
+# Peer requests are executed with their own budget 
+# (peerBudget) and before waiting client requests (see 
+# Lanes). They are not subject to the connection limit, 
+# idle timeout, rate limits or overload shedding of 
+# clients, and their updates are executed even after their 
+# deadline. Only the connection decides this, not fields 
+# of the request (e.g. "MYID"). 
+#########################################################
+async def peerHandler(websocket):
+    peerConnections.add(websocket)
+    try:
+        await serveConnection(websocket)
+    finally:
+        peerConnections.discard(websocket)
+
+
+async def serveConnection(websocket):
+    try:
+        if pipelining:
+            await pipelinedHandler(websocket)
+            return
+        async for msg in messages(websocket):
+            request = None
+            try:
+                request = codecOf(websocket).decode(msg)
+                await answerRequest(websocket, request)
+            except Exception as e:
+                await sendError(websocket, request, e)
+    finally:
+        stopWatching(websocket)
+        if rateLimiter is not None:
+            rateLimiter.forget(websocket)
+        connectionCodecs.pop(websocket, None)
+
+
+#########################################################
+# Handler of one connection in pipelined mode. 
+# Each frame with a request id is executed in its own task, 
+# so a slow command does not block the commands behind it. 
+# At most maxInFlight requests of the connection run at 
+# the same time; then no further frames are read until 
+# one of them has finished. 
+# Frames without request id are answered in order as before. 
+#########################################################
+async def pipelinedHandler(websocket):
+    slots = asyncio.Semaphore(maxInFlight)
+    tasks = set()  # References to running tasks, so they are not garbage collected
+
+    async def answerInTask(request):
         try:
-            request = json.loads(msg)
-            response = await stub(request)
-            await websocket.send(json.dumps(response))
+            await answerRequest(websocket, request)
+        except websockets.ConnectionClosed:
+            pass  # Client is gone, nobody waits for the reply
         except Exception as e:
-            await websocket.send(json.dumps(f"ERROR: {str(e)}"))
+            log.error("Exception in pipelined request: %s", e)
+            try:
+                await sendError(websocket, request, e)
+            except websockets.ConnectionClosed:
+                pass
+        finally:
+            slots.release()
+
+    async for msg in messages(websocket, tasks):
+        try:
+            request = codecOf(websocket).decode(msg)
+        except Exception as e:
+            await sendError(websocket, None, e)
+            continue
+
+        if not (isinstance(request, dict) and "REQID" in request):
+            try:
+                await answerRequest(websocket, request)
+            except Exception as e:
+                await sendError(websocket, request, e)
+            continue
+
+        await slots.acquire()
+        task = asyncio.create_task(answerInTask(request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+#########################################################
+# Measures how late the event loop resumes a sleeping task. 
+# A large lag means that the server cannot keep up with 
+# its work (see maxLag). 
+#########################################################
+async def monitorLag():
+    global eventLoopLag
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        eventLoopLag = max(loop.time() - start - LAG_INTERVAL, eventLoopLag / 2)
 
 
 #########################################################
 # Code for starting the server 
 #########################################################
 async def serverMain():          
-    async with websockets.serve(handler, "localhost", port):
-        print(f"BoardServer running on ws://localhost:{port}")
+    global requestLanes
+    # Without peer port, the requests of other servers come in the client lane and may wait 
+    # for each other there (e.g. the coordinator sending an update to itself), so it is not limited 
+    requestLanes = Lanes.lanes(clientBudget if peerPort is not None else None, peerBudget)
+    for lane, peer in (("client", False), ("peer", True)):
+        Metrics.registry.gauge("board_queued_requests", functools.partial(requestLanes.queued, peer), {"lane": lane})
+    lagMonitor = asyncio.create_task(monitorLag())
+    Metrics.registry.gauge("board_event_loop_lag_seconds", lambda: eventLoopLag)
+    Metrics.registry.gauge("board_open_connections", lambda: openConnections)
+    Metrics.registry.gauge("board_watching_connections", lambda: len(watchers))
+    Metrics.registry.gauge("board_open_peer_connections", lambda: len(peerConnections))
+    if vector_clock is not None:
+        Metrics.registry.gauge("board_vector_clock_entries", lambda: len(vector_clock.getTime()))
+    if metricsPort is not None:
+        await Metrics.serveHttp(metricsPort, bindHost)
+        log.info("Metrics available on http://%s:%s", bindHost, metricsPort)
+    if compressionThreshold is None:
+        options = {"compression": None}
+    else:
+        options = {"extensions": Compression.serverExtensions(compressionThreshold)}
+    async with contextlib.AsyncExitStack() as listeners:
+        await listeners.enter_async_context(listen(handler, port, options))
+        log.info("BoardServer running on %s", Address.describe(port if bindHost == "localhost" else f"{bindHost}:{port}"))
+        if peerPort is not None:
+            await listeners.enter_async_context(listen(peerHandler, peerPort, options))
+            log.info("Listening for other servers on %s", Address.describe(peerPort if bindHost == "localhost" else f"{bindHost}:{peerPort}"))
         await asyncio.Future() 
 
+
+def listen(connectionHandler, address, options):
+    """Server for a port on bindHost or for a unix socket "unix://<path>" """
+    path = Address.unixPath(address)
+    if path is not None:
+        return unix_serve(connectionHandler, path, **options)
+    return websockets.serve(connectionHandler, bindHost, address, **options)
+
 # Called by the main module to start the server
-def startServer(portToUse, storageToUse, serverID=0, mutex=None, leader=None, vClock=None, sequencerParam=None): 
-    global port
+def startServer(portToUse, storageToUse, serverID=0, mutex=None, leader=None, vClock=None, sequencerParam=None, pipelined=False, maxInFlightPerConnection=64, 
+                watchQueueLimit=1000, watchOverflowPolicy="disconnect", metricsPortToUse=None, 
+                compressionMinSize=Compression.DEFAULT_THRESHOLD, maxConnectionsToAccept=None, idleTimeoutSeconds=None, 
+                maxEventLoopLag=None, maxUpdateQueueDepth=None, rateLimits=None, peerPortToUse=None, 
+                maxClientRequests=Lanes.DEFAULT_CLIENT_BUDGET, maxPeerRequests=None, host="localhost"): 
+    global port, bindHost, metricsPort, compressionThreshold, peerPort, clientBudget, peerBudget
+    global maxConnections, idleTimeout, maxLag, maxQueueDepth, rateLimiter
     global storage
     global myID, mutex_obj, leader_obj, vector_clock, sequencer_obj
+    global pipelining, maxInFlight
+    global watchQueueSize, watchOverflow
     
     port = portToUse
+    bindHost = host
+    metricsPort = metricsPortToUse
+    peerPort = peerPortToUse
+    clientBudget = maxClientRequests
+    peerBudget = maxPeerRequests
+    compressionThreshold = compressionMinSize
+    maxConnections = maxConnectionsToAccept
+    idleTimeout = idleTimeoutSeconds
+    maxLag = maxEventLoopLag
+    maxQueueDepth = maxUpdateQueueDepth
+    # rateLimits: (rate per second, burst) of each class of commands, e.g. {"write": (50, 100)}
+    rateLimiter = RateLimit.rateLimiter(rateLimits) if rateLimits else None
     storage = storageToUse
     mutex_obj = mutex
     leader_obj = leader
     vector_clock = vClock
     sequencer_obj = sequencerParam
+    pipelining = pipelined
+    maxInFlight = maxInFlightPerConnection
+    watchQueueSize = watchQueueLimit
+    watchOverflow = watchOverflowPolicy
+    
+    # Objects of the protocols add their commands
+    for obj in (storage, mutex_obj, leader_obj, sequencer_obj):
+        if hasattr(obj, 'registerCommands'):
+            obj.registerCommands(commands)
     
     asyncio.run(serverMain())
     
\ No newline at end of file
@@ -3,7 +3,7 @@ class storage:
         self.messages = []
         
     def put(self, message): 
-        self.messages = self.messages + [message]
+        self.messages.append(message)
        
     def get(self, index): 
         index = int(index)
@@ -24,7 +24,8 @@ class storage:
         
     def delete(self, index): 
         index = int(index)
-        self.messages = [self.messages[i] for i in range(len(self.messages)) if i != index]
+        if index >= 0 and index < len(self.messages): 
+            del self.messages[index]
 
     def deleteAll(self): 
         self.messages = []
@@ -1,7 +1,13 @@
 import asyncio
+import BoardLogging
+import Commands
+import Deadline
+import Metrics
+
+log = BoardLogging.getLogger("CentralizedActiveReplicationProtocol")
 
 class storage: 
-    def __init__(self, messageBoard, proxies, myID, leaderElection, sequencerProxy=None): 
+    def __init__(self, messageBoard, proxies, myID, leaderElection, sequencerProxy=None, maxQueueSize=None): 
         self.messageBoard = messageBoard
         self.proxies = proxies
         self.myID = myID
@@ -10,24 +16,30 @@ class storage:
         self._update_queue = asyncio.PriorityQueue()
         self._update_task_started = False
         self._update_task = None
+        self.maxQueueSize = maxQueueSize  # Client updates waiting at most; None means unlimited
+        Metrics.registry.gauge("board_update_queue_depth", self._update_queue.qsize, {"queue": "CentralizedActiveReplicationProtocol", "server": str(myID)})
         self._next_expected_seq = 1  # Track next expected sequence number (sequencer starts at 1)
 
     async def put(self, message, senderID=0, sequenceNumber=None): 
-        print(f"PUT called: message={message}, senderID={senderID}, sequenceNumber={sequenceNumber}, myID={self.myID}")
+        log.debug("PUT called: message=%s, senderID=%s, sequenceNumber=%s, myID=%s", message, senderID, sequenceNumber, self.myID)
         
         # Check if this is from a client (senderID == -1) or from another server
         if senderID == -1:
+            self._admit()
             # Client call: get sequence number from sequencer and forward to all servers
-            print(f"Client call detected, getting sequence number from sequencer")
+            log.debug("Client call detected, getting sequence number from sequencer")
             if self.sequencerProxy is None:
-                print("ERROR: No sequencer proxy available")
+                log.error("No sequencer proxy available")
                 return 'ERROR'
             
             try:
                 seq_num = await self.sequencerProxy.getSequenceNumber()
-                print(f"Got sequence number: {seq_num}")
+                if not isinstance(seq_num, int):
+                    # Error reply, e.g. EXPIRED if the deadline of the request has passed
+                    raise ValueError(f"No sequence number: {seq_num}")
+                log.debug("Got sequence number: %s", seq_num)
             except Exception as e:
-                print(f"Failed to get sequence number: {e}")
+                log.error("Failed to get sequence number: %s", e)
                 return 'ERROR'
             
             # Forward to all other servers with sequence number
@@ -37,7 +49,7 @@ class storage:
                 try:
                     await proxy.put(message, seq_num)
                 except Exception as e:
-                    print(f"Failed to forward PUT to server {i}: {e}")
+                    log.error("Failed to forward PUT to server %s: %s", i, e)
             
             # Enqueue for local execution with sequence number as priority
             await self._update_queue.put((seq_num, "PUT", message))
@@ -45,7 +57,7 @@ class storage:
             return 'QUEUED'
         else:
             # Server-to-server call: enqueue with sequence number
-            print(f"Server-to-server call detected, enqueueing with sequence number {sequenceNumber}")
+            log.debug("Server-to-server call detected, enqueueing with sequence number %s", sequenceNumber)
             await self._update_queue.put((sequenceNumber, "PUT", message))
             self._ensure_update_task()
             return 'DONE'
@@ -59,19 +71,39 @@ class storage:
     async def getBoard(self, senderID=0): 
         return await self.messageBoard.getBoard()
         
+    async def getRange(self, offset, limit, senderID=0): 
+        return await self.messageBoard.getRange(offset, limit)
+        
+    async def getVersion(self, senderID=0): 
+        return await self.messageBoard.getVersion()
+        
+    async def getChanges(self, version, senderID=0): 
+        return await self.messageBoard.getChanges(version)
+        
+    def subscribe(self, listener): 
+        self.messageBoard.subscribe(listener)
+        
+    def unsubscribe(self, listener): 
+        self.messageBoard.unsubscribe(listener)
+        
     async def modify(self, index, message, senderID=0, sequenceNumber=None): 
-        print(f"MODIFY called: index={index}, message={message}, senderID={senderID}, sequenceNumber={sequenceNumber}")
+        log.debug("MODIFY called: index=%s, message=%s, senderID=%s, sequenceNumber=%s", index, message, senderID, sequenceNumber)
         
         if senderID == -1:
+        
+            self._admit()
             # Client call: get sequence number and forward to all servers
             if self.sequencerProxy is None:
                 return 'ERROR'
             
             try:
                 seq_num = await self.sequencerProxy.getSequenceNumber()
-                print(f"Got sequence number: {seq_num}")
+                if not isinstance(seq_num, int):
+                    # Error reply, e.g. EXPIRED if the deadline of the request has passed
+                    raise ValueError(f"No sequence number: {seq_num}")
+                log.debug("Got sequence number: %s", seq_num)
             except Exception as e:
-                print(f"Failed to get sequence number: {e}")
+                log.error("Failed to get sequence number: %s", e)
                 return 'ERROR'
             
             # Forward to all other servers
@@ -81,7 +113,7 @@ class storage:
                 try:
                     await proxy.modify(index, message, seq_num)
                 except Exception as e:
-                    print(f"Failed to forward MODIFY to server {i}: {e}")
+                    log.error("Failed to forward MODIFY to server %s: %s", i, e)
             
             # Enqueue for local execution
             await self._update_queue.put((seq_num, "MODIFY", index, message))
@@ -94,18 +126,23 @@ class storage:
             return 'DONE'
         
     async def delete(self, index, senderID=0, sequenceNumber=None): 
-        print(f"DELETE called: index={index}, senderID={senderID}, sequenceNumber={sequenceNumber}")
+        log.debug("DELETE called: index=%s, senderID=%s, sequenceNumber=%s", index, senderID, sequenceNumber)
         
         if senderID == -1:
+        
+            self._admit()
             # Client call: get sequence number and forward to all servers
             if self.sequencerProxy is None:
                 return 'ERROR'
             
             try:
                 seq_num = await self.sequencerProxy.getSequenceNumber()
-                print(f"Got sequence number: {seq_num}")
+                if not isinstance(seq_num, int):
+                    # Error reply, e.g. EXPIRED if the deadline of the request has passed
+                    raise ValueError(f"No sequence number: {seq_num}")
+                log.debug("Got sequence number: %s", seq_num)
             except Exception as e:
-                print(f"Failed to get sequence number: {e}")
+                log.error("Failed to get sequence number: %s", e)
                 return 'ERROR'
             
             # Forward to all other servers
@@ -115,7 +152,7 @@ class storage:
                 try:
                     await proxy.delete(index, seq_num)
                 except Exception as e:
-                    print(f"Failed to forward DELETE to server {i}: {e}")
+                    log.error("Failed to forward DELETE to server %s: %s", i, e)
             
             # Enqueue for local execution
             await self._update_queue.put((seq_num, "DELETE", index))
@@ -128,18 +165,23 @@ class storage:
             return 'DONE'
             
     async def deleteAll(self, senderID=0, sequenceNumber=None): 
-        print(f"DELETEALL called: senderID={senderID}, sequenceNumber={sequenceNumber}")
+        log.debug("DELETEALL called: senderID=%s, sequenceNumber=%s", senderID, sequenceNumber)
         
         if senderID == -1:
+        
+            self._admit()
             # Client call: get sequence number and forward to all servers
             if self.sequencerProxy is None:
                 return 'ERROR'
             
             try:
                 seq_num = await self.sequencerProxy.getSequenceNumber()
-                print(f"Got sequence number: {seq_num}")
+                if not isinstance(seq_num, int):
+                    # Error reply, e.g. EXPIRED if the deadline of the request has passed
+                    raise ValueError(f"No sequence number: {seq_num}")
+                log.debug("Got sequence number: %s", seq_num)
             except Exception as e:
-                print(f"Failed to get sequence number: {e}")
+                log.error("Failed to get sequence number: %s", e)
                 return 'ERROR'
             
             # Forward to all other servers
@@ -149,7 +191,7 @@ class storage:
                 try:
                     await proxy.deleteAll(seq_num)
                 except Exception as e:
-                    print(f"Failed to forward DELETEALL to server {i}: {e}")
+                    log.error("Failed to forward DELETEALL to server %s: %s", i, e)
             
             # Enqueue for local execution
             await self._update_queue.put((seq_num, "DELETEALL"))
@@ -161,6 +203,58 @@ class storage:
             self._ensure_update_task()
             return 'DONE'
     
+    async def putMany(self, messages, senderID=0, sequenceNumber=None): 
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], senderID, sequenceNumber)
+
+    async def applyBatch(self, operations, senderID=0, sequenceNumber=None): 
+        log.debug("BATCH called: %s operations, senderID=%s, sequenceNumber=%s", len(operations), senderID, sequenceNumber)
+        
+        if senderID == -1:
+        
+            self._admit()
+            # Client call: get one range of sequence numbers for the whole batch
+            if self.sequencerProxy is None:
+                return 'ERROR'
+            if not operations:
+                return 'DONE'
+            
+            try:
+                seq_num = await self.sequencerProxy.getSequenceNumber(len(operations))
+                if not isinstance(seq_num, int):
+                    # Error reply, e.g. EXPIRED if the deadline of the request has passed
+                    raise ValueError(f"No sequence number: {seq_num}")
+                log.debug("Got sequence numbers %s to %s", seq_num, seq_num + len(operations) - 1)
+            except Exception as e:
+                log.error("Failed to get sequence number: %s", e)
+                return 'ERROR'
+            
+            # Forward the batch as one message to all other servers
+            for i, proxy in enumerate(self.proxies):
+                if i == self.myID:
+                    continue
+                try:
+                    await proxy.applyBatch(operations, seq_num)
+                except Exception as e:
+                    log.error("Failed to forward BATCH to server %s: %s", i, e)
+            
+            # Enqueue for local execution
+            await self._update_queue.put((seq_num, "BATCH", operations))
+            self._ensure_update_task()
+            return 'QUEUED'
+        else:
+            # Server-to-server call
+            await self._update_queue.put((sequenceNumber, "BATCH", operations))
+            self._ensure_update_task()
+            return 'DONE'
+    
+    def _admit(self):
+        """Refuses a client update with BUSY while maxQueueSize updates wait in the queue"""
+        # The queue itself is not bounded, since the update task puts items back into it 
+        # and updates of other servers were already ordered and must not be refused
+        if self.maxQueueSize is not None and self._update_queue.qsize() >= self.maxQueueSize:
+            Metrics.registry.inc("board_update_queue_full_total", 1, {"queue": "CentralizedActiveReplicationProtocol"})
+            raise Commands.busyError()
+    
     def _ensure_update_task(self):
         """Start the background update task if not already started."""
         if not self._update_task_started:
@@ -168,7 +262,8 @@ class storage:
                 loop = asyncio.get_running_loop()
             except RuntimeError:
                 return
-            self._update_task = loop.create_task(self._update_task_proc())
+            # The queue outlives the request that started it, so it must not inherit its deadline
+            self._update_task = loop.create_task(self._update_task_proc(), context=Deadline.detachedContext())
             self._update_task_started = True
     
     async def _update_task_proc(self):
@@ -181,49 +276,56 @@ class storage:
             # Extract sequence number (first element) and operation
             seq_num = item[0]
             op = item[1]
+            # A batch occupies one sequence number per operation
+            count = len(item[2]) if op == "BATCH" else 1
             
-            print(f"Processing item with sequence number {seq_num}, expected: {self._next_expected_seq}")
+            log.debug("Processing item with sequence number %s, expected: %s", seq_num, self._next_expected_seq)
             
             # Check if this is the expected sequence number
             if seq_num != self._next_expected_seq:
-                print(f"Sequence number {seq_num} is not expected (waiting for {self._next_expected_seq}), re-queueing")
+                log.debug("Sequence number %s is not expected (waiting for %s), re-queueing", seq_num, self._next_expected_seq)
                 # Put back into queue and wait
                 await self._update_queue.put(item)
                 await asyncio.sleep(0.1)  # Wait before trying again
                 continue
             
             # This is the expected sequence number, execute the operation
-            print(f"Executing operation {op} with sequence number {seq_num}")
+            log.debug("Executing operation %s with sequence number %s", op, seq_num)
             
             try:
                 if op == "PUT":
                     message = item[2]
                     await self.messageBoard.put(message, self.myID, seq_num)
-                    print(f"PUT executed: {message}")
+                    log.debug("PUT executed: %s", message)
                             
                 elif op == "MODIFY":
                     index = item[2]
                     message = item[3]
                     await self.messageBoard.modify(index, message, self.myID, seq_num)
-                    print(f"MODIFY executed: index={index}, message={message}")
+                    log.debug("MODIFY executed: index=%s, message=%s", index, message)
                             
                 elif op == "DELETE":
                     index = item[2]
                     await self.messageBoard.delete(index, self.myID, seq_num)
-                    print(f"DELETE executed: index={index}")
+                    log.debug("DELETE executed: index=%s", index)
                             
                 elif op == "DELETEALL":
                     await self.messageBoard.deleteAll(self.myID, seq_num)
-                    print(f"DELETEALL executed")
+                    log.debug("DELETEALL executed")
+                
+                elif op == "BATCH":
+                    operations = item[2]
+                    await self.messageBoard.applyBatch(operations, self.myID, seq_num)
+                    log.debug("BATCH executed: %s operations", len(operations))
                 
                 # Increment expected sequence number after successful execution
-                self._next_expected_seq += 1
-                print(f"Operation completed, next expected sequence number: {self._next_expected_seq}")
+                self._next_expected_seq += count
+                log.debug("Operation completed, next expected sequence number: %s", self._next_expected_seq)
                 
             except Exception as e:
-                print(f"Error executing operation {op}: {e}")
+                log.error("Error executing operation %s: %s", op, e)
                 # Still increment to avoid getting stuck
-                self._next_expected_seq += 1
+                self._next_expected_seq += count
         
     async def close(self): 
         self.messageBoard.close()
@@ -6,11 +6,12 @@ import LeaderElection
 import Sequencer
 import logging
 import sys
+import Topology
 
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
-IdOfCoordinator = 0
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
+IdOfCoordinator = cluster.coordinator
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -18,7 +19,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts[serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 logging.basicConfig(
@@ -26,7 +27,7 @@ logging.basicConfig(
 )
 
 # Create proxies for all servers
-otherServersOfCluster = [AsyncBoardProxy.storage(serverPorts[id], serverID) for id in range(len(serverPorts))]
+otherServersOfCluster = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, codecs=["binary"]) for id in range(len(cluster))]
 
 # Create storage containing data of this server. 
 localStorage = AsyncBoardStorage.storage() 
@@ -35,7 +36,7 @@ localStorage = AsyncBoardStorage.storage()
 leaderElection = LeaderElection.election(otherServersOfCluster, serverID)
 
 # Create sequencer proxy (assuming coordinator runs sequencer)
-sequencerProxy = AsyncBoardProxy.storage(serverPorts[IdOfCoordinator], serverID)
+sequencerProxy = AsyncBoardProxy.storage(cluster.peerAddress(IdOfCoordinator), serverID, codecs=["binary"])
 
 # Create object with centralized active replication protocol
 storage = CentralizedActiveReplicationProtocol.storage(localStorage, otherServersOfCluster, serverID, leaderElection, sequencerProxy)
@@ -44,4 +45,5 @@ storage = CentralizedActiveReplicationProtocol.storage(localStorage, otherServer
 sequencer = Sequencer.sequencer()
 
 # Start server
-BoardServer.startServer(port, storage, serverID, sequencerParam=sequencer, leader=leaderElection)
+BoardServer.startServer(node.port, storage, serverID, sequencerParam=sequencer, leader=leaderElection, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
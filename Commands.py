@@ -0,0 +1,77 @@
+"""
+Registry of the commands a BoardServer answers.
+
+A command is handled by a coroutine function called with the request dict.
+It returns a reply object; the BoardServer turns it into the message for
+the client or, for requests of other servers (with "TIME"), into the
+envelope {"RESULT": ..., <fields>, "TIME": ...}. So handlers never build
+envelopes themselves.
+
+Objects given to startServer (storage, mutex, leader election, sequencer)
+can add their own commands by providing a method registerCommands(commands),
+which calls commands.register(...).
+"""
+
+
+class reply:
+    """
+    Reply of a command.
+    Parameter value: Message sent to clients
+    Parameter result: Value of "RESULT" sent to servers
+    Keyword parameters: Further fields sent to servers, e.g. BOARD=[...]
+    """
+    __slots__ = ("value", "result", "fields")
+
+    def __init__(self, value, result="OK", **fields):
+        self.value = value
+        self.result = result
+        self.fields = fields
+
+
+# Replies shared by all commands
+ERROR = reply("ERROR", "ERROR")
+UNKNOWN = reply("A-ERR", "UNKNOWN")
+FAILED = reply("B-ERR", "ERROR")  # Handler raised an exception
+EXPIRED = reply("EXPIRED", "EXPIRED")  # Deadline of the request had passed
+
+# Seconds after which a client should retry a request answered with BUSY
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def busy(retryAfter=DEFAULT_RETRY_AFTER):
+    """Reply to a request refused because the server is overloaded"""
+    return reply({"RESULT": "BUSY", "RETRYAFTER": retryAfter}, "BUSY", RETRYAFTER=retryAfter)
+
+
+def throttled(retryAfter):
+    """Reply to a request of a client that exceeded its rate limit (see RateLimit)"""
+    return reply({"RESULT": "THROTTLED", "RETRYAFTER": retryAfter}, "THROTTLED", RETRYAFTER=retryAfter)
+
+
+class busyError(Exception):
+    """Raised by a handler (or an object it calls) that cannot take more work now. Answered with busy()."""
+    def __init__(self, retryAfter=DEFAULT_RETRY_AFTER):
+        super().__init__(f"Busy, retry after {retryAfter} s")
+        self.retryAfter = retryAfter
+
+
+class commandRegistry:
+    def __init__(self):
+        self.handlers = {}
+        # Functions called before each command with (command, request)
+        self.beforeHooks = []
+        # Functions called after each command with (command, request, reply, duration in seconds)
+        self.afterHooks = []
+
+    def register(self, command, handler):
+        """Registers the coroutine function handling a command. Replaces an earlier handler."""
+        self.handlers[command.upper()] = handler
+
+    def unregister(self, command):
+        self.handlers.pop(command.upper(), None)
+
+    def addBeforeHook(self, hook):
+        self.beforeHooks.append(hook)
+
+    def addAfterHook(self, hook):
+        self.afterHooks.append(hook)
@@ -0,0 +1,100 @@
+"""
+Compression of websocket messages with a size threshold.
+
+The websockets library compresses every message with the
+"permessage-deflate" extension by default. Small messages like the
+replies to AREYOUALIVE or ACQUIRE hardly get smaller, but each costs a
+compressor call. The extension here sends messages below a threshold
+uncompressed, which the extension allows per message. Only large
+messages, like the board of a GETBOARD or SYNCHRONIZE, are compressed.
+
+The bytes before and after compression and the CPU time of compressing
+and decompressing are counted in the Metrics registry (see STATS).
+
+Usage:
+    serve(handler, host, port, extensions=Compression.serverExtensions(1024))
+    client.connect(uri, extensions=Compression.clientExtensions(1024))
+"""
+
+import time
+from websockets.extensions.permessage_deflate import (
+    ClientPerMessageDeflateFactory,
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import OP_BINARY, OP_TEXT
+import Metrics
+
+# Smallest size of a message in bytes that is compressed
+DEFAULT_THRESHOLD = 1024
+
+# Bytes of sent messages before and after compression (for the ratio)
+_sentBytes = {"in": 0, "out": 0}
+
+
+def _ratio():
+    """Compressed size of the compressed sent messages in relation to their original size"""
+    return _sentBytes["out"] / _sentBytes["in"] if _sentBytes["in"] else 1.0
+
+
+Metrics.registry.gauge("board_compression_ratio", _ratio)
+
+
+class thresholdPerMessageDeflate(PerMessageDeflate):
+    def __init__(self, extension, threshold):
+        """Takes over the negotiated parameters of extension and compresses messages of at least threshold bytes."""
+        super().__init__(extension.remote_no_context_takeover, extension.local_no_context_takeover,
+                         extension.remote_max_window_bits, extension.local_max_window_bits,
+                         extension.compress_settings)
+        self.threshold = threshold
+
+    def encode(self, frame):
+        # Only whole messages are left uncompressed; a fragmented message is compressed as a whole
+        if frame.opcode in (OP_TEXT, OP_BINARY) and frame.fin and len(frame.data) < self.threshold:
+            Metrics.registry.inc("board_compression_skipped_total")
+            return frame
+        start = time.thread_time()
+        result = super().encode(frame)
+        Metrics.registry.inc("board_compression_seconds_total", time.thread_time() - start, {"direction": "compress"})
+        _sentBytes["in"] += len(frame.data)
+        _sentBytes["out"] += len(result.data)
+        return result
+
+    def decode(self, frame, *, max_size=None):
+        if not frame.rsv1:
+            return super().decode(frame, max_size=max_size)
+        start = time.thread_time()
+        result = super().decode(frame, max_size=max_size)
+        Metrics.registry.inc("board_compression_seconds_total", time.thread_time() - start, {"direction": "decompress"})
+        return result
+
+
+class thresholdServerFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, threshold, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, thresholdPerMessageDeflate(extension, self.threshold)
+
+
+class thresholdClientFactory(ClientPerMessageDeflateFactory):
+    def __init__(self, threshold, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = threshold
+
+    def process_response_params(self, params, accepted_extensions):
+        extension = super().process_response_params(params, accepted_extensions)
+        return thresholdPerMessageDeflate(extension, self.threshold)
+
+
+def serverExtensions(threshold=DEFAULT_THRESHOLD):
+    """Extensions for websockets.serve() with the default settings of websockets"""
+    return [thresholdServerFactory(threshold, server_max_window_bits=12, client_max_window_bits=12,
+                                   compress_settings={"memLevel": 5})]
+
+
+def clientExtensions(threshold=DEFAULT_THRESHOLD):
+    """Extensions for client.connect() with the default settings of websockets"""
+    return [thresholdClientFactory(threshold, client_max_window_bits=True, compress_settings={"memLevel": 5})]
@@ -0,0 +1,65 @@
+"""
+Deadlines of requests.
+
+A deadline is the absolute time (time.time(), seconds since the epoch) after
+which nobody waits for the result of a request any more. It is kept in a
+context variable, so it follows the request through all awaited calls:
+AsyncBoardProxy adds the current deadline to each request as "DEADLINE",
+and BoardServer sets it again while it handles such a request. So a request
+forwarded to the coordinator, the sequencer or the other servers carries the
+deadline of the client request it serves.
+
+    with Deadline.within(3):       # At most 3 seconds from now
+        await proxy.put("Hi")
+
+The servers of a cluster are expected to have synchronized clocks.
+"""
+
+import contextlib
+import contextvars
+import time
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+def get():
+    """Returns the deadline of the current request or None."""
+    return _deadline.get()
+
+
+def isExpired(deadline):
+    return deadline is not None and time.time() > deadline
+
+
+def expired():
+    """Returns True if the deadline of the current request has passed."""
+    return isExpired(_deadline.get())
+
+
+@contextlib.contextmanager
+def scope(deadline):
+    """Sets the deadline while the block runs. An earlier deadline that is already set is kept."""
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def within(seconds):
+    """Sets the deadline to seconds from now while the block runs (see scope)."""
+    return scope(time.time() + seconds)
+
+
+def detachedContext():
+    """
+    Returns a copy of the current context without deadline, for background
+    tasks (e.g. update queues) that outlive the request that started them:
+    asyncio.create_task(coroutine, context=Deadline.detachedContext())
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
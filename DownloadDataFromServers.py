@@ -1,7 +1,9 @@
 import time
 import BoardProxy
+import Topology
 
-proxy = BoardProxy.storage(10000)
+cluster = Topology.load() # Servers of the cluster (see Topology)
+proxy = BoardProxy.storage(cluster.clientAddress(0))
 
 
 def firstDownload():
@@ -1,12 +1,21 @@
 import asyncio
+import BoardLogging
+import Deadline
+import Metrics
+
+log = BoardLogging.getLogger("FaultTolerantProxy")
 
 class storage: 
-    def __init__(self, proxy): 
+    def __init__(self, proxy, maxQueueSize=None): 
         self.proxy = proxy
-        self._update_queue = asyncio.Queue()
+        # Updates waiting for their retry at most; None means unlimited. The updates were 
+        # already applied on other servers and are never dropped: if the queue is full, 
+        # the caller waits until the server is reachable again. 
+        self._update_queue = asyncio.Queue(maxsize=maxQueueSize or 0)
         self._update_task_started = False
         self._update_task = None
         self._retry_delay = 1.0  # Retry delay in seconds
+        Metrics.registry.gauge("board_update_queue_depth", self._update_queue.qsize, {"queue": "FaultTolerantProxy", "port": str(getattr(proxy, "port", "?"))})
 
     async def put(self, message, sequenceNumber=None): 
         try:
@@ -20,7 +29,7 @@ class storage:
             return result
         except Exception as e:
             # If exception, queue for retry
-            print(f"PUT failed with exception, queueing for retry: {e}")
+            log.warning("PUT failed with exception, queueing for retry: %s", e)
             await self._update_queue.put(("PUT", message, sequenceNumber))
             self._ensure_update_task()
             return {"RESULT": "ERROR"}
@@ -34,7 +43,7 @@ class storage:
             self._ensure_update_task()
             return result
         except Exception as e:
-            print(f"MODIFY failed with exception, queueing for retry: {e}")
+            log.warning("MODIFY failed with exception, queueing for retry: %s", e)
             await self._update_queue.put(("MODIFY", index, message, sequenceNumber))
             self._ensure_update_task()
             return {"RESULT": "ERROR"}
@@ -48,7 +57,7 @@ class storage:
             self._ensure_update_task()
             return result
         except Exception as e:
-            print(f"DELETE failed with exception, queueing for retry: {e}")
+            log.warning("DELETE failed with exception, queueing for retry: %s", e)
             await self._update_queue.put(("DELETE", index, sequenceNumber))
             self._ensure_update_task()
             return {"RESULT": "ERROR"}
@@ -62,11 +71,28 @@ class storage:
             self._ensure_update_task()
             return result
         except Exception as e:
-            print(f"DELETEALL failed with exception, queueing for retry: {e}")
+            log.warning("DELETEALL failed with exception, queueing for retry: %s", e)
             await self._update_queue.put(("DELETEALL", sequenceNumber))
             self._ensure_update_task()
             return {"RESULT": "ERROR"}
 
+    async def putMany(self, messages, sequenceNumber=None): 
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], sequenceNumber)
+
+    async def applyBatch(self, operations, sequenceNumber=None): 
+        try:
+            result = await self.proxy.applyBatch(operations, sequenceNumber)
+            if not (isinstance(result, dict) and result.get("RESULT") == "ERROR"):
+                return result
+            await self._update_queue.put(("BATCH", operations, sequenceNumber))
+            self._ensure_update_task()
+            return result
+        except Exception as e:
+            log.warning("BATCH failed with exception, queueing for retry: %s", e)
+            await self._update_queue.put(("BATCH", operations, sequenceNumber))
+            self._ensure_update_task()
+            return {"RESULT": "ERROR"}
+
     def _ensure_update_task(self):
         """Start the background update task if not already started."""
         if not self._update_task_started:
@@ -74,7 +100,8 @@ class storage:
                 loop = asyncio.get_running_loop()
             except RuntimeError:
                 return
-            self._update_task = loop.create_task(self._update_task_proc())
+            # The queue outlives the request that started it, so it must not inherit its deadline
+            self._update_task = loop.create_task(self._update_task_proc(), context=Deadline.detachedContext())
             self._update_task_started = True
     
     async def _update_task_proc(self):
@@ -91,13 +118,13 @@ class storage:
                     result = await self._execute_operation(item)
                     # Check if operation was successful (not ERROR)
                     if isinstance(result, dict) and result.get("RESULT") == "ERROR":
-                        print(f"Operation failed, retrying in {self._retry_delay}s: {item[0]}")
+                        log.warning("Operation failed, retrying in %ss: %s", self._retry_delay, item[0])
                         await asyncio.sleep(self._retry_delay)
                     else:
                         success = True
-                        print(f"Operation successful: {item[0]}")
+                        log.debug("Operation successful: %s", item[0])
                 except Exception as e:
-                    print(f"Exception during operation, retrying in {self._retry_delay}s: {e}")
+                    log.warning("Exception during operation, retrying in %ss: %s", self._retry_delay, e)
                     await asyncio.sleep(self._retry_delay)
     
     async def _execute_operation(self, item):
@@ -120,6 +147,10 @@ class storage:
             _, sequenceNumber = item
             return await self.proxy.deleteAll(sequenceNumber)
         
+        elif operation == "BATCH":
+            _, operations, sequenceNumber = item
+            return await self.proxy.applyBatch(operations, sequenceNumber)
+        
         return {"RESULT": "ERROR"}
 
     async def get(self, index): 
@@ -131,6 +162,12 @@ class storage:
     async def getBoard(self): 
         return await self.proxy.getBoard()
         
+    async def getRange(self, offset, limit): 
+        return await self.proxy.getRange(offset, limit)
+        
+    async def getChanges(self, version): 
+        return await self.proxy.getChanges(version)
+        
     async def acquire(self):
         return await self.proxy.acquire()
         
@@ -146,8 +183,8 @@ class storage:
     async def setCoordinator(self, coordinatorID):
         return await self.proxy.setCoordinator(coordinatorID)
         
-    async def getSequenceNumber(self):
-        return await self.proxy.getSequenceNumber()
+    async def getSequenceNumber(self, count=1):
+        return await self.proxy.getSequenceNumber(count)
 
     async def close(self): 
         await self.proxy.close()
\ No newline at end of file
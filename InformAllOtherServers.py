@@ -34,6 +34,21 @@ class storage:
     async def getBoard(self, server_id=-1):
         return await self.asyncLocalStorage.getBoard(server_id)
 
+    async def getRange(self, offset, limit, server_id=-1):
+        return await self.asyncLocalStorage.getRange(offset, limit, server_id)
+
+    async def getVersion(self, server_id=-1):
+        return await self.asyncLocalStorage.getVersion(server_id)
+
+    async def getChanges(self, version, server_id=-1):
+        return await self.asyncLocalStorage.getChanges(version, server_id)
+
+    def subscribe(self, listener):
+        self.asyncLocalStorage.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.asyncLocalStorage.unsubscribe(listener)
+
     async def modify(self, index, message, server_id=-1):
         await self.asyncLocalStorage.modify(index, message, server_id)
         
@@ -52,6 +67,16 @@ class storage:
         if self._should_propagate(server_id):
             await self._inform_other_servers('deleteAll')
 
+    async def putMany(self, messages, server_id=-1):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id)
+
+    async def applyBatch(self, operations, server_id=-1):
+        results = await self.asyncLocalStorage.applyBatch(operations, server_id)
+        
+        if self._should_propagate(server_id):
+            await self._inform_other_servers('applyBatch', operations)
+        return results
+
     async def close(self):
         await self.asyncLocalStorage.close()
 
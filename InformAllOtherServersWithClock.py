@@ -19,6 +19,17 @@ class storage:
             return totalOrder(msg1[0], msg2[0])
         return 0
 
+    @staticmethod
+    def messageKey(msg):
+        """
+        Sort key of a message in the order of compareMessages:
+        totalOrder of two vector times is their lexicographic order.
+        Messages without timestamp are sorted first.
+        """
+        if isinstance(msg, list) and len(msg) >= 2:
+            return tuple(msg[0])
+        return ()
+
     def _should_propagate(self, server_id):
         return server_id == -1 or server_id == self.myId
 
@@ -57,17 +68,33 @@ class storage:
     async def getBoard(self, server_id=-1):
         return await self.asyncLocalStorage.getBoard(server_id)
 
+    async def getRange(self, offset, limit, server_id=-1):
+        return await self.asyncLocalStorage.getRange(offset, limit, server_id)
+
+    async def getVersion(self, server_id=-1):
+        return await self.asyncLocalStorage.getVersion(server_id)
+
+    async def getChanges(self, version, server_id=-1):
+        return await self.asyncLocalStorage.getChanges(version, server_id)
+
+    def subscribe(self, listener):
+        self.asyncLocalStorage.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.asyncLocalStorage.unsubscribe(listener)
+
+    def _keep_timestamp(self, old_message, message):
+        # Preserve the timestamp of old_message, update only the text
+        if isinstance(old_message, list) and len(old_message) == 2:
+            return [old_message[0].copy() if isinstance(old_message[0], list) else old_message[0], message]
+        timestamp = self.vectorClock.getTime().copy()
+        return [timestamp, message]
+
     async def modify(self, index, message, server_id=-1):
         if server_id == -1:
             # get old message to preserve timestamp
             old_message = await self.asyncLocalStorage.get(index, server_id)
-            
-            # Preserve the timestamp, update only the text
-            if isinstance(old_message, list) and len(old_message) == 2:
-                timestamped_message = [old_message[0].copy() if isinstance(old_message[0], list) else old_message[0], message]
-            else:
-                timestamp = self.vectorClock.getTime().copy()
-                timestamped_message = [timestamp, message]
+            timestamped_message = self._keep_timestamp(old_message, message)
         else:
             # message already has [timestamp, text]
             timestamped_message = message
@@ -89,6 +116,42 @@ class storage:
         if self._should_propagate(server_id):
             await self._inform_other_servers('deleteAll')
 
+    def _timestamp_operation(self, operation, messages):
+        """
+        Adds timestamps to one operation of a batch from a client like put() and modify() do. 
+        Called by the local storage right before the operation is applied. 
+        """
+        command = operation.get("COMMAND", "").upper()
+        if command == "PUT":
+            timestamp = self.vectorClock.getTime().copy()
+            return {**operation, "MESSAGE": [timestamp, operation.get("MESSAGE")]}
+        if command == "MODIFY":
+            index = int(operation.get("INDEX"))
+            if 0 <= index < len(messages):
+                return {**operation, "MESSAGE": self._keep_timestamp(messages[index], operation.get("MESSAGE"))}
+        return operation
+
+    async def putMany(self, messages, server_id=-1):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id)
+
+    async def applyBatch(self, operations, server_id=-1):
+        if server_id == -1:
+            # Client request - timestamp the operations while they are applied
+            timestamped_operations = []
+            def prepare(operation, messages):
+                operation = self._timestamp_operation(operation, messages)
+                timestamped_operations.append(operation)
+                return operation
+            results = await self.asyncLocalStorage.applyBatch(operations, server_id, prepare=prepare)
+        else:
+            # operations already have timestamps
+            timestamped_operations = operations
+            results = await self.asyncLocalStorage.applyBatch(operations, server_id)
+        
+        if self._should_propagate(server_id):
+            await self._inform_other_servers('applyBatch', timestamped_operations)
+        return results
+
     async def close(self):
         await self.asyncLocalStorage.close()
 
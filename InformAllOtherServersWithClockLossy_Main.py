@@ -5,10 +5,11 @@ import InformAllOtherServersWithClock
 import logging
 import LossyWebsocket
 import sys
+import Topology
 import VectorClock
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -16,7 +17,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts[serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 logging.basicConfig(
@@ -24,17 +25,18 @@ logging.basicConfig(
 )
 
 # Create object of logical clock
-logicalClock = VectorClock.clock(len(serverPorts), serverID)
+logicalClock = VectorClock.clock(len(cluster), serverID)
 
 # Create proxies for the other servers
-serversToInformAboutChanges = [AsyncBoardProxy.storage(serverPorts[id], serverID, logicalClock, websocketconnect=LossyWebsocket.connect) for id in range(len(serverPorts))]
+serversToInformAboutChanges = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, logicalClock, websocketconnect=LossyWebsocket.connect) for id in range(len(cluster))]
 
 # Create storage containing data of this server. 
 # localStorage = AsyncBoardStorage.storage() 
-localStorage = AsyncBoardStorage.storage(InformAllOtherServersWithClock.storage.compareMessages) 
+localStorage = AsyncBoardStorage.storage(keyForElements=InformAllOtherServersWithClock.storage.messageKey) 
 
 # Create object with distribution algorithm 
 storage = InformAllOtherServersWithClock.storage(localStorage, serversToInformAboutChanges, serverID, logicalClock)    
 
 # Start server
-BoardServer.startServer(port, storage, serverID=serverID, vClock=logicalClock)
\ No newline at end of file
+BoardServer.startServer(node.port, storage, serverID=serverID, vClock=logicalClock, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
\ No newline at end of file
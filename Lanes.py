@@ -0,0 +1,95 @@
+"""
+Budgets of the requests a server executes at the same time, with priority for
+the requests of the other servers of the cluster (peers) over those of clients.
+
+Each lane (clients and peers) has a budget of requests executed at the same
+time; None means unlimited. A request beyond the budget waits until another
+one of its lane has finished. Peer requests come first:
+
+  - each running peer request also takes one slot of the client budget, so
+    under peer load fewer client requests run besides it,
+  - a waiting peer request is admitted before any waiting client request,
+    and no client request is admitted while peer requests wait.
+
+So a flood of client requests cannot delay the replication, sequencer and
+election requests the whole cluster waits on: at most clientBudget client
+requests run besides them on the event loop.
+
+The peer budget should be large or unlimited: a peer request may wait for
+another peer request to the same server (e.g. the coordinator sending an
+update it got from another server to all servers including itself).
+
+    requestLanes = lanes(clientBudget=64)
+    async with requestLanes.slot(peer=False):
+        ...
+"""
+
+import asyncio
+import contextlib
+from collections import deque
+
+CLIENT = False
+PEER = True
+DEFAULT_CLIENT_BUDGET = 64
+DEFAULT_PEER_BUDGET = None
+
+
+class lanes:
+    def __init__(self, clientBudget=None, peerBudget=None):
+        self.budgets = {CLIENT: clientBudget, PEER: peerBudget}
+        self.running = {CLIENT: 0, PEER: 0}
+        self.waiting = {CLIENT: deque(), PEER: deque()}  # Futures of the waiting requests in their order
+
+    def _admits(self, peer):
+        budget = self.budgets[peer]
+        if budget is None:
+            return True
+        used = self.running[PEER] if peer else self.running[CLIENT] + self.running[PEER]
+        return used < budget
+
+    def _mayStart(self, peer):
+        """True if a new request of the lane may run now without overtaking a waiting one"""
+        if self.waiting[peer] or (not peer and self.waiting[PEER]):
+            return False
+        return self._admits(peer)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, peer=False):
+        """Waits until the request may run in its lane and holds the slot while the block runs"""
+        if self._mayStart(peer):
+            self.running[peer] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.waiting[peer].append(future)
+            try:
+                await future  # Resolved by _wake() after the slot was taken for this request
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(peer)
+                else:
+                    self.waiting[peer].remove(future)
+                raise
+        try:
+            yield
+        finally:
+            self._release(peer)
+
+    def _release(self, peer):
+        self.running[peer] -= 1
+        self._wake()
+
+    def _wake(self):
+        """Admits waiting requests: peers first, clients only if no peer waits"""
+        for peer in (PEER, CLIENT):
+            waiting = self.waiting[peer]
+            while waiting and self._admits(peer):
+                future = waiting.popleft()
+                if not future.done():
+                    self.running[peer] += 1
+                    future.set_result(None)
+            if waiting:
+                return
+
+    def queued(self, peer):
+        """Number of requests of the lane waiting for a slot"""
+        return len(self.waiting[peer])
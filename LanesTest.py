@@ -0,0 +1,87 @@
+import asyncio
+import statistics
+import time
+import Lanes
+
+# Checks the order in which Lanes admits requests, and that the latency of peer
+# requests stays low while a flood of client requests keeps the server busy.
+
+STEP_SECONDS = 0.00005  # Work of a request between two awaits
+
+
+async def work(steps):
+    for _ in range(steps):
+        end = time.perf_counter() + STEP_SECONDS
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(0)
+
+
+async def request(lanes, peer, steps):
+    if lanes is None:
+        await work(steps)
+        return
+    async with lanes.slot(peer):
+        await work(steps)
+
+
+async def peerLatency(lanes, clients=500, samples=10):
+    """Median seconds of a peer request while client requests are sent in a loop"""
+    running = True
+
+    async def client():
+        while running:
+            await request(lanes, False, 5)
+
+    flood = [asyncio.create_task(client()) for _ in range(clients)]
+    await asyncio.sleep(0.2)
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await request(lanes, True, 5)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    running = False
+    await asyncio.gather(*flood)
+    return statistics.median(latencies)
+
+
+async def checkOrder():
+    lanes = Lanes.lanes(clientBudget=2, peerBudget=1)
+    started = []
+    gate = asyncio.Event()
+
+    async def hold(name, peer):
+        async with lanes.slot(peer):
+            started.append(name)
+            await gate.wait()
+
+    tasks = [asyncio.create_task(hold(name, peer)) for name, peer in
+             [("client 1", False), ("peer 1", True), ("client 2", False), ("peer 2", True), ("client 3", False)]]
+    await asyncio.sleep(0.01)
+    # A running peer request takes a slot of the client budget too
+    assert started == ["client 1", "peer 1"], started
+    assert lanes.queued(True) == 1 and lanes.queued(False) == 2
+    # A waiting request gives up its place when it is cancelled
+    tasks[2].cancel()
+    await asyncio.sleep(0.01)
+    assert lanes.queued(False) == 1
+    gate.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Waiting peer requests are admitted before waiting client requests
+    assert started == ["client 1", "peer 1", "peer 2", "client 3"], started
+    assert lanes.running == {False: 0, True: 0}
+    print("Admission order:", started)
+
+
+async def main():
+    await checkOrder()
+    unlimited = await peerLatency(None)
+    limited = await peerLatency(Lanes.lanes(Lanes.DEFAULT_CLIENT_BUDGET))
+    idle = await peerLatency(Lanes.lanes(Lanes.DEFAULT_CLIENT_BUDGET), clients=0)
+    print(f"Peer request under client load: {unlimited * 1e3:.1f} ms without budget, "
+          f"{limited * 1e3:.1f} ms with client budget {Lanes.DEFAULT_CLIENT_BUDGET}, {idle * 1e3:.1f} ms without load")
+    assert limited < unlimited / 4
+
+
+asyncio.run(main())
@@ -1,4 +1,10 @@
 import asyncio
+import BoardLogging
+import Deadline
+import Commands
+from Commands import reply
+
+log = BoardLogging.getLogger("LeaderElection")
 
 class election: 
     def __init__(self, proxies, myID): 
@@ -40,19 +46,19 @@ class election:
         This function starts the election process. 
         When this coroutines ends, a new coordinator has been elected. 
         """
-        print(f"Server {self.myID}: Starting election...")
+        log.info("Server %s: Starting election...", self.myID)
         
         # Check if there are servers with higher ID
         higher_servers = [sid for sid in range(self.myID + 1, len(self.proxies))]
         
         if not higher_servers:
             # No higher servers - I am the coordinator
-            print(f"Server {self.myID}: No higher servers, I am the new coordinator")
+            log.info("Server %s: No higher servers, I am the new coordinator", self.myID)
             await self.callSetCoordinatorInAllServers(self.myID)
             return
         
         # Call election() on all servers with higher ID
-        print(f"Server {self.myID}: Calling election on higher servers: {higher_servers}")
+        log.info("Server %s: Calling election on higher servers: %s", self.myID, higher_servers)
         tasks = [self.callElection(sid) for sid in higher_servers]
         results = await asyncio.gather(*tasks)
         
@@ -60,18 +66,18 @@ class election:
         took_over = False
         for sid, result in zip(higher_servers, results):
             if result == "Take-Over":
-                print(f"Server {self.myID}: Server {sid} responded with Take-Over")
+                log.info("Server %s: Server %s responded with Take-Over", self.myID, sid)
                 took_over = True
                 break
         
         if took_over:
             # A higher server took over - wait for setCoordinator to be called
-            print(f"Server {self.myID}: Waiting for new coordinator announcement...")
+            log.info("Server %s: Waiting for new coordinator announcement...", self.myID)
             self.coordinator_event.clear()
             await self.coordinator_event.wait()
         else:
             # No higher server responded - I am the coordinator
-            print(f"Server {self.myID}: No higher servers responded, I am the new coordinator")
+            log.info("Server %s: No higher servers responded, I am the new coordinator", self.myID)
             await self.callSetCoordinatorInAllServers(self.myID)
         
     async def callAreYouAlive(self, serverID): 
@@ -159,9 +165,9 @@ class election:
         Called from other servers to start the election process. 
         Always retuns "Take-Over".
         """
-        print(f"Server {self.myID}: election() called from another server")
+        log.info("Server %s: election() called from another server", self.myID)
         # Start our own election process in the background (don't wait for it)
-        asyncio.create_task(self.startElection())
+        asyncio.create_task(self.startElection(), context=Deadline.detachedContext())
         return "Take-Over"
         
     async def setCoordinator(self, coordinatorID):
@@ -169,7 +175,31 @@ class election:
         Called from to coordinator to inform the server about that it is coordinator. 
         Parameter coordinatorID: ID of the new coordinator. 
         """
-        print(f"Server {self.myID}: setCoordinator({coordinatorID}) called")
+        log.info("Server %s: setCoordinator(%s) called", self.myID, coordinatorID)
         self.coordinatorID = coordinatorID
         # Signal that we have a new coordinator
         self.coordinator_event.set()
+
+    def registerCommands(self, commands):
+        """Registers the commands ELECTION and SETCOORDINATOR of the BoardServer (see Commands)."""
+        commands.register("ELECTION", self._electionCommand)
+        commands.register("SETCOORDINATOR", self._setCoordinatorCommand)
+
+    async def _electionCommand(self, request):
+        try:
+            result = await self.election()
+        except Exception as e:
+            log.error("Election error: %s", e)
+            return Commands.ERROR
+        return reply(result, RESPONSE=result)
+
+    async def _setCoordinatorCommand(self, request):
+        coordinatorID = request.get("COORDINATORID")
+        if coordinatorID is None:
+            return Commands.ERROR
+        try:
+            await self.setCoordinator(coordinatorID)
+        except Exception as e:
+            log.error("SetCoordinator error: %s", e)
+            return Commands.ERROR
+        return reply('DONE')
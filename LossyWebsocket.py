@@ -47,10 +47,17 @@ class LossyClientConnection:
             message = await self.connection.recv()  # (Reliabliy) Receive the next message
             if not (random.random() <= lossProbability): # If message is not to be lost ...  
                 return message
+    
+    
+    async def close(self): 
+        """
+        Closes the underlying websocket connection. 
+        """
+        await self.connection.close()
                 
                 
-async def connect(uri): 
+async def connect(uri, **kwargs): 
     """
     Connects to a websocket server and 
     """
-    return LossyClientConnection(await client.connect(uri))
\ No newline at end of file
+    return LossyClientConnection(await client.connect(uri, **kwargs))
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Metrics of the board servers.
+
+Every module updates the one registry of its process, Metrics.registry:
+  registry.inc(name, amount, labels)      counts events, e.g. requests
+  registry.observe(name, value, labels)   adds a value to a histogram, e.g. a latency in seconds
+  registry.gauge(name, function, labels)  registers a function returning the current value,
+                                          e.g. the length of a queue; it is called when read
+The metrics are read with the STATS command of the BoardServer (snapshot())
+and, if a metrics port is given, over HTTP in the plain-text format of
+Prometheus (exposition()). So load tests and dashboards read the same numbers.
+"""
+
+import asyncio
+from bisect import bisect_left
+
+# Upper bounds of the buckets of latency histograms in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket counts values above all bounds
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulativeCounts(self):
+        """Returns the number of values <= each bound, followed by the number of all values."""
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())) if labels else ())
+
+
+def _formatName(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+class metricsRegistry:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, amount=1, labels=None):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=None):
+        key = _key(name, labels)
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = histogram()
+        h.observe(value)
+
+    def gauge(self, name, function, labels=None):
+        """Registers a function without parameters returning the value. Replaces an earlier one."""
+        self.gauges[_key(name, labels)] = function
+
+    def removeGauge(self, name, labels=None):
+        self.gauges.pop(_key(name, labels), None)
+
+    def gaugeValues(self, name):
+        """Returns the current values of the gauges with this name (with any labels)."""
+        values = []
+        for (gaugeName, _), function in list(self.gauges.items()):
+            if gaugeName == name:
+                try:
+                    values.append(function())
+                except Exception:
+                    pass
+        return values
+
+    def _gaugeValues(self):
+        values = {}
+        for key, function in list(self.gauges.items()):
+            try:
+                values[key] = function()
+            except Exception:
+                pass  # A gauge of a closed object is skipped
+        return values
+
+    def snapshot(self):
+        """Returns all metrics as a dict that can be encoded as JSON."""
+        histograms = {}
+        for (name, labels), h in self.histograms.items():
+            histograms[_formatName(name, labels)] = {
+                "COUNT": h.count,
+                "SUM": h.sum,
+                "BUCKETS": dict(zip([str(bound) for bound in h.buckets] + ["+Inf"], h.cumulativeCounts())),
+            }
+        return {
+            "COUNTERS": {_formatName(name, labels): value for (name, labels), value in self.counters.items()},
+            "GAUGES": {_formatName(name, labels): value for (name, labels), value in self._gaugeValues().items()},
+            "HISTOGRAMS": histograms,
+        }
+
+    def exposition(self):
+        """Returns all metrics in the plain-text exposition format of Prometheus."""
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{_formatName(name, labels)} {value}")
+        for (name, labels), value in sorted(self._gaugeValues().items()):
+            lines.append(f"{_formatName(name, labels)} {value}")
+        for (name, labels), h in sorted(self.histograms.items()):
+            for bound, count in zip([str(bound) for bound in h.buckets] + ["+Inf"], h.cumulativeCounts()):
+                lines.append(f"{_formatName(name + '_bucket', labels + (('le', bound),))} {count}")
+            lines.append(f"{_formatName(name + '_sum', labels)} {h.sum}")
+            lines.append(f"{_formatName(name + '_count', labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+# The registry of this process
+registry = metricsRegistry()
+
+
+#########################################################
+# Minimal HTTP server answering every request with the
+# exposition of the registry.
+#########################################################
+async def _answerHttp(reader, writer):
+    try:
+        # Read the request up to the empty line; its content does not matter
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        body = registry.exposition().encode()
+        writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serveHttp(port, host="localhost"):
+    """Starts the HTTP server for the metrics and returns the asyncio server."""
+    return await asyncio.start_server(_answerHttp, host, port)
@@ -1,3 +1,9 @@
+import BoardLogging
+import Commands
+from Commands import reply
+
+log = BoardLogging.getLogger("Mutex")
+
 class mutex:
     """A simple non-blocking mutex.
 
@@ -32,3 +38,23 @@ class mutex:
             return True
         return False
 
+    def registerCommands(self, commands):
+        """Registers the commands ACQUIRE and RELEASE of the BoardServer (see Commands)."""
+        commands.register("ACQUIRE", self._acquireCommand)
+        commands.register("RELEASE", self._releaseCommand)
+
+    async def _acquireCommand(self, request):
+        try:
+            result = await self.acquire()
+        except Exception as e:
+            log.error("Mutex acquire error: %s", e)
+            return Commands.ERROR
+        return reply(result, "OK" if result else "BUSY", ACQUIRED=result)
+
+    async def _releaseCommand(self, request):
+        try:
+            await self.release()
+        except Exception as e:
+            log.error("Mutex release error: %s", e)
+            return Commands.ERROR
+        return reply('DONE')
@@ -0,0 +1,76 @@
+"""
+Rate limiting of the requests of clients with token buckets.
+
+Each client connection has one bucket per class of commands (reads, writes,
+admin and synchronisation). A bucket holds at most burst tokens and is
+refilled with rate tokens per second; each request takes one token (a BATCH
+one per operation). A request finding too few tokens is not executed, and
+the client is told how many seconds to wait. So a client writing in a tight
+loop is held to its rate, while the other clients keep their share of the
+server and of its replication to the other servers.
+
+    limiter = rateLimiter({"read": (200, 400), "write": (50, 100)})
+    wait = limiter.take(connection, commandClass("PUT"))   # 0 if allowed
+"""
+
+import time
+
+# Classes of commands with their own limits
+READ = "read"
+WRITE = "write"
+ADMIN = "admin"
+
+COMMAND_CLASSES = {
+    "GETBOARD": READ, "GETRANGE": READ, "GETCHANGES": READ, "GET": READ, "GETNUM": READ,
+    "WATCH": READ, "AREYOUALIVE": READ,
+    "PUT": WRITE, "MODIFY": WRITE, "DELETE": WRITE, "DELETEALL": WRITE, "BATCH": WRITE,
+    "SYNCHRONIZE": ADMIN, "STATS": ADMIN, "ACQUIRE": ADMIN, "RELEASE": ADMIN, "ELECTION": ADMIN,
+    "SETCOORDINATOR": ADMIN, "GETSEQUENCENUMBER": ADMIN,
+}
+
+
+def commandClass(command):
+    """Returns the class of a command; unknown commands count as reads."""
+    return COMMAND_CLASSES.get(command, READ)
+
+
+class tokenBucket:
+    def __init__(self, rate, burst):
+        """rate: tokens added per second (> 0), burst: maximum number of tokens"""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def take(self, amount=1):
+        """Takes amount tokens. Returns 0 if they were available, otherwise the seconds until they are."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        amount = min(amount, self.burst)  # A large batch passes once the bucket is full
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class rateLimiter:
+    def __init__(self, limits):
+        """limits: (rate, burst) of each class of commands; classes without limit are not limited"""
+        self.limits = limits
+        self.buckets = {}  # (client, class) -> tokenBucket
+
+    def take(self, client, commandClass, amount=1):
+        """Takes tokens of the client for a request. Returns 0 if it is allowed, otherwise the seconds to wait."""
+        limit = self.limits.get(commandClass)
+        if limit is None:
+            return 0.0
+        bucket = self.buckets.get((client, commandClass))
+        if bucket is None:
+            bucket = self.buckets[(client, commandClass)] = tokenBucket(*limit)
+        return bucket.take(amount)
+
+    def forget(self, client):
+        """Removes the buckets of a client, e.g. when its connection is closed."""
+        for commandClass in self.limits:
+            self.buckets.pop((client, commandClass), None)
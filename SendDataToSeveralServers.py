@@ -3,13 +3,17 @@ import os
 import sys
 import threading 
 import time
+import Topology
 
 
 numberMessagesPerServer = 0                  # Number of messages to be sent to each server.
-# serverPorts   = [10000] # Ports of the server to which messages shall be uploaded.
-# serverPorts   = [10000, 10001, 10002, 10003] # Ports of the server to which messages shall be uploaded.
-# serverPorts   = [10000, 10001, 10002] # Ports of the server to which messages shall be uploaded.
-serverPorts   = [10001, 10002] # Ports of the server to which messages shall be uploaded.
+batchSize = 0                                # If > 0, messages are uploaded with BATCH requests of this size.
+cluster       = Topology.load()               # Servers of the cluster (see Topology).
+# serverIds     = [0] # Ids of the servers to which messages shall be uploaded.
+# serverIds     = list(cluster.ids()) # Ids of the servers to which messages shall be uploaded.
+# serverIds     = [0, 1, 2] # Ids of the servers to which messages shall be uploaded.
+serverIds     = [1, 2] # Ids of the servers to which messages shall be uploaded.
+serverPorts   = [cluster.clientAddress(id) for id in serverIds] # Addresses of these servers.
 
 serverProxies = [BoardProxy.storage(port) for port in serverPorts] # Create Proxies for each server.
 
@@ -17,6 +21,12 @@ def uploadToServer(serverIndex):
     myPort = serverPorts[serverIndex]
     myProxy = serverProxies[serverIndex]
     
+    if batchSize > 0: 
+        messages = [str(serverIndex) + "." + str(i) for i in range(numberMessagesPerServer)]
+        print("Sending", len(messages), "messages in batches of", batchSize, "to", myPort)
+        myProxy.putMany(messages, batchSize)
+        return
+    
     for i in range(numberMessagesPerServer): 
         message = str(serverIndex) + "." + str(i)  # Create messages such as "2.3"
         print("Sending", message, "to", myPort)
@@ -28,6 +38,9 @@ if len(sys.argv) > 1:       # A parameter was given to the program ...
 else: 
     numberMessagesPerServer = 4 # Otherwise use default value.
 
+if len(sys.argv) > 2:       # A second parameter was given to the program ...
+    batchSize = int(sys.argv[2]) # Assume it is the number of messages per BATCH request
+
       
 # Delete all available data from the servers
 sp = serverProxies[0]
@@ -3,10 +3,12 @@ import os
 import sys
 import threading 
 import time
+import Topology
 
 
 numberMessagesPerServer = 0                  # Number of messages to be sent to each server.
-serverPorts   = [10000, 10001, 10002, 10003] # Ports of the server to which messages shall be uploaded.
+cluster       = Topology.load()               # Servers of the cluster (see Topology).
+serverPorts   = [cluster.clientAddress(id) for id in cluster.ids()] # Addresses of the server to which messages shall be uploaded.
 
 serverProxies = [BoardProxy.storage(port) for port in serverPorts] # Create Proxies for each server.
 
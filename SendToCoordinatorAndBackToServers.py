@@ -25,12 +25,13 @@ class storage:
                 tasks.append(method(*args))
             
             if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+                return await asyncio.gather(*tasks, return_exceptions=True)
+            return []
 
     async def _forward_to_coordinator(self, operation, *args):
         coordinator_proxy = self.serverList[self.coordinatorId]
         method = getattr(coordinator_proxy, operation)
-        await method(*args)
+        return await method(*args)
 
     async def put(self, message, server_id=-1):
         if self._is_from_coordinator(server_id):
@@ -52,6 +53,21 @@ class storage:
     async def getBoard(self, server_id=-1):
         return await self.asyncLocalStorage.getBoard(server_id)
 
+    async def getRange(self, offset, limit, server_id=-1):
+        return await self.asyncLocalStorage.getRange(offset, limit, server_id)
+
+    async def getVersion(self, server_id=-1):
+        return await self.asyncLocalStorage.getVersion(server_id)
+
+    async def getChanges(self, version, server_id=-1):
+        return await self.asyncLocalStorage.getChanges(version, server_id)
+
+    def subscribe(self, listener):
+        self.asyncLocalStorage.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.asyncLocalStorage.unsubscribe(listener)
+
     async def modify(self, index, message, server_id=-1):
         if self._is_from_coordinator(server_id):
             # This is a broadcast from coordinator, just update local storage
@@ -85,6 +101,25 @@ class storage:
             # I am not the coordinator, forward to coordinator
             await self._forward_to_coordinator('deleteAll')
 
+    async def putMany(self, messages, server_id=-1):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id)
+
+    async def applyBatch(self, operations, server_id=-1):
+        if self._is_from_coordinator(server_id):
+            # This is a broadcast from coordinator, just update local storage
+            return await self.asyncLocalStorage.applyBatch(operations, server_id)
+        elif self._is_coordinator():
+            # I am the coordinator, broadcast the whole batch as one message
+            results = await self._broadcast_to_all_servers('applyBatch', operations)
+            # The results of the batch are the ones of this server
+            result = results[self.myId] if self.myId < len(results) else None
+            if isinstance(result, Exception):
+                raise result
+            return result
+        else:
+            # I am not the coordinator, forward to coordinator
+            return await self._forward_to_coordinator('applyBatch', operations)
+
     async def close(self):
         await self.asyncLocalStorage.close()
 
@@ -7,10 +7,11 @@ import logging
 import LossyWebsocket
 import SendToCoordinatorAndBackToServers
 import sys
+import Topology
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
-IdOfCoordinator = 0
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
+IdOfCoordinator = cluster.coordinator
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -18,7 +19,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts [serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 #logging.basicConfig(
@@ -26,10 +27,10 @@ port = serverPorts [serverID]
 #)
 
 # Create proxies for all servers
-serversToInformAboutChanges = [AsyncBoardProxy.storage(serverPorts[id], serverID, websocketconnect=LossyWebsocket.connect) for id in range(len(serverPorts))]
+serversToInformAboutChanges = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, websocketconnect=LossyWebsocket.connect) for id in range(len(cluster))]
 
 # Wrap each proxy with a proxy object that implements at least once semantics
-serversToInformAboutChanges = [AtLeastOnceProxy.storage(serversToInformAboutChanges[id]) for id in range(len(serverPorts))]
+serversToInformAboutChanges = [AtLeastOnceProxy.storage(serversToInformAboutChanges[id]) for id in range(len(cluster))]
 
 # Create storage containing data of this server. 
 localStorage = AsyncBoardStorage.storage() 
@@ -41,4 +42,5 @@ distributionAlgorithm = SendToCoordinatorAndBackToServers.storage(localStorage,
 filter = AtMostOnceFilter.storage(distributionAlgorithm)
 
 # Start server
-BoardServer.startServer(port, filter, serverID=serverID)
\ No newline at end of file
+BoardServer.startServer(node.port, filter, serverID=serverID, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
\ No newline at end of file
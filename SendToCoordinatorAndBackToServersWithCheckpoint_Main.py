@@ -4,10 +4,11 @@ import BoardServer
 import logging
 import SendToCoordinatorAndBackToServers
 import sys
+import Topology
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
-IdOfCoordinator = 0
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
+IdOfCoordinator = cluster.coordinator
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -15,7 +16,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts [serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 #logging.basicConfig(
@@ -23,7 +24,7 @@ port = serverPorts [serverID]
 #)
 
 # Create proxies for all servers
-serversToInformAboutChanges = [AsyncBoardProxy.storage(serverPorts[id], serverID) for id in range(len(serverPorts))]
+serversToInformAboutChanges = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, codecs=["binary"]) for id in range(len(cluster))]
 
 # Create storage containing data of this server. 
 localStorage = AsyncBoardStorage.storage(checkpointing=True, serverID=serverID) 
@@ -32,4 +33,5 @@ localStorage = AsyncBoardStorage.storage(checkpointing=True, serverID=serverID)
 storage = SendToCoordinatorAndBackToServers.storage(localStorage, serversToInformAboutChanges, serverID, IdOfCoordinator)    
 
 # Start server
-BoardServer.startServer(port, storage, serverID=serverID)
\ No newline at end of file
+BoardServer.startServer(node.port, storage, serverID=serverID, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
\ No newline at end of file
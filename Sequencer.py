@@ -1,11 +1,32 @@
+import BoardLogging
+import Commands
+from Commands import reply
+
+log = BoardLogging.getLogger("Sequencer")
+
 class sequencer: 
     def __init__(self): 
         self.counter = 0
         
-    async def getSequenceNumber(self): 
+    async def getSequenceNumber(self, count=1): 
         """
         Returns the next sequence number. 
         The first call of this function returns 1. The second call returns 2, and so on. 
+        With count > 1 the next count numbers are reserved as one range 
+        and the first number of the range is returned. 
         """
-        self.counter += 1
-        return self.counter
\ No newline at end of file
+        first = self.counter + 1
+        self.counter += count
+        return first
+
+    def registerCommands(self, commands): 
+        """Registers the command GETSEQUENCENUMBER of the BoardServer (see Commands)."""
+        commands.register("GETSEQUENCENUMBER", self._getSequenceNumberCommand)
+
+    async def _getSequenceNumberCommand(self, request): 
+        try:
+            seq_num = await self.getSequenceNumber(request.get("COUNT", 1))
+        except Exception as e:
+            log.error("GetSequenceNumber error: %s", e)
+            return Commands.ERROR
+        return reply(seq_num, SEQNUM=seq_num)
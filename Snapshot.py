@@ -0,0 +1,271 @@
+"""
+Binary snapshot of a board that is read lazily.
+
+Layout of the file (all numbers little-endian):
+
+  MAGIC                        8 bytes
+  record 0, record 1, ...      each: uint32 (length << 1 | compressed), then the
+                               message as JSON, zlib-compressed if the bit is set
+  index                        uint64 offset of each record in the file
+  lsn, count, indexOffset      3 x uint64
+  MAGIC                        8 bytes
+
+load() maps the file (mmap) and returns the messages as mappedBoard, which
+decodes a message only when it is accessed. So opening a snapshot costs the
+same for any size of the board, and messages that are never read are never
+turned into Python objects. Writing a snapshot of a mappedBoard copies the
+records that were not changed without decoding them.
+
+    data = encode(messages, lsn, compress=True)
+    messages, lsn = load(filename)
+"""
+
+from collections.abc import MutableSequence
+import json
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b"BRDSNAP1"
+RECORD_HEADER = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+TRAILER = struct.Struct("<QQQ")
+COMPRESS_ABOVE = 64  # Shorter records are never compressed
+ITERATION_CHUNK = 1000  # Records decoded at once when iterating
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+
+
+def encodeRecord(message, compress=False):
+    """Encodes a message as record with length prefix"""
+    payload = _encoder.encode(message).encode()
+    compressed = 0
+    if compress and len(payload) >= COMPRESS_ABOVE:
+        packed = zlib.compress(payload)
+        if len(packed) < len(payload):
+            payload, compressed = packed, 1
+    return RECORD_HEADER.pack(len(payload) << 1 | compressed) + payload
+
+
+def encode(messages, lsn, compress=False):
+    """Encodes the messages (a list, mappedBoard or other sequence) as snapshot after the change lsn"""
+    rawRecord = getattr(messages, "rawRecord", None)
+    parts = [MAGIC]
+    offsets = []
+    position = len(MAGIC)
+    if rawRecord is None:
+        records = (encodeRecord(message, compress) for message in messages)
+    else:
+        records = (rawRecord(i) or encodeRecord(messages[i], compress) for i in range(len(messages)))
+    for record in records:
+        offsets.append(position)
+        parts.append(record)
+        position += len(record)
+    parts.append(struct.pack(f"<{len(offsets)}Q", *offsets))
+    parts.append(TRAILER.pack(lsn, len(offsets), position) + MAGIC)
+    return b"".join(parts)
+
+
+def load(filename):
+    """Opens a snapshot. Returns its messages as mappedBoard and its lsn."""
+    with open(filename, "rb") as f:
+        if os.name == "nt":
+            # A mapped file cannot be replaced by the next snapshot on Windows
+            buffer = f.read()
+        else:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    end = len(buffer) - len(MAGIC)
+    if end < len(MAGIC) + TRAILER.size or buffer[:len(MAGIC)] != MAGIC or buffer[end:] != MAGIC:
+        raise ValueError(f"{filename} is not a complete snapshot")
+    lsn, count, indexOffset = TRAILER.unpack_from(buffer, end - TRAILER.size)
+    if indexOffset + count * OFFSET.size != end - TRAILER.size:
+        raise ValueError(f"{filename} has a damaged index")
+    return mappedBoard(buffer, count, indexOffset), lsn
+
+
+class mappedBoard(MutableSequence):
+    """
+    List of the messages of a snapshot that decodes each message on first access.
+    Changed and new messages are kept as Python objects. Until a message is
+    inserted or removed in the middle, a position is the number of its record;
+    afterwards the list slots holds per position the number of the record or the
+    message in a tuple.
+    """
+
+    def __init__(self, buffer, count, indexOffset):
+        self.buffer = buffer
+        self.count = count
+        self.indexOffset = indexOffset
+        self.decoded = {}  # Record number -> decoded or changed message
+        self.appended = []  # Messages after the records
+        self.slots = None
+
+    def _offset(self, number):
+        return OFFSET.unpack_from(self.buffer, self.indexOffset + number * OFFSET.size)[0]
+
+    def _record(self, number):
+        offset = self._offset(number)
+        header = RECORD_HEADER.unpack_from(self.buffer, offset)[0]
+        return offset, RECORD_HEADER.size + (header >> 1), header & 1
+
+    def _decode(self, number):
+        offset, length, compressed = self._record(number)
+        payload = self.buffer[offset + RECORD_HEADER.size:offset + length]
+        return json.loads(zlib.decompress(payload) if compressed else payload)
+
+    def _decodeMany(self, numbers):
+        """Decodes the records with the numbers (ascending) at once, which is much faster than one by one"""
+        if not numbers:
+            return []
+        buffer = self.buffer
+        first = numbers[0]
+        # Records are stored one after another, so a record ends where the next one starts
+        last = min(numbers[-1] + 1, self.count - 1)
+        offsets = struct.unpack_from(f"<{last - first + 1}Q", buffer, self.indexOffset + first * OFFSET.size)
+        offsets += (self.indexOffset,)
+        payloads = []
+        for number in numbers:
+            offset = offsets[number - first]
+            payload = buffer[offset + RECORD_HEADER.size:offsets[number - first + 1]]
+            payloads.append(zlib.decompress(payload) if buffer[offset] & 1 else payload)
+        return json.loads(b"[" + b",".join(payloads) + b"]")
+
+    def rawRecord(self, index):
+        """Returns the encoded record at index if the message was not changed, otherwise None"""
+        if self.slots is not None:
+            number = self.slots[index]
+            if type(number) is not int:
+                return None
+        elif index < self.count and index not in self.decoded:
+            number = index
+        else:
+            return None
+        offset, length, _ = self._record(number)
+        return self.buffer[offset:offset + length]
+
+    def _split(self):
+        """Changes to slots, so messages can be inserted and removed at any position"""
+        if self.slots is None:
+            slots = list(range(self.count))
+            for number, message in self.decoded.items():
+                slots[number] = (message,)
+            slots.extend((message,) for message in self.appended)
+            self.slots = slots
+            self.decoded = {}
+            self.appended = []
+
+    def __len__(self):
+        if self.slots is not None:
+            return len(self.slots)
+        return self.count + len(self.appended)
+
+    def _index(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("list index out of range")
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._read(start, stop)
+        index = self._index(index)
+        if self.slots is not None:
+            slot = self.slots[index]
+            if type(slot) is not int:
+                return slot[0]
+            message = self._decode(slot)
+            self.slots[index] = (message,)
+            return message
+        if index >= self.count:
+            return self.appended[index - self.count]
+        try:
+            return self.decoded[index]
+        except KeyError:
+            message = self.decoded[index] = self._decode(index)
+            return message
+
+    def __setitem__(self, index, message):
+        if isinstance(index, slice):
+            self._split()
+            values = [(m,) for m in message]
+            self.slots[index] = values
+            return
+        index = self._index(index)
+        if self.slots is not None:
+            self.slots[index] = (message,)
+        elif index >= self.count:
+            self.appended[index - self.count] = message
+        else:
+            self.decoded[index] = message
+
+    def __delitem__(self, index):
+        if not isinstance(index, slice):
+            index = self._index(index)
+            if self.slots is None and index >= self.count:
+                del self.appended[index - self.count]
+                return
+        self._split()
+        del self.slots[index]
+
+    def insert(self, index, message):
+        if self.slots is None and index >= len(self):
+            self.appended.append(message)
+            return
+        self._split()
+        self.slots.insert(index, (message,))
+
+    def append(self, message):
+        if self.slots is not None:
+            self.slots.append((message,))
+        else:
+            self.appended.append(message)
+
+    def clear(self):
+        self.count = 0
+        self.decoded = {}
+        self.appended = []
+        self.slots = None
+
+    def _read(self, start, stop):
+        """
+        Returns the messages from start to stop. Their records are decoded at once 
+        and not kept, so reading the board range by range (e.g. streaming or 
+        iterating it) does not hold all its messages. 
+        """
+        if start >= stop:
+            return []
+        if self.slots is not None:
+            chunk = self.slots[start:stop]
+            # Records are never reordered, so their numbers in the slots are ascending
+            messages = iter(self._decodeMany([slot for slot in chunk if type(slot) is int]))
+            return [next(messages) if type(slot) is int else slot[0] for slot in chunk]
+        numbers = range(start, min(stop, self.count))
+        decoded = self.decoded
+        messages = iter(self._decodeMany([number for number in numbers if number not in decoded]))
+        result = [decoded[number] if number in decoded else next(messages) for number in numbers]
+        result.extend(self.appended[max(start - self.count, 0):max(stop - self.count, 0)])
+        return result
+
+    def __iter__(self):
+        for start in range(0, len(self), ITERATION_CHUNK):
+            yield from self._read(start, start + ITERATION_CHUNK)
+
+    def copy(self):
+        """Copy sharing the mapped file"""
+        board = mappedBoard(self.buffer, self.count, self.indexOffset)
+        board.decoded = dict(self.decoded)
+        board.appended = list(self.appended)
+        board.slots = None if self.slots is None else list(self.slots)
+        return board
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"<mappedBoard of {len(self)} messages>"
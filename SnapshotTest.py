@@ -0,0 +1,87 @@
+import os
+import random
+import tempfile
+import Snapshot
+import WriteAheadLog
+
+# Checks that snapshots are read back unchanged and that a mappedBoard,
+# which decodes its messages lazily, behaves like a list when it is changed.
+
+os.chdir(tempfile.mkdtemp())
+
+
+def write(filename, messages, lsn, compress=False):
+    WriteAheadLog.writeFileAtomically(filename, Snapshot.encode(messages, lsn, compress))
+    return Snapshot.load(filename)
+
+
+messages = ["short", "long " * 50, {"TEXT": "dict", "TIME": [1, 2]}, [1, 2, 3], 7, None, "Ünïcode"]
+for compress in (False, True):
+    board, lsn = write(f"board_{compress}.snap", messages, 42, compress)
+    assert lsn == 42 and len(board) == len(messages)
+    assert board.decoded == {}  # Nothing decoded before it is read
+    assert board[2] == messages[2] and list(board.decoded) == [2]
+    assert board[1:4] == messages[1:4] and list(board.decoded) == [2]  # Ranges are not kept decoded
+    assert list(board) == messages and board[-1] == messages[-1]
+board, lsn = write("empty.snap", [], 0)
+assert list(board) == [] and lsn == 0
+
+# A damaged file is not taken as a snapshot
+with open("board_False.snap", "rb") as f:
+    data = f.read()
+with open("damaged.snap", "wb") as f:
+    f.write(data[:-3])
+try:
+    Snapshot.load("damaged.snap")
+    raise AssertionError("Damaged snapshot was loaded")
+except ValueError as e:
+    print("Rejected:", e)
+
+# Changes that keep the positions of the records
+board, _ = write("small.snap", messages, 1)
+board[1] = "changed"
+board.append("appended")
+del board[-1]
+board.append("last")
+assert board.slots is None
+assert board.rawRecord(0) is not None and board.rawRecord(1) is None and board.rawRecord(len(messages)) is None
+assert list(board) == [messages[0], "changed", *messages[2:], "last"]
+
+# Random changes give the same messages as on a list
+random.seed(1)
+expected = [f"Message {i}" for i in range(3000)]
+board, _ = write("large.snap", expected, 1, compress=True)
+expected = list(expected)
+for step in range(2000):
+    operation = random.choice(("get", "slice", "modify", "append", "insert", "delete"))
+    index = random.randrange(len(expected))
+    if operation == "get":
+        assert board[index] == expected[index]
+    elif operation == "slice":
+        assert board[index:index + 50] == expected[index:index + 50]
+    elif operation == "modify":
+        board[index] = expected[index] = f"Modified {step}"
+    elif operation == "append":
+        board.append(f"Appended {step}")
+        expected.append(f"Appended {step}")
+    elif operation == "insert":
+        board.insert(index, f"Inserted {step}")
+        expected.insert(index, f"Inserted {step}")
+    else:
+        del board[index]
+        del expected[index]
+    if step == 100:
+        copy = board.copy()
+        copied = list(expected)
+assert len(board) == len(expected) and list(board) == expected
+assert list(copy) == copied  # Copies are not changed by later changes
+
+# Unchanged records are copied into the next snapshot as they are, changed ones are encoded again
+unchanged = sum(board.rawRecord(i) is not None for i in range(len(board)))
+reloaded, lsn = write("next.snap", board, 2)
+assert list(reloaded) == expected and lsn == 2
+print(f"Snapshot of {len(expected)} messages with {unchanged} records copied unchanged")
+
+board.clear()
+assert list(board) == [] and len(board) == 0
+print("Snapshots are read back unchanged")
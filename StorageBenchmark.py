@@ -0,0 +1,63 @@
+import asyncio
+import random
+import sys
+import time
+import AsyncBoardStorage
+import BlockedBoardStorage
+import BoardStorage
+
+# Compares the storages of the board on a large board: filling it with put,
+# get, modify and delete at random indices, and reading the whole board.
+# Usage: StorageBenchmark.py [number of messages] [number of random operations]
+
+
+async def call(method, *args):
+    """Calls a method of a storage, which may be a coroutine function or not"""
+    result = method(*args)
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+
+async def measure(storage, messages, operations):
+    times = {}
+    startTime = time.perf_counter()
+    for i in range(messages):
+        await call(storage.put, f"Message {i}")
+    times["put"] = time.perf_counter() - startTime
+
+    random.seed(1)
+    for name, operation in [("get", lambda i: call(storage.get, i)),
+                            ("modify", lambda i: call(storage.modify, i, "Modified")),
+                            ("delete", lambda i: call(storage.delete, i))]:
+        indices = [random.randrange(messages - operations) for _ in range(operations)]
+        startTime = time.perf_counter()
+        for index in indices:
+            await operation(index)
+        times[name] = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    board = await call(storage.getBoard)
+    sum(1 for _ in board)
+    times["getBoard"] = time.perf_counter() - startTime
+    return times
+
+
+def report(name, times, messages, operations):
+    print(f"{name:20} put {times['put'] / messages * 1e6:6.2f} us"
+          + "".join(f"   {operation} {times[operation] / operations * 1e6:7.2f} us" for operation in ("get", "modify", "delete"))
+          + f"   getBoard {times['getBoard'] * 1e3:6.1f} ms")
+
+
+async def main(messages, operations):
+    print(f"Board of {messages} messages, {operations} operations at random indices, time per operation")
+    for name, storage in [("BoardStorage", BoardStorage.storage()),
+                          ("AsyncBoardStorage", AsyncBoardStorage.storage()),
+                          ("BlockedBoardStorage", BlockedBoardStorage.storage())]:
+        report(name, await measure(storage, messages, operations), messages, operations)
+
+
+if __name__ == "__main__":
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    asyncio.run(main(messages, operations))
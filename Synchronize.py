@@ -1,5 +1,10 @@
 import asyncio
 from VectorClock import totalOrder
+import BoardLogging
+import Commands
+from Commands import reply
+
+log = BoardLogging.getLogger("Synchronize")
 
 class storage:
     def __init__(self, asyncLocalStorage, serverList, myId, vectorClock):
@@ -19,6 +24,17 @@ class storage:
             return totalOrder(msg1[0], msg2[0])
         return 0
 
+    @staticmethod
+    def messageKey(msg):
+        """
+        Sort key of a message in the order of compareMessages:
+        totalOrder of two vector times is their lexicographic order.
+        Messages without timestamp are sorted first.
+        """
+        if isinstance(msg, list) and len(msg) >= 2:
+            return tuple(msg[0])
+        return ()
+
     async def put(self, message, server_id=-1):
         if server_id == -1:
             # Client request - add timestamp using getTime() to increment clock
@@ -40,17 +56,33 @@ class storage:
     async def getBoard(self, server_id=-1):
         return await self.asyncLocalStorage.getBoard(server_id)
 
+    async def getRange(self, offset, limit, server_id=-1):
+        return await self.asyncLocalStorage.getRange(offset, limit, server_id)
+
+    async def getVersion(self, server_id=-1):
+        return await self.asyncLocalStorage.getVersion(server_id)
+
+    async def getChanges(self, version, server_id=-1):
+        return await self.asyncLocalStorage.getChanges(version, server_id)
+
+    def subscribe(self, listener):
+        self.asyncLocalStorage.subscribe(listener)
+
+    def unsubscribe(self, listener):
+        self.asyncLocalStorage.unsubscribe(listener)
+
+    def _keep_timestamp(self, old_message, message):
+        # Preserve the timestamp of old_message, update only the text
+        if isinstance(old_message, list) and len(old_message) == 2:
+            return [old_message[0].copy() if isinstance(old_message[0], list) else old_message[0], message]
+        timestamp = self.vectorClock.getTime().copy()
+        return [timestamp, message]
+
     async def modify(self, index, message, server_id=-1):
         if server_id == -1:
             # Client request - get old message to preserve timestamp
             old_message = await self.asyncLocalStorage.get(index, server_id)
-            
-            # Preserve the timestamp, update only the text
-            if isinstance(old_message, list) and len(old_message) == 2:
-                timestamped_message = [old_message[0].copy() if isinstance(old_message[0], list) else old_message[0], message]
-            else:
-                timestamp = self.vectorClock.getTime().copy()
-                timestamped_message = [timestamp, message]
+            timestamped_message = self._keep_timestamp(old_message, message)
         else:
             # Server-to-server call - message already has [timestamp, text]
             timestamped_message = message
@@ -63,6 +95,31 @@ class storage:
     async def deleteAll(self, server_id=-1):
         await self.asyncLocalStorage.deleteAll(server_id)
 
+    def _timestamp_operation(self, operation, messages):
+        """
+        Adds timestamps to one operation of a batch from a client like put() and modify() do. 
+        Called by the local storage right before the operation is applied. 
+        """
+        command = operation.get("COMMAND", "").upper()
+        if command == "PUT":
+            timestamp = self.vectorClock.getTime().copy()
+            return {**operation, "MESSAGE": [timestamp, operation.get("MESSAGE")]}
+        if command == "MODIFY":
+            index = int(operation.get("INDEX"))
+            if 0 <= index < len(messages):
+                return {**operation, "MESSAGE": self._keep_timestamp(messages[index], operation.get("MESSAGE"))}
+        return operation
+
+    async def putMany(self, messages, server_id=-1):
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], server_id)
+
+    async def applyBatch(self, operations, server_id=-1):
+        if server_id == -1:
+            # Client request - timestamp the operations while they are applied
+            return await self.asyncLocalStorage.applyBatch(operations, server_id, prepare=self._timestamp_operation)
+        # Server-to-server call - operations already have timestamps
+        return await self.asyncLocalStorage.applyBatch(operations, server_id)
+
     async def synchronize(self, other_server_id, server_id=-1):
         """
         Synchronize this server with another server bidirectionally.
@@ -72,10 +129,7 @@ class storage:
             other_server_id: ID of the server to synchronize with
             server_id: ID of the caller (-1 for client)
         """
-        print(f"\n*** SYNCHRONIZE called on server {self.myId} ***")
-        print(f"    Parameter other_server_id: {other_server_id}")
-        print(f"    Parameter server_id: {server_id}")
-        print(f"    Synchronizing with server {other_server_id}\n")
+        log.debug("Server %s synchronizing with server %s (called by %s)", self.myId, other_server_id, server_id)
         
         try:
             # Get the board from the other server
@@ -87,33 +141,31 @@ class storage:
             else:
                 other_board = response
                 
-            print(f"    Retrieved {len(other_board)} messages from server {other_server_id}")
+            log.debug("Retrieved %s messages from server %s", len(other_board), other_server_id)
             
             # Get current local board
             local_board = await self.asyncLocalStorage.getBoard(server_id)
-            print(f"    Current local board has {len(local_board)} messages")
+            log.debug("Current local board has %s messages", len(local_board))
             
             # Bidirectional synchronization:
             # 1. Add messages from other server that are missing locally
-            print(f"    Checking for messages to add locally...")
+            log.debug("Checking for messages to add locally...")
             for message in other_board:
                 if message not in local_board:
                     await self.asyncLocalStorage.put(message, self.myId)
-                    print(f"    Added to local: {message}")
+                    log.debug("Added to local: %s", message)
             
             # 2. Add messages from local server that are missing on the other server
-            print(f"    Checking for messages to send to server {other_server_id}...")
+            log.debug("Checking for messages to send to server %s...", other_server_id)
             for message in local_board:
                 if message not in other_board:
                     await self.serverList[other_server_id].put(message)
-                    print(f"    Sent to server {other_server_id}: {message}")
+                    log.debug("Sent to server %s: %s", other_server_id, message)
             
-            print(f"    Synchronization complete!\n")
+            log.debug("Synchronization complete")
             return "OK"
         except Exception as e:
-            print(f"    Synchronization error: {e}\n")
-            import traceback
-            traceback.print_exc()
+            log.exception("Synchronization error: %s", e)
             return "ERROR"
 
     async def close(self):
@@ -121,3 +173,19 @@ class storage:
 
         for proxy in self.serverList:
             await proxy.close()
+
+    def registerCommands(self, commands):
+        """Registers the command SYNCHRONIZE of the BoardServer (see Commands)."""
+        commands.register("SYNCHRONIZE", self._synchronizeCommand)
+
+    async def _synchronizeCommand(self, request):
+        other_server_id = request.get("OTHERSERVERID")
+        if other_server_id is None:
+            log.error("SYNCHRONIZE without OTHERSERVERID")
+            return Commands.ERROR
+        try:
+            result = await self.synchronize(other_server_id, request.get("MYID", -1))
+        except Exception as e:
+            log.error("Synchronize error: %s", e)
+            return Commands.ERROR
+        return reply(result, result)
@@ -4,10 +4,11 @@ import BoardServer
 import Synchronize
 import logging
 import sys
+import Topology
 import VectorClock
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -15,7 +16,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts[serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 logging.basicConfig(
@@ -23,16 +24,17 @@ logging.basicConfig(
 )
 
 # Create object of logical clock
-logicalClock = VectorClock.clock(len(serverPorts), serverID)
+logicalClock = VectorClock.clock(len(cluster), serverID)
 
 # Create proxies for the other servers
-serversToInformAboutChanges = [AsyncBoardProxy.storage(serverPorts[id], serverID, logicalClock) for id in range(len(serverPorts))]
+serversToInformAboutChanges = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, logicalClock, codecs=["binary"]) for id in range(len(cluster))]
 
 # Create storage containing data of this server with sorting by timestamps
-localStorage = AsyncBoardStorage.storage(Synchronize.storage.compareMessages) 
+localStorage = AsyncBoardStorage.storage(keyForElements=Synchronize.storage.messageKey) 
 
 # Create object with distribution algorithm 
 storage = Synchronize.storage(localStorage, serversToInformAboutChanges, serverID, logicalClock)    
 
 # Start server
-BoardServer.startServer(port, storage, serverID=serverID, vClock=logicalClock)
+BoardServer.startServer(node.port, storage, serverID=serverID, vClock=logicalClock, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
@@ -0,0 +1,103 @@
+"""
+Topology of a cluster of board servers.
+
+The nodes of the cluster are read from a JSON file:
+
+    {
+        "bind": "0.0.0.0",
+        "nodes": [
+            {"id": 0, "host": "10.0.0.1", "port": 10000, "peerPort": 11000, "role": "coordinator"},
+            {"id": 1, "host": "10.0.0.2", "port": 10000, "peerPort": 11000},
+            {"id": 2, "host": "10.0.0.3", "port": 10000, "peerPort": "unix:///tmp/board2.sock"}
+        ]
+    }
+
+  id        Number of the server; the nodes are numbered 0, 1, 2, ...
+  host      Name or address that clients and the other servers connect to (default localhost)
+  port      Port for the requests of clients
+  peerPort  Port or "unix://<path>" for the requests of the other servers (optional, see BoardServer)
+  role      "coordinator" for the initial coordinator, which also runs the sequencer,
+            or "replica" (default)
+  bind      Address the server listens on; given for all nodes or per node (default: host)
+  clientBudget, peerBudget
+            Maximum number of requests of clients and of the other servers executed at
+            the same time, null for unlimited (default 64 and unlimited, see Lanes)
+
+The file is named by the environment variable BOARD_TOPOLOGY, otherwise
+topology.json in the working directory is used if it exists. Without a file
+the cluster consists of four servers on localhost with the ports 10000-10003
+and the peer ports 11000-11003. BOARD_BIND overrides the bind address.
+"""
+
+import json
+import os
+import Address
+import Lanes
+
+DEFAULT_FILE = "topology.json"
+DEFAULT_NODES = [{"id": id, "port": 10000 + id, "peerPort": 11000 + id, "role": "coordinator" if id == 0 else "replica"}
+                 for id in range(4)]
+
+
+class node:
+    def __init__(self, entry, defaultBind=None):
+        self.id = int(entry["id"])
+        self.host = entry.get("host", "localhost")
+        self.port = int(entry["port"])
+        peerPort = entry.get("peerPort")
+        self.peerPort = int(peerPort) if isinstance(peerPort, str) and peerPort.isdigit() else peerPort
+        self.role = entry.get("role", "replica")
+        self.bind = entry.get("bind") or defaultBind or self.host
+        self.clientBudget = entry.get("clientBudget", Lanes.DEFAULT_CLIENT_BUDGET)
+        self.peerBudget = entry.get("peerBudget", Lanes.DEFAULT_PEER_BUDGET)
+
+
+class topology:
+    def __init__(self, entries, bind=None):
+        self.nodes = sorted((node(entry, bind) for entry in entries), key=lambda n: n.id)
+        if [n.id for n in self.nodes] != list(range(len(self.nodes))):
+            raise ValueError("The ids of the nodes must be 0, 1, 2, ...")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def node(self, id):
+        return self.nodes[id]
+
+    def ids(self):
+        return range(len(self.nodes))
+
+    @property
+    def coordinator(self):
+        """Id of the initial coordinator: the node with role "coordinator", otherwise node 0"""
+        for n in self.nodes:
+            if n.role == "coordinator":
+                return n.id
+        return 0
+
+    def clientAddress(self, id):
+        """Address of the server for clients (see Address)"""
+        n = self.nodes[id]
+        return f"{n.host}:{n.port}"
+
+    def peerAddress(self, id):
+        """Address of the server for the other servers: its peer port or, without one, its client port"""
+        n = self.nodes[id]
+        if n.peerPort is None:
+            return self.clientAddress(id)
+        if Address.unixPath(n.peerPort) is not None:
+            return n.peerPort
+        return f"{n.host}:{n.peerPort}"
+
+
+def load(path=None):
+    """Reads the topology from path, BOARD_TOPOLOGY or topology.json; returns the default cluster without a file."""
+    path = path or os.environ.get("BOARD_TOPOLOGY")
+    if path is None and os.path.exists(DEFAULT_FILE):
+        path = DEFAULT_FILE
+    if path is None:
+        config = {"nodes": DEFAULT_NODES}
+    else:
+        with open(path) as f:
+            config = json.load(f)
+    return topology(config["nodes"], os.environ.get("BOARD_BIND") or config.get("bind"))
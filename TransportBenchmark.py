@@ -0,0 +1,57 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import AsyncBoardProxy
+import AsyncBoardStorage
+import BoardServer
+
+# Compares the round-trip latency of requests to a BoardServer over
+# TCP on localhost and over a unix domain socket.
+# Usage: TransportBenchmark.py [number of requests]
+
+tcpPort = 10500
+unixAddress = "unix://" + os.path.join(tempfile.gettempdir(), "board_benchmark.sock")
+
+
+def runServer():
+    # The client listener uses TCP, the peer listener the unix socket
+    BoardServer.startServer(tcpPort, AsyncBoardStorage.storage(), peerPortToUse=unixAddress)
+
+
+async def measure(address, requests):
+    proxy = AsyncBoardProxy.storage(address, -1)
+    await proxy.put("Hello")
+    for _ in range(100):  # Warm up
+        await proxy.getNum()
+    latencies = []
+    for _ in range(requests):
+        startTime = time.perf_counter()
+        await proxy.getNum()
+        latencies.append(time.perf_counter() - startTime)
+    await proxy.close()
+    latencies.sort()
+    return latencies
+
+
+def report(name, latencies):
+    print(f"{name:5} mean {sum(latencies) / len(latencies) * 1e6:7.1f} us   "
+          f"p50 {latencies[len(latencies) // 2] * 1e6:7.1f} us   "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:7.1f} us")
+
+
+async def main(requests):
+    for name, address in [("tcp", tcpPort), ("unix", unixAddress)]:
+        report(name, await measure(address, requests))
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    server = multiprocessing.Process(target=runServer, daemon=True)
+    server.start()
+    time.sleep(1)  # Wait until the server is listening
+    print(f"Round trips of {requests} GETNUM requests")
+    asyncio.run(main(requests))
+    server.terminate()
@@ -1,7 +1,13 @@
 import asyncio
+import BoardLogging
+import Commands
+import Deadline
+import Metrics
+
+log = BoardLogging.getLogger("UseMutexForUpdates")
 
 class storage: 
-    def __init__(self, messageBoard, proxies, myID, leaderElection, sequencerProxy=None): 
+    def __init__(self, messageBoard, proxies, myID, leaderElection, sequencerProxy=None, maxQueueSize=None): 
         self.messageBoard = messageBoard
         self.proxies = proxies
         self.myID = myID
@@ -10,19 +16,22 @@ class storage:
         self._update_queue = asyncio.Queue()
         self._update_task_started = False
         self._update_task = None
+        self.maxQueueSize = maxQueueSize  # Client updates waiting at most; None means unlimited
+        Metrics.registry.gauge("board_update_queue_depth", self._update_queue.qsize, {"queue": "UseMutexForUpdates", "server": str(myID)})
 
     async def put(self, message, senderID=0, sequenceNumber=None): 
-        print(f"PUT called: message={message}, senderID={senderID}, myID={self.myID}")
+        log.debug("PUT called: message=%s, senderID=%s, myID=%s", message, senderID, self.myID)
         # If senderID is -1, it's from a client (no MYID in request) - enqueue it
         if senderID == -1:
-            print(f"Client call detected, enqueueing")
+            self._admit()
+            log.debug("Client call detected, enqueueing")
             await self._update_queue.put(("PUT", message))
             self._ensure_update_task()
             return 'QUEUED'
         
         # Otherwise this is a server-to-server propagation call
         # The originating server already holds the mutex, so just update local storage
-        print(f"Server-to-server call detected, updating local storage")
+        log.debug("Server-to-server call detected, updating local storage")
         await self.messageBoard.put(message, senderID, sequenceNumber)
         return 'DONE'
         
@@ -35,8 +44,24 @@ class storage:
     async def getBoard(self, senderID=0): 
         return await self.messageBoard.getBoard()
         
+    async def getRange(self, offset, limit, senderID=0): 
+        return await self.messageBoard.getRange(offset, limit)
+        
+    async def getVersion(self, senderID=0): 
+        return await self.messageBoard.getVersion()
+        
+    async def getChanges(self, version, senderID=0): 
+        return await self.messageBoard.getChanges(version)
+        
+    def subscribe(self, listener): 
+        self.messageBoard.subscribe(listener)
+        
+    def unsubscribe(self, listener): 
+        self.messageBoard.unsubscribe(listener)
+        
     async def modify(self, index, message, senderID=0, sequenceNumber=None): 
         if senderID == -1:
+            self._admit()
             await self._update_queue.put(("MODIFY", index, message))
             self._ensure_update_task()
             return 'QUEUED'
@@ -46,6 +71,7 @@ class storage:
         
     async def delete(self, index, senderID=0, sequenceNumber=None): 
         if senderID == -1:
+            self._admit()
             await self._update_queue.put(("DELETE", index))
             self._ensure_update_task()
             return 'QUEUED'
@@ -55,6 +81,7 @@ class storage:
             
     async def deleteAll(self, senderID=0, sequenceNumber=None): 
         if senderID == -1:
+            self._admit()
             await self._update_queue.put(("DELETEALL",))
             self._ensure_update_task()
             return 'QUEUED'
@@ -62,6 +89,29 @@ class storage:
         await self.messageBoard.deleteAll(senderID, sequenceNumber)
         return 'DONE'
     
+    async def putMany(self, messages, senderID=0, sequenceNumber=None): 
+        return await self.applyBatch([{"COMMAND": "PUT", "MESSAGE": message} for message in messages], senderID, sequenceNumber)
+
+    async def applyBatch(self, operations, senderID=0, sequenceNumber=None): 
+        if senderID == -1:
+            self._admit()
+            if not operations:
+                return 'DONE'
+            await self._update_queue.put(("BATCH", operations))
+            self._ensure_update_task()
+            return 'QUEUED'
+        
+        await self.messageBoard.applyBatch(operations, senderID, sequenceNumber)
+        return 'DONE'
+    
+    def _admit(self):
+        """Refuses a client update with BUSY while maxQueueSize updates wait in the queue"""
+        # The queue itself is not bounded, since the update task puts items back into it 
+        # and updates of other servers were already ordered and must not be refused
+        if self.maxQueueSize is not None and self._update_queue.qsize() >= self.maxQueueSize:
+            Metrics.registry.inc("board_update_queue_full_total", 1, {"queue": "UseMutexForUpdates"})
+            raise Commands.busyError()
+    
     def _ensure_update_task(self):
         """Start the background update task if not already started."""
         if not self._update_task_started:
@@ -69,7 +119,8 @@ class storage:
                 loop = asyncio.get_running_loop()
             except RuntimeError:
                 return
-            self._update_task = loop.create_task(self._update_task_proc())
+            # The queue outlives the request that started it, so it must not inherit its deadline
+            self._update_task = loop.create_task(self._update_task_proc(), context=Deadline.detachedContext())
             self._update_task_started = True
     
     async def _update_task_proc(self):
@@ -100,13 +151,14 @@ class storage:
 
             try:
                 # Get sequence number if sequencer is available
+                # (one number per operation for a batch)
                 seq_num = None
                 if self.sequencerProxy is not None:
                     try:
-                        seq_num = await self.sequencerProxy.getSequenceNumber()
-                        print(f"Got sequence number: {seq_num}")
+                        seq_num = await self.sequencerProxy.getSequenceNumber(len(item[1]) if op == "BATCH" else 1)
+                        log.debug("Got sequence number: %s", seq_num)
                     except Exception as e:
-                        print(f"Failed to get sequence number: {e}")
+                        log.error("Failed to get sequence number: %s", e)
                 
                 if op == "PUT":
                     _, message = item
@@ -154,6 +206,19 @@ class storage:
                             await proxy.deleteAll(seq_num)
                         except Exception:
                             pass
+                            
+                elif op == "BATCH":
+                    _, operations = item
+                    await self.messageBoard.applyBatch(operations, self.myID, seq_num)
+
+                    # Replicate the whole batch as one message
+                    for i, proxy in enumerate(self.proxies):
+                        if i == self.myID:
+                            continue
+                        try:
+                            await proxy.applyBatch(operations, seq_num)
+                        except Exception:
+                            pass
             finally:
                 try:
                     await coordinator.release()
@@ -6,12 +6,13 @@ import logging
 import Mutex
 import UseMutexForUpdates
 import sys
+import Topology
 import VectorClock
 
 
-# Ports of the servers of the cluster
-serverPorts = [10000, 10001, 10002, 10003]
-IdOfCoordinator = 0
+# Nodes of the cluster with host, ports and role (see Topology)
+cluster = Topology.load()
+IdOfCoordinator = cluster.coordinator
 
 # Parameters: ID of cluster to be started, e.g. 0, 1, 2, 3
 if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
@@ -19,7 +20,7 @@ if len(sys.argv) < 2: # If ID of cluster is not given, then terminate program
         exit(1)
 
 serverID = int(sys.argv[1]) # Id of this server provided as parameter
-port = serverPorts[serverID]
+node = cluster.node(serverID)
 
 # Configure logging of websockets
 logging.basicConfig(
@@ -27,10 +28,10 @@ logging.basicConfig(
 )
 
 # Create object of logical clock
-logicalClock = VectorClock.clock(len(serverPorts), serverID)
+logicalClock = VectorClock.clock(len(cluster), serverID)
 
 # Create proxies for all servers
-otherServersOfCluster = [AsyncBoardProxy.storage(serverPorts[id], serverID, logicalClock) for id in range(len(serverPorts))]
+otherServersOfCluster = [AsyncBoardProxy.storage(cluster.peerAddress(id), serverID, logicalClock, codecs=["binary"]) for id in range(len(cluster))]
 
 # Create storage containing data of this server. 
 localStorage = AsyncBoardStorage.storage() 
@@ -45,4 +46,5 @@ storage = UseMutexForUpdates.storage(localStorage, otherServersOfCluster, server
 mutex = Mutex.mutex()
 
 # Start server
-BoardServer.startServer(port, storage, serverID, mutex=mutex, leader=leaderElection, vClock=logicalClock)
\ No newline at end of file
+BoardServer.startServer(node.port, storage, serverID, mutex=mutex, leader=leaderElection, vClock=logicalClock, peerPortToUse=node.peerPort, 
+                        maxClientRequests=node.clientBudget, maxPeerRequests=node.peerBudget, host=node.bind)
\ No newline at end of file
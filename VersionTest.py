@@ -0,0 +1,47 @@
+import asyncio
+import os
+import tempfile
+import AsyncBoardStorage
+
+# Checks that versions of a checkpointed board go on after a restart, so
+# GETCHANGES never takes a version of before the restart for a later state.
+
+os.chdir(tempfile.mkdtemp())
+
+
+async def main():
+    storage = AsyncBoardStorage.storage(checkpointing=True, serverID=1)
+    for message in ("a", "b", "c"):
+        await storage.put(message)
+    assert await storage.getVersion() == 3
+    assert await storage.getChanges(1) == [{"COMMAND": "PUT", "MESSAGE": "b"}, {"COMMAND": "PUT", "MESSAGE": "c"}]
+    await storage.close()
+
+    # Recovered from the log
+    storage = AsyncBoardStorage.storage(checkpointing=True, serverID=1)
+    print("Version after restart:", await storage.getVersion())
+    assert await storage.getBoard() == ["a", "b", "c"]
+    assert await storage.getVersion() == 3
+    assert await storage.getChanges(3) == []
+    assert await storage.getChanges(1) is None  # Changes before the restart are not known any more
+    await storage.delete(0)
+    assert await storage.getChanges(3) == [{"COMMAND": "DELETE", "INDEX": 0}]
+    assert await storage.getChanges(0) is None
+
+    # Recovered from a snapshot with an empty log
+    storage.wal.compact(storage.messages)
+    await storage.close()
+    storage = AsyncBoardStorage.storage(checkpointing=True, serverID=1)
+    print("Version after restart from snapshot:", await storage.getVersion())
+    assert await storage.getBoard() == ["b", "c"]
+    assert await storage.getVersion() == 4
+    await storage.put("d")
+    assert await storage.getChanges(4) == [{"COMMAND": "PUT", "MESSAGE": "d"}]
+    await storage.close()
+
+    # A board without checkpointing starts again at version 0
+    assert await AsyncBoardStorage.storage().getVersion() == 0
+    print("Versions go on after a restart")
+
+
+asyncio.run(main())
@@ -0,0 +1,312 @@
+"""
+Encodings of the requests and replies sent between AsyncBoardProxy and BoardServer.
+
+  json    The plain JSON text used by default.
+  cjson   Compact JSON: no whitespace and the keys of requests and replies
+          shortened, e.g. "COMMAND" -> "c". Messages and results are not changed.
+  binary  Binary frames: a struct-packed header followed by tagged values.
+          Integers are varints, vector clocks (lists of non-negative integers)
+          are packed varints and strings are length-prefixed UTF-8.
+
+A connection starts with json. A client may send
+{"COMMAND": "HELLO", "CODECS": [<names in order of preference>]}; the server
+answers in json with {"CODEC": <name>} and from then on both sides use this
+codec on the connection. Clients that do not send HELLO keep using json.
+
+A reply may contain an encoded object (e.g. the cached board of the server),
+which is JSON text inserted as it is instead of being encoded again.
+"""
+
+import json
+import struct
+
+
+#########################################################
+# JSON text that is inserted into a frame as it is.
+# This way an encoded board is reused in many replies.
+#########################################################
+class encoded:
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _containsEncoded(obj):
+    if isinstance(obj, encoded):
+        return True
+    if isinstance(obj, dict):
+        for value in obj.values():
+            if isinstance(value, (encoded, dict)) and _containsEncoded(value):
+                return True
+    return False
+
+
+def _dumpsWithEncoded(obj, dumps):
+    """dumps() of an object, which may contain encoded values in dicts"""
+    if not _containsEncoded(obj):
+        return dumps(obj)
+    if isinstance(obj, encoded):
+        return obj.text
+    return "{" + ",".join(f"{dumps(str(key))}:{_dumpsWithEncoded(value, dumps)}" for key, value in obj.items()) + "}"
+
+
+class jsonCodec:
+    name = "json"
+
+    def encode(self, obj):
+        return _dumpsWithEncoded(obj, json.dumps)
+
+    def decode(self, frame):
+        return json.loads(frame)
+
+
+# Short names of the keys of the protocol
+SHORT_KEYS = {
+    "COMMAND": "c", "MESSAGE": "m", "INDEX": "i", "MYID": "y", "SEQNUM": "s", "TIME": "t",
+    "RESULT": "r", "REQID": "q", "REPLY": "p", "BOARD": "b", "NUM": "n", "OPERATIONS": "o",
+    "RESULTS": "rs", "VERSION": "v", "CHANGES": "ch", "RESYNC": "rz", "CURSOR": "cu",
+    "LIMIT": "l", "OFFSET": "of", "COUNT": "co", "CHUNK": "ck", "END": "e", "EVENT": "ev",
+    "DROPPED": "d", "ACQUIRED": "a", "ALIVE": "al", "RESPONSE": "re", "IFVERSION": "iv",
+    "NOTMODIFIED": "nm", "STREAM": "st", "CHUNKSIZE": "cs", "COORDINATORID": "ci",
+    "OTHERSERVERID": "os", "STATS": "ss", "CODEC": "cd", "CODECS": "cds", "DEADLINE": "dl",
+    "RETRYAFTER": "ra",
+}
+LONG_KEYS = {short: key for key, short in SHORT_KEYS.items()}
+# Keys whose values contain a request or reply, or a list of them, whose keys are renamed as well
+NESTED_KEYS = {"REPLY": "frame", "EVENT": "frame", "OPERATIONS": "list", "CHANGES": "list"}
+# Prefix of other keys that look like a short key or start with it, so every key is restored
+ESCAPE = "~"
+
+
+def _shortKey(key):
+    short = SHORT_KEYS.get(key)
+    if short is not None:
+        return short
+    if key in LONG_KEYS or (isinstance(key, str) and key.startswith(ESCAPE)):
+        return ESCAPE + key
+    return key
+
+
+def _longKey(key):
+    long = LONG_KEYS.get(key)
+    if long is not None:
+        return long
+    if key.startswith(ESCAPE):
+        return key[1:]
+    return key
+
+
+def _renameKeys(obj, rename, longName):
+    """
+    Renames the keys of a request or reply (a dict) and of the requests and replies 
+    nested in it. Messages, results and other values (also a reply that is a list) 
+    are not changed. Renaming is reversible, so a reply that is a message of a 
+    client (which the codec cannot tell from a reply of the protocol) is restored 
+    exactly. longName returns the long name of a key before or after renaming. 
+    """
+    if not isinstance(obj, dict):
+        return obj
+    result = {}
+    for key, value in obj.items():
+        kind = NESTED_KEYS.get(longName(key))
+        if kind == "frame":
+            value = _renameKeys(value, rename, longName)
+        elif kind == "list" and isinstance(value, list):
+            value = [_renameKeys(item, rename, longName) for item in value]
+        result[rename(key)] = value
+    return result
+
+
+def _identity(key):
+    return key
+
+
+def _compactDumps(obj):
+    return json.dumps(obj, separators=(",", ":"))
+
+
+class compactJsonCodec:
+    name = "cjson"
+
+    def encode(self, obj):
+        return _dumpsWithEncoded(_renameKeys(obj, _shortKey, _identity), _compactDumps)
+
+    def decode(self, frame):
+        return _renameKeys(json.loads(frame), _longKey, _longKey)
+
+
+#########################################################
+# Binary encoding
+#########################################################
+# Header of each frame: magic byte and version of the format
+HEADER = struct.Struct(">BB")
+MAGIC = 0xB0
+FORMAT_VERSION = 1
+
+# Tags of the values
+T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_LIST, T_CLOCK, T_DICT, T_JSON = range(10)
+FLOAT = struct.Struct(">d")
+
+# Keys of the protocol are sent as one number
+KEY_CODES = {key: code for code, key in enumerate(SHORT_KEYS)}
+CODE_KEYS = list(SHORT_KEYS)
+
+
+def _writeVarint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _writeString(out, text):
+    data = text.encode()
+    _writeVarint(out, len(data))
+    out += data
+
+
+def _isClock(values):
+    for x in values:
+        if type(x) is not int or x < 0:
+            return False
+    return True
+
+
+def _writeValue(out, value):
+    t = type(value)
+    if t is str:
+        out.append(T_STR)
+        _writeString(out, value)
+    elif t is int:
+        out.append(T_INT)
+        _writeVarint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))  # Zigzag
+    elif value is None:
+        out.append(T_NONE)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif t is float:
+        out.append(T_FLOAT)
+        out += FLOAT.pack(value)
+    elif t is list or t is tuple:
+        if value and _isClock(value):
+            out.append(T_CLOCK)
+            _writeVarint(out, len(value))
+            for x in value:
+                _writeVarint(out, x)
+        else:
+            out.append(T_LIST)
+            _writeVarint(out, len(value))
+            for item in value:
+                _writeValue(out, item)
+    elif t is dict:
+        out.append(T_DICT)
+        _writeVarint(out, len(value))
+        for key, item in value.items():
+            code = KEY_CODES.get(key)
+            if code is not None:
+                _writeVarint(out, (code << 1) | 1)
+            else:
+                data = str(key).encode()
+                _writeVarint(out, len(data) << 1)
+                out += data
+            _writeValue(out, item)
+    elif t is encoded:
+        out.append(T_JSON)
+        _writeString(out, value.text)
+    else:
+        raise TypeError(f"Cannot encode {t.__name__}")
+
+
+def _readVarint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _readValue(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == T_STR or tag == T_JSON:
+        length, pos = _readVarint(data, pos)
+        text = str(data[pos:pos + length], "utf-8")
+        return (text if tag == T_STR else json.loads(text)), pos + length
+    if tag == T_INT:
+        n, pos = _readVarint(data, pos)
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+    if tag == T_CLOCK:
+        count, pos = _readVarint(data, pos)
+        values = []
+        for _ in range(count):
+            x, pos = _readVarint(data, pos)
+            values.append(x)
+        return values, pos
+    if tag == T_LIST:
+        count, pos = _readVarint(data, pos)
+        values = []
+        for _ in range(count):
+            value, pos = _readValue(data, pos)
+            values.append(value)
+        return values, pos
+    if tag == T_DICT:
+        count, pos = _readVarint(data, pos)
+        result = {}
+        for _ in range(count):
+            key, pos = _readVarint(data, pos)
+            if key & 1:
+                key = CODE_KEYS[key >> 1]
+            else:
+                length = key >> 1
+                key = str(data[pos:pos + length], "utf-8")
+                pos += length
+            result[key], pos = _readValue(data, pos)
+        return result, pos
+    if tag == T_NONE:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_FLOAT:
+        return FLOAT.unpack_from(data, pos)[0], pos + FLOAT.size
+    raise ValueError(f"Unknown tag {tag} in binary frame")
+
+
+class binaryCodec:
+    name = "binary"
+
+    def encode(self, obj):
+        out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION))
+        _writeValue(out, obj)
+        return bytes(out)
+
+    def decode(self, frame):
+        if isinstance(frame, str):
+            # Text frames (e.g. errors of a server before negotiation) are JSON
+            return json.loads(frame)
+        magic, version = HEADER.unpack_from(frame, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a binary frame of a known version")
+        value, _ = _readValue(memoryview(frame), HEADER.size)
+        return value
+
+
+# Codecs by name. JSON is the default of every connection.
+codecs = {codec.name: codec for codec in (jsonCodec(), compactJsonCodec(), binaryCodec())}
+JSON = codecs["json"]
+
+
+def choose(names):
+    """Returns the first codec of the given names that is known, or JSON."""
+    for name in names or []:
+        if name in codecs:
+            return codecs[name]
+    return JSON
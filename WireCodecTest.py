@@ -0,0 +1,39 @@
+import json
+import WireCodec
+
+# Checks that every codec returns requests and replies unchanged, also when
+# messages use keys of the protocol or their short names.
+
+messages = [{"c": 1, "COMMAND": "x"},
+            {"r": [1, 2], "REPLY": {"i": 3}, "~c": "escaped", "~": None},
+            {"OPERATIONS": [{"c": "PUT"}], "CHANGES": "none", "EVENT": {"m": "text"}},
+            "plain text", 42, [0, 1, 2], None]
+
+frames = [
+    # Requests
+    {"COMMAND": "PUT", "MESSAGE": messages[0]},
+    {"COMMAND": "BATCH", "OPERATIONS": [{"COMMAND": "PUT", "MESSAGE": message} for message in messages]},
+    {"COMMAND": "MODIFY", "INDEX": 0, "MESSAGE": messages[1], "TIME": [1, 0], "MYID": 1},
+    # Replies of GET and GETBOARD to clients are the messages themselves
+    *messages,
+    messages,
+    # Tagged replies, replies to servers and notifications
+    {"REQID": 7, "REPLY": messages[0]},
+    {"REQID": 8, "REPLY": messages},
+    {"REQID": 9, "REPLY": {"RESULT": messages[1], "TIME": [2, 1]}},
+    {"RESULT": None, "BOARD": messages, "TIME": [0, 3]},
+    {"CHANGES": [{"COMMAND": "BATCH", "OPERATIONS": [{"COMMAND": "PUT", "MESSAGE": messages[2]}]}]},
+    {"EVENT": {"COMMAND": "PUT", "MESSAGE": messages[0]}},
+    {"REQID": 10, "CHUNK": messages},
+]
+
+for name, codec in WireCodec.codecs.items():
+    for frame in frames:
+        decoded = codec.decode(codec.encode(frame))
+        assert decoded == frame, f"{name}: {frame} came back as {decoded}"
+    print(f"{name}: {len(frames)} frames unchanged")
+
+# Keys of the protocol are shortened, messages are sent as they are
+compact = WireCodec.codecs["cjson"].encode({"COMMAND": "PUT", "MESSAGE": messages[0]})
+print("cjson:", compact)
+assert json.loads(compact) == {"c": "PUT", "m": messages[0]}
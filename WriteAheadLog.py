@@ -0,0 +1,247 @@
+"""
+Durable storage of a board as snapshot plus append-only log of its changes.
+
+  <name>.snap  Snapshot: the board after the first n logged changes in the
+               binary format of Snapshot, whose messages are decoded lazily.
+               Snapshots of the former format <name>.json ({"LSN": n,
+               "MESSAGES": [...]} or a plain list of the messages with LSN 0)
+               are read if there is no <name>.snap.
+  <name>.wal   Log: one line {"LSN": n, "CHANGE": change} per change, where
+               change is the operation passed to the listeners of the storage
+               (see AsyncBoardStorage.subscribe).
+
+Appending a change costs one buffered write. The log is flushed and fsynced
+once per group of changes: after syncEvery changes or at the latest
+syncInterval seconds after the first unsynced change (group commit). So a
+crash loses at most the changes of the last group.
+
+When the log holds as many changes as the board has messages (at least
+compactAfter), or snapshotInterval seconds after the last snapshot, a new
+snapshot is taken in the background: the list of messages is copied (the
+only work done on the event loop), the log is moved aside to <name>.wal.old
+and a new log is started. A worker thread encodes the copy and writes it to
+a temporary file, which is fsynced and renamed over the old snapshot, so a
+crash leaves either the old or the new snapshot. Then the old log is removed.
+recover() reads the old log and the log and skips the changes the snapshot
+already contains (LSN not above the one of the snapshot). A torn last line
+of the log is ignored.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import time
+import BoardLogging
+import Metrics
+import Snapshot
+
+log = BoardLogging.getLogger("WriteAheadLog")
+
+
+class writeAheadLog:
+    def __init__(self, name, syncEvery=100, syncInterval=0.05, compactAfter=10000, snapshotInterval=None, 
+                 compress=False, labels=None):
+        self.snapshotFile = name + ".snap"
+        self.jsonSnapshotFile = name + ".json"  # Snapshot of the former format
+        self.logFile = name + ".wal"
+        self.oldLogFile = name + ".wal.old"  # Log of the changes before the snapshot being written
+        self.syncEvery = syncEvery
+        self.syncInterval = syncInterval
+        self.compactAfter = compactAfter
+        self.snapshotInterval = snapshotInterval
+        self.compress = compress  # Compress the records of snapshots with zlib
+        self.labels = labels
+        self.snapshotTask = None  # Background snapshot being written
+        self.lastSnapshot = time.monotonic()
+        self.lsn = 0  # Number of the last logged change
+        self.logged = 0  # Changes in the log file
+        self.unsynced = 0  # Changes written since the last fsync
+        self.syncTimer = None
+        self.file = None
+
+    #########################################################
+    # Recovery
+    #########################################################
+    def recover(self):
+        """Reads snapshot and log. Returns the messages of the snapshot and the logged changes after it."""
+        messages, snapshotLsn = self._readSnapshot()
+        self.lsn = snapshotLsn
+        changes = []
+        for filename in (self.oldLogFile, self.logFile):
+            if not os.path.exists(filename):
+                continue
+            goodLength = 0  # Length of the log up to the last complete record
+            with open(filename, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        lsn = record["LSN"]
+                        change = record["CHANGE"]
+                    except (ValueError, KeyError, TypeError):
+                        log.warning("Ignoring incomplete record at the end of %s", filename)
+                        break
+                    goodLength += len(line)
+                    # Skips changes in the snapshot and copies of changes of the old log
+                    if lsn > self.lsn:
+                        changes.append(change)
+                        self.lsn = lsn
+            # Cut off a torn record, so new records follow the last complete one
+            os.truncate(filename, goodLength)
+        self.logged = len(changes)
+        self.file = open(self.logFile, "ab")
+        log.info("Recovered %s messages and %s logged changes", len(messages), len(changes))
+        return messages, changes
+
+    def _readSnapshot(self):
+        try:
+            if os.path.exists(self.snapshotFile):
+                return Snapshot.load(self.snapshotFile)
+            if not os.path.exists(self.jsonSnapshotFile):
+                return [], 0
+            with open(self.jsonSnapshotFile, "r") as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            log.error("Error loading snapshot: %s", e)
+            return [], 0
+        if isinstance(snapshot, list):
+            return snapshot, 0  # Checkpoint of the former format
+        return snapshot["MESSAGES"], snapshot["LSN"]
+
+    #########################################################
+    # Logging of changes with group commit
+    #########################################################
+    def append(self, change):
+        """Appends a change to the log. It is durable after the next sync()."""
+        self.lsn += 1
+        self.file.write(json.dumps({"LSN": self.lsn, "CHANGE": change}, separators=(",", ":")).encode() + b"\n")
+        self.logged += 1
+        self.unsynced += 1
+        Metrics.registry.inc("board_wal_appends_total", 1, self.labels)
+        if self.unsynced >= self.syncEvery:
+            self.sync()
+        elif self.syncTimer is None:
+            try:
+                self.syncTimer = asyncio.get_running_loop().call_later(self.syncInterval, self.sync)
+            except RuntimeError:
+                self.sync()  # Without event loop there is no later
+
+    def sync(self):
+        """Writes the logged changes to disk (fsync)."""
+        if self.syncTimer is not None:
+            self.syncTimer.cancel()
+            self.syncTimer = None
+        if not self.unsynced:
+            return
+        start = time.perf_counter()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        Metrics.registry.observe("board_wal_sync_seconds", time.perf_counter() - start, self.labels)
+        Metrics.registry.inc("board_wal_syncs_total", 1, self.labels)
+        self.unsynced = 0
+
+    #########################################################
+    # Compaction
+    #########################################################
+    def needsCompaction(self, boardSize):
+        if self.snapshotTask is not None or not self.logged:
+            return False
+        # Compacting when the log is as long as the board keeps the cost per change constant
+        if self.logged >= max(self.compactAfter, boardSize):
+            return True
+        return self.snapshotInterval is not None and time.monotonic() - self.lastSnapshot >= self.snapshotInterval
+
+    def compact(self, messages):
+        """Writes messages (the board after all logged changes) as snapshot and empties the log."""
+        start = time.perf_counter()
+        self.sync()
+        self._writeSnapshotFile(messages, self.lsn)
+        # The snapshot contains all logged changes, so the logs can be emptied
+        self.file.truncate(0)
+        self.file.seek(0)
+        if os.path.exists(self.oldLogFile):
+            os.remove(self.oldLogFile)
+        self.logged = 0
+        self.lastSnapshot = time.monotonic()
+        Metrics.registry.observe("board_checkpoint_write_seconds", time.perf_counter() - start, self.labels)
+
+    def snapshot(self, messages):
+        """
+        Starts writing messages (the board after all logged changes) as snapshot 
+        in a worker thread. Without running event loop, compact() is used. 
+        """
+        if self.snapshotTask is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.compact(messages)
+            return
+        start = time.perf_counter()
+        # The messages themselves are not changed by the storage, so a shallow copy suffices
+        copy = messages.copy()
+        self._rotate()
+        Metrics.registry.observe("board_snapshot_stall_seconds", time.perf_counter() - start, self.labels)
+        self.lastSnapshot = time.monotonic()
+        self.snapshotTask = loop.create_task(self._writeSnapshot(copy, self.lsn))
+
+    def _rotate(self):
+        """Moves the logged changes to the old log and starts an empty log"""
+        self.sync()
+        self.file.close()
+        if os.path.exists(self.oldLogFile):
+            # The last snapshot failed, so the changes of the old log are still needed
+            with open(self.logFile, "rb") as source, open(self.oldLogFile, "ab") as target:
+                shutil.copyfileobj(source, target)
+                target.flush()
+                os.fsync(target.fileno())
+            self.file = open(self.logFile, "wb")
+        else:
+            os.replace(self.logFile, self.oldLogFile)
+            self.file = open(self.logFile, "ab")
+        self.logged = 0
+
+    async def _writeSnapshot(self, messages, lsn):
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._writeSnapshotFile, messages, lsn)
+            os.remove(self.oldLogFile)
+            Metrics.registry.observe("board_checkpoint_write_seconds", time.perf_counter() - start, self.labels)
+            Metrics.registry.inc("board_snapshots_total", 1, self.labels)
+        except Exception as e:
+            log.error("Error writing snapshot: %s", e)
+        finally:
+            self.snapshotTask = None
+
+    def _writeSnapshotFile(self, messages, lsn):
+        writeFileAtomically(self.snapshotFile, Snapshot.encode(messages, lsn, self.compress))
+        if os.path.exists(self.jsonSnapshotFile):
+            os.remove(self.jsonSnapshotFile)  # Replaced by the new snapshot
+
+    async def finishSnapshot(self):
+        """Waits until a snapshot written in the background is complete"""
+        if self.snapshotTask is not None:
+            await asyncio.shield(self.snapshotTask)
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def writeFileAtomically(filename, data):
+    """Writes data to a temporary file and renames it to filename, so the file is either old or new after a crash."""
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, filename)
+    # Make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
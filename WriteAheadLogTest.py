@@ -0,0 +1,73 @@
+import asyncio
+import os
+import tempfile
+import AsyncBoardStorage
+import WriteAheadLog
+
+# Checks that a board is recovered from snapshot and log, also when the last
+# record of the log was torn by a crash or a snapshot was not completed.
+
+os.chdir(tempfile.mkdtemp())
+
+
+def restart():
+    return AsyncBoardStorage.storage(checkpointing=True, serverID=1)
+
+
+async def main():
+    storage = restart()
+    for message in ("a", "b", "c"):
+        await storage.put(message)
+    await storage.modify(0, "A")
+    await storage.applyBatch([{"COMMAND": "PUT", "MESSAGE": "d"}, {"COMMAND": "DELETE", "INDEX": 1}])
+    expected = await storage.getBoard()
+    await storage.close()
+
+    # Crash while a record was written
+    goodLength = os.path.getsize("checkpoint_1.wal")
+    with open("checkpoint_1.wal", "ab") as f:
+        f.write(b'{"LSN":6,"CHANGE":{"COMMAND":"PU')
+    storage = restart()
+    assert await storage.getBoard() == expected
+    assert os.path.getsize("checkpoint_1.wal") == goodLength  # Torn record is cut off
+    print("Recovered after torn record:", expected)
+
+    # New records follow the last complete one
+    await storage.put("e")
+    expected = await storage.getBoard()
+    await storage.close()
+    storage = restart()
+    assert await storage.getBoard() == expected
+    await storage.close()
+
+    # Crash while a snapshot was written: its changes are still in the old log
+    storage = restart()
+    writeFileAtomically = WriteAheadLog.writeFileAtomically
+    WriteAheadLog.writeFileAtomically = lambda filename, data: (_ for _ in ()).throw(OSError("Disk full"))
+    try:
+        storage.wal.snapshot(storage.messages)
+        await storage.put("f")
+        await storage.wal.finishSnapshot()
+    finally:
+        WriteAheadLog.writeFileAtomically = writeFileAtomically
+    assert os.path.exists("checkpoint_1.wal.old")
+    expected = await storage.getBoard()
+    await storage.close()
+    storage = restart()
+    assert await storage.getBoard() == expected
+    print("Recovered after failed snapshot:", expected)
+
+    # A completed snapshot replaces the logs
+    storage.wal.snapshot(storage.messages)
+    await storage.put("g")
+    await storage.wal.finishSnapshot()
+    assert not os.path.exists("checkpoint_1.wal.old")
+    expected = await storage.getBoard()
+    await storage.close()
+    storage = restart()
+    assert await storage.getBoard() == expected
+    await storage.close()
+    print("Boards are recovered")
+
+
+asyncio.run(main())
@@ -9,8 +9,10 @@ Run this: ./bin/python demo_bully.py
 import asyncio
 import AsyncBoardProxy
 import LeaderElection
+import Topology
 
-serverPorts = [10000, 10001, 10002, 10003]
+cluster = Topology.load()
+serverPorts = [cluster.clientAddress(id) for id in cluster.ids()]
 
 async def demo():
     print("\n" + "="*60)
@@ -20,7 +22,7 @@ async def demo():
     # Check which servers are alive
     print("\nStep 1: Checking which servers are alive...")
     alive = []
-    for sid in range(4):
+    for sid in cluster.ids():
         proxy = AsyncBoardProxy.storage(serverPorts[sid], 99)
         try:
             if await proxy.areYouAlive() == "YES":
@@ -44,11 +46,11 @@ async def demo():
     lowest = min(alive)
     print(f"\nStep 2: Server {lowest} starts election...")
     
-    proxies = [AsyncBoardProxy.storage(serverPorts[i], lowest) for i in range(4)]
+    proxies = [AsyncBoardProxy.storage(serverPorts[i], lowest) for i in cluster.ids()]
     election = LeaderElection.election(proxies, lowest)
     
     print(f"  Server {lowest}: Checking servers with higher IDs...")
-    higher = [s for s in range(lowest+1, 4) if s in alive]
+    higher = [s for s in alive if s > lowest]
     print(f"  Higher servers: {higher if higher else 'none'}")
     
     await election.startElection()
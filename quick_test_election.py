@@ -10,18 +10,20 @@ Start at least one server first:
 import asyncio
 import AsyncBoardProxy
 import LeaderElection
+import Topology
 
 async def quick_test():
     print("Quick Test - LeaderElection Helper Methods\n")
     
     # Setup
-    serverPorts = [10000, 10001, 10002, 10003]
+    cluster = Topology.load()
+    serverPorts = [cluster.clientAddress(id) for id in cluster.ids()]
     proxies = [AsyncBoardProxy.storage(port, 99) for port in serverPorts]
     election = LeaderElection.election(proxies, 99)
     
     # Test 1: Check which servers are alive
     print("1. Checking servers...")
-    for i in range(4):
+    for i in cluster.ids():
         alive = await election.callAreYouAlive(i)
         print(f"   Server {i}: {'ALIVE' if alive else 'dead'}")
     
@@ -1,7 +1,8 @@
 import BoardProxy
+import Topology
 
 # Test if synchronize works
-proxy = BoardProxy.storage(10000)
+proxy = BoardProxy.storage(Topology.load().clientAddress(0))
 
 print("Testing synchronize call to server 0...")
 try: